@@ -1,34 +1,18 @@
+"""Development entry point: ``python app.py``.
 
-from flask import Flask, render_template, request, send_file, flash
-from flask_cors import CORS
-from string import Template
+Production runs ``wsgi:app`` under gunicorn (see gunicorn.conf.py).
+Warm-up follows ``WARMUP`` as there, so ``/readyz`` turns ready here too.
+"""
 import os
-import spacy
-from dotenv import load_dotenv
-from app.services.processor import LegalDocumentProcessor
-import tempfile
-
-load_dotenv()
-
-app = Flask(__name__, template_folder='templates', static_folder='static')
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
-CORS(app, origins=['http://localhost:5000', 'http://127.0.0.1:5000'], supports_credentials=True, allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'])
-
-@app.after_request
-def after_request(response):
-    response.headers['Cross-Origin-Opener-Policy'] = 'same-origin-allow-popups'
-    response.headers['Cross-Origin-Embedder-Policy'] = 'unsafe-none'
-    return response
-nlp = spacy.load('en_core_web_sm')
-processor = LegalDocumentProcessor()
-
-# Register blueprints
-from app.routes import auth_bp, main_bp, document_bp
-app.register_blueprint(auth_bp)
-app.register_blueprint(main_bp)
-app.register_blueprint(document_bp)
 
+from app import create_app
+from app.services.warmup import start_warm_up
 
+app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    debug = os.getenv('FLASK_DEBUG', '1') == '1'
+    # With the reloader, only the child process that serves requests warms up
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warm_up()
+    app.run(debug=debug, port=int(os.getenv('PORT', '5000')))
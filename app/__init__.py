@@ -0,0 +1,50 @@
+"""Legal document generator application package.
+
+``create_app`` builds and configures the Flask application. Nothing heavy
+happens on import: spaCy models, the document processor and the database
+clients are built by the service container (``app.services.container``)
+the first time a request or the warm-up needs them. Flask itself is
+imported inside the factory because bulk-generation workers and the CLIs
+import this package without serving HTTP.
+"""
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORS_ORIGINS = ['http://localhost:5000', 'http://127.0.0.1:5000']
+
+
+def create_app(config=None):
+    """Create the Flask application and register its blueprints.
+
+    ``config`` is an optional mapping applied on top of the defaults.
+    """
+    from dotenv import load_dotenv
+    from flask import Flask
+    from flask_cors import CORS
+
+    load_dotenv()
+
+    app = Flask(
+        __name__,
+        template_folder=os.path.join(PROJECT_ROOT, 'templates'),
+        static_folder=os.path.join(PROJECT_ROOT, 'static'),
+    )
+    app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
+    if config:
+        app.config.update(config)
+
+    CORS(app, origins=CORS_ORIGINS, supports_credentials=True,
+         allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'])
+
+    @app.after_request
+    def after_request(response):
+        response.headers['Cross-Origin-Opener-Policy'] = 'same-origin-allow-popups'
+        response.headers['Cross-Origin-Embedder-Policy'] = 'unsafe-none'
+        return response
+
+    from app.routes import auth_bp, main_bp, document_bp
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(main_bp)
+    app.register_blueprint(document_bp)
+    return app
@@ -0,0 +1,185 @@
+"""Shared Supabase access for the whole process.
+
+One data client is created per process, on first use, over a single
+keep-alive ``httpx`` connection pool with a per-request timeout. Queries
+run through ``execute``, which times every call into a per
+(table, operation) latency histogram and retries idempotent reads on
+transport errors with jittered exponential backoff.
+
+Auth calls use a separate client that shares the same connection pool.
+Signing a user in switches a client's Authorization header to that
+user's token, which must never leak into service-role data access.
+
+httpx and supabase are imported when the clients are first created, so
+processes that never touch the database do not pay for them.
+"""
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    import httpx
+    from supabase import Client
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv('SUPABASE_URL')
+SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_KEY')
+
+DB_TIMEOUT = float(os.getenv('DB_TIMEOUT', '10'))
+DB_CONNECT_TIMEOUT = float(os.getenv('DB_CONNECT_TIMEOUT', '3'))
+DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', '20'))
+DB_MAX_KEEPALIVE = int(os.getenv('DB_MAX_KEEPALIVE', '10'))
+DB_KEEPALIVE_EXPIRY = float(os.getenv('DB_KEEPALIVE_EXPIRY', '60'))
+DB_READ_RETRIES = int(os.getenv('DB_READ_RETRIES', '2'))
+DB_RETRY_BACKOFF = float(os.getenv('DB_RETRY_BACKOFF', '0.1'))
+
+# Latency histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+IDEMPOTENT_OPERATIONS = ('select', 'rpc')
+
+_lock = threading.Lock()
+_pid = None
+_http_client = None
+_data_client = None
+_auth_client = None
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _credentials_configured() -> bool:
+    return bool(SUPABASE_URL and SUPABASE_SERVICE_KEY and SUPABASE_URL != 'your_supabase_url_here')
+
+
+def _new_client(http_client: 'httpx.Client') -> 'Client':
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+    options = SyncClientOptions(
+        httpx_client=http_client,
+        postgrest_client_timeout=DB_TIMEOUT,
+        auto_refresh_token=False,
+        persist_session=False,
+    )
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY, options)
+
+
+def _init_clients():
+    """Create the pooled HTTP client and both Supabase clients for this process."""
+    global _pid, _http_client, _data_client, _auth_client
+    with _lock:
+        # Connections must not be shared across a fork, so children start over
+        if _pid == os.getpid():
+            return
+        _http_client = _data_client = _auth_client = None
+        _pid = os.getpid()
+        if not _credentials_configured():
+            print(f"Missing Supabase credentials: URL={bool(SUPABASE_URL)}, SERVICE_KEY={bool(SUPABASE_SERVICE_KEY)}")
+            return
+        try:
+            import httpx
+            _http_client = httpx.Client(
+                timeout=httpx.Timeout(DB_TIMEOUT, connect=DB_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=DB_MAX_CONNECTIONS,
+                    max_keepalive_connections=DB_MAX_KEEPALIVE,
+                    keepalive_expiry=DB_KEEPALIVE_EXPIRY,
+                ),
+                follow_redirects=True,
+            )
+            _data_client = _new_client(_http_client)
+            _auth_client = _new_client(_http_client)
+            print("Supabase client initialized successfully")
+        except Exception as e:
+            print(f"Failed to initialize Supabase client: {e}")
+            _data_client = _auth_client = None
+
+
+def get_supabase() -> Optional['Client']:
+    """Return the process-wide data client, or None if Supabase is not configured."""
+    if _pid != os.getpid():
+        _init_clients()
+    return _data_client
+
+
+def get_auth_client() -> Optional['Client']:
+    """Return the process-wide client used for sign-up, sign-in and sign-out."""
+    if _pid != os.getpid():
+        _init_clients()
+    return _auth_client
+
+
+def record_call(table: str, operation: str, elapsed_ms: float, ok: bool, retried: int = 0):
+    """Add one call to the per table/operation stats; also used by non-Supabase backends."""
+    with _stats_lock:
+        entry = _stats.get((table, operation))
+        if entry is None:
+            entry = _stats[(table, operation)] = {
+                'count': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        entry['count'] += 1
+        entry['errors'] += 0 if ok else 1
+        entry['retries'] += retried
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                entry['buckets'][i] += 1
+                break
+        else:
+            entry['buckets'][-1] += 1
+
+
+def execute(table: str, operation: str, query, idempotent: Optional[bool] = None):
+    """Execute a PostgREST query builder with timing and retries for reads.
+
+    ``operation`` names the call in the stats (select, insert, upsert, rpc, ...).
+    Only idempotent operations are retried, and only on transport errors
+    such as timeouts or dropped connections.
+    """
+    # Already loaded by the client that built ``query``
+    import httpx
+
+    if idempotent is None:
+        idempotent = operation in IDEMPOTENT_OPERATIONS
+    retries = DB_READ_RETRIES if idempotent else 0
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            response = query.execute()
+        except httpx.TransportError as e:
+            if attempt < retries:
+                delay = DB_RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"Retrying {operation} on {table} after {type(e).__name__} (attempt {attempt + 1})")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            record_call(table, operation, (time.perf_counter() - started) * 1000, False, attempt)
+            raise
+        except Exception:
+            record_call(table, operation, (time.perf_counter() - started) * 1000, False, attempt)
+            raise
+        record_call(table, operation, (time.perf_counter() - started) * 1000, True, attempt)
+        return response
+
+
+def db_stats() -> Dict[str, Dict]:
+    """Return call counts, errors, retries and a latency histogram per table/operation."""
+    labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ['gt_10000ms']
+    with _stats_lock:
+        return {
+            f"{table}.{operation}": {
+                'count': entry['count'],
+                'errors': entry['errors'],
+                'retries': entry['retries'],
+                'avg_ms': round(entry['total_ms'] / entry['count'], 2) if entry['count'] else 0.0,
+                'max_ms': round(entry['max_ms'], 2),
+                'histogram': dict(zip(labels, entry['buckets'])),
+            }
+            for (table, operation), entry in _stats.items()
+        }
@@ -1,30 +1,75 @@
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import uuid
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from app.models.repository import get_repository
+from app.models.write_behind import WriteBehindQueue, WRITE_BEHIND_ENABLED
 
-load_dotenv()
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+EXCERPT_LENGTH = 200
 
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_KEY')
+# Listing metadata only; full content is loaded on view/download
+DOCUMENT_LIST_COLUMNS = 'id, document_type, language, title, excerpt, created_at'
+HISTORY_LIST_COLUMNS = 'id, action, details, document_id, timestamp'
+# Separates the sort value from the row id in a page cursor
+CURSOR_SEPARATOR = '|'
 
-# Initialize supabase client with service key for server-side operations
-supabase: Client = None
-if SUPABASE_URL and SUPABASE_SERVICE_KEY:
+_listing_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='history-listing')
+
+def _log_insert_error(table, e, user_id=None):
+    error_msg = str(e)
+    if 'violates foreign key constraint' in error_msg and 'users' in error_msg:
+        print(f"❌ ERROR: Users table missing. Please run the SQL setup script first.")
+        print(f"The user_id {user_id} doesn't exist in the users table.")
+    elif 'Could not find the table' in error_msg:
+        print(f"❌ ERROR: Required database tables are missing. Please run the SQL setup script.")
+    else:
+        print(f"❌ ERROR inserting into {table}: {e}")
+
+def _insert_rows(table, rows):
+    """Insert a batch of rows in one request; used by the write-behind queue."""
     try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-        print(f"Supabase client initialized successfully")
+        get_repository().insert_rows(table, rows)
     except Exception as e:
-        print(f"Failed to initialize Supabase client: {e}")
-        supabase = None
-else:
-    print(f"Missing Supabase credentials: URL={bool(SUPABASE_URL)}, SERVICE_KEY={bool(SUPABASE_SERVICE_KEY)}")
+        _log_insert_error(table, e)
+        raise
+
+# History rows refer to documents, so documents are written first
+write_queue = WriteBehindQueue(_insert_rows, table_order=('generated_documents', 'user_history'))
+
+def _write(table, row):
+    """Queue a row for a batched write, or insert it now if queueing is off or full.
+
+    A row inserted now first flushes the queue, so it never lands before a
+    queued row it refers to, such as the document of a history entry.
+    """
+    if WRITE_BEHIND_ENABLED:
+        if write_queue.enqueue(table, row):
+            return [row]
+        write_queue.flush()
+    return get_repository().insert_rows(table, [row])
+
+def _encode_cursor(row, column):
+    """Cursor for the page after ``row``: its sort value and id."""
+    return f"{row.get(column)}{CURSOR_SEPARATOR}{row.get('id')}"
+
+def _decode_cursor(cursor):
+    """Return ``(sort value, id)`` from a cursor, or None for a missing or malformed one."""
+    value, separator, row_id = (cursor or '').rpartition(CURSOR_SEPARATOR)
+    if not separator or not value or not row_id:
+        return None
+    return value, row_id
+
+def flush_pending_writes():
+    """Write any queued rows now so a following read sees them."""
+    write_queue.flush()
 
 def add_user_history(user_id, action, details=None, document_id=None):
     try:
-        # Skip history if no user_id or no supabase client
-        if not user_id or not supabase:
-            print(f"Skipping history: user_id={user_id}, supabase_client={bool(supabase)}")
+        repository = get_repository()
+        # Skip history if no user_id or no database
+        if not user_id or not repository.available():
+            print(f"Skipping history: user_id={user_id}, backend={repository.name}, available={repository.available()}")
             return None
             
         # Ensure user_id is a string
@@ -38,88 +83,107 @@ def add_user_history(user_id, action, details=None, document_id=None):
             'timestamp': datetime.utcnow().isoformat()
         }
         
-        print(f"Inserting history: {data}")
-        response = supabase.table('user_history').insert(data).execute()
-        print(f"History insert response: {response.data}")
-        
-        if response.data:
-            print(f"✅ Successfully added history record for user {user_id_str}: {action}")
-        else:
+        result = _write('user_history', data)
+        if not result:
             print(f"⚠️ History insert returned empty data for user {user_id_str}")
-            
-        return response.data
+        return result
     except Exception as e:
-        error_msg = str(e)
-        if 'violates foreign key constraint' in error_msg and 'users' in error_msg:
-            print(f"❌ ERROR: Users table missing. Please run the SQL setup script first.")
-            print(f"The user_id {user_id} doesn't exist in the users table.")
-        elif 'Could not find the table' in error_msg:
-            print(f"❌ ERROR: Required database tables are missing. Please run the SQL setup script.")
-        else:
-            print(f"❌ ERROR in add_user_history: {e}")
-            import traceback
-            print(f"Full traceback: {traceback.format_exc()}")
+        _log_insert_error('user_history', e, user_id)
         return None
 
-def get_user_history(user_id, limit=50):
+def get_user_history(user_id, limit=HISTORY_PAGE_SIZE, before=None):
+    """Get a page of the user's history, newest first.
+
+    ``before`` is a keyset cursor holding the timestamp and id of the last
+    row of the previous page.
+    """
     try:
-        if not user_id or not supabase:
-            print(f"Cannot get history: user_id={user_id}, supabase_client={bool(supabase)}")
+        repository = get_repository()
+        if not user_id or not repository.available():
+            print(f"Cannot get history: user_id={user_id}, backend={repository.name}, available={repository.available()}")
             return []
             
-        print(f"Fetching history for user: {user_id}")
-        response = supabase.table('user_history').select('*').eq('user_id', user_id).order('timestamp', desc=True).limit(limit).execute()
-        print(f"History fetch response: {len(response.data) if response.data else 0} records")
-        return response.data
+        flush_pending_writes()
+        rows = repository.list_history(user_id, HISTORY_LIST_COLUMNS, limit, _decode_cursor(before))
+        print(f"History fetch response: {len(rows) if rows else 0} records")
+        return rows
     except Exception as e:
         print(f"Supabase connection error in get_user_history: {e}")
         import traceback
         print(f"Full traceback: {traceback.format_exc()}")
         return []
 
-def save_generated_document(user_id, document_type, language, title, content, data=None):
-    """Save a generated document to the database"""
+def save_generated_document(user_id, document_type, language, title, content, data=None, document_id=None):
+    """Save a generated document to the database.
+
+    The document id is generated here rather than by the database, so the
+    row can be written behind the response while callers still get its id.
+    """
     try:
-        if not user_id or not supabase:
-            print(f"Cannot save document: user_id={user_id}, supabase_client={bool(supabase)}")
+        repository = get_repository()
+        if not user_id or not repository.available():
+            print(f"Cannot save document: user_id={user_id}, backend={repository.name}, available={repository.available()}")
             return None
             
         document_data = {
+            'id': document_id or str(uuid.uuid4()),
             'user_id': user_id,
             'document_type': document_type,
             'language': language,
             'title': title,
             'content': content,
-            'data': data
+            'data': data,
+            'excerpt': (content or '')[:EXCERPT_LENGTH],
+            'created_at': datetime.utcnow().isoformat()
         }
         
         print(f"Saving document: {document_type} for user {user_id}")
-        response = supabase.table('generated_documents').insert(document_data).execute()
-        print(f"Document save response: {response.data}")
-        return response.data
+        return _write('generated_documents', document_data)
     except Exception as e:
         print(f"ERROR in save_generated_document: {e}")
         return None
 
-def get_user_documents(user_id, limit=50):
-    """Get user's generated documents"""
+def get_user_documents(user_id, limit=HISTORY_PAGE_SIZE, before=None):
+    """Get a page of the user's generated documents, newest first.
+
+    Only listing columns and a short excerpt are fetched. ``before`` holds
+    the created_at and id of the last document of the previous page.
+    """
     try:
-        if not user_id or not supabase:
-            print(f"Cannot get documents: user_id={user_id}, supabase_client={bool(supabase)}")
-            return []
-        
-        # Check if generated_documents table exists
-        try:
-            supabase.table('generated_documents').select('id').limit(1).execute()
-        except Exception as table_error:
-            print(f"generated_documents table not found: {table_error}")
+        repository = get_repository()
+        if not user_id or not repository.available():
+            print(f"Cannot get documents: user_id={user_id}, backend={repository.name}, available={repository.available()}")
             return []
-            
-        print(f"Fetching documents for user: {user_id}")
-        response = supabase.table('generated_documents').select('*').eq('user_id', user_id).order('created_at', desc=True).limit(limit).execute()
-        print(f"Documents fetch response: {len(response.data) if response.data else 0} records")
-        print(f"Raw documents response: {response.data}")
-        return response.data
+
+        flush_pending_writes()
+        rows = repository.list_documents(user_id, DOCUMENT_LIST_COLUMNS, limit, _decode_cursor(before))
+        print(f"Documents fetch response: {len(rows) if rows else 0} records")
+        return rows
     except Exception as e:
         print(f"ERROR in get_user_documents: {e}")
         return []
+
+def get_saved_document(doc_id, user_id):
+    """Get one of the user's saved documents with its full content, or None."""
+    flush_pending_writes()
+    return get_repository().get_document(doc_id, user_id)
+
+def get_history_page(user_id, history_before=None, documents_before=None, limit=HISTORY_PAGE_SIZE):
+    """Fetch a page of history and of documents concurrently.
+
+    Returns the rows, the cursors the page was fetched with, and the
+    cursors for the next pages, which are None when there are no more rows.
+    """
+    flush_pending_writes()
+    history_future = _listing_executor.submit(get_user_history, user_id, limit, history_before)
+    documents_future = _listing_executor.submit(get_user_documents, user_id, limit, documents_before)
+    history = history_future.result() or []
+    documents = documents_future.result() or []
+    return {
+        'history': history,
+        'documents': documents,
+        'history_before': history_before,
+        'documents_before': documents_before,
+        'next_history_cursor': _encode_cursor(history[-1], 'timestamp') if len(history) == limit else None,
+        'next_documents_cursor': _encode_cursor(documents[-1], 'created_at') if len(documents) == limit else None,
+    }
@@ -0,0 +1,333 @@
+"""Storage backends for history, saved documents and user profiles.
+
+``history`` and ``users`` talk to a ``Repository`` rather than to Supabase
+directly. ``SupabaseRepository`` is the production backend. ``SQLiteRepository``
+keeps the same tables and indexes as supabase_setup.sql in a local WAL-mode
+SQLite file, so the app, tests and benchmarks run offline with
+sub-millisecond writes. The backend is chosen with ``DATA_BACKEND``
+(``supabase`` or ``sqlite``).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.models.db import get_supabase, execute, record_call
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'supabase').lower()
+SQLITE_DB_PATH = os.getenv('SQLITE_DB_PATH', os.path.join(PROJECT_ROOT, 'data', 'app.sqlite3'))
+
+# Mirrors supabase_setup.sql; UUIDs, timestamps and JSONB are stored as TEXT
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    email TEXT,
+    language_preference TEXT NOT NULL DEFAULT 'en',
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS user_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    details TEXT,
+    document_id TEXT,
+    timestamp TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS generated_documents (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    document_type TEXT NOT NULL,
+    language TEXT DEFAULT 'en',
+    title TEXT,
+    content TEXT NOT NULL,
+    excerpt TEXT,
+    data TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_profiles_user_id ON user_profiles(user_id);
+CREATE INDEX IF NOT EXISTS idx_user_profiles_email ON user_profiles(email);
+CREATE INDEX IF NOT EXISTS idx_user_profiles_language_preference ON user_profiles(language_preference);
+CREATE INDEX IF NOT EXISTS idx_user_history_user_id ON user_history(user_id);
+CREATE INDEX IF NOT EXISTS idx_user_history_timestamp ON user_history(timestamp);
+CREATE INDEX IF NOT EXISTS idx_generated_documents_user_id ON generated_documents(user_id);
+CREATE INDEX IF NOT EXISTS idx_generated_documents_created_at ON generated_documents(created_at);
+DROP INDEX IF EXISTS idx_user_history_user_id_timestamp;
+DROP INDEX IF EXISTS idx_generated_documents_user_id_created_at;
+CREATE INDEX IF NOT EXISTS idx_user_history_user_id_timestamp_id ON user_history(user_id, timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_generated_documents_user_id_created_at_id ON generated_documents(user_id, created_at DESC, id DESC);
+"""
+
+# Columns accepted by SQLiteRepository.insert_rows; anything else is rejected like PostgREST would
+TABLE_COLUMNS = {
+    'user_profiles': ('user_id', 'email', 'language_preference', 'created_at', 'updated_at'),
+    'user_history': ('user_id', 'action', 'details', 'document_id', 'timestamp'),
+    'generated_documents': ('id', 'user_id', 'document_type', 'language', 'title', 'content', 'excerpt',
+                            'data', 'created_at', 'updated_at'),
+}
+JSON_COLUMNS = {'generated_documents': ('data',)}
+
+
+class Repository:
+    """Data access used by the history and profile functions."""
+
+    name = 'base'
+
+    def available(self) -> bool:
+        raise NotImplementedError
+
+    def insert_rows(self, table: str, rows: List[Dict]) -> List[Dict]:
+        """Insert rows in one round-trip and return them as stored."""
+        raise NotImplementedError
+
+    def list_history(self, user_id: str, columns: str, limit: int,
+                     before: Optional[Tuple[str, str]] = None) -> List[Dict]:
+        """List history newest first, ordered by ``(timestamp, id)``.
+
+        ``before`` is the ``(timestamp, id)`` of the last row of the
+        previous page; the id breaks ties between rows written in the same
+        instant, so none is skipped or repeated across pages.
+        """
+        raise NotImplementedError
+
+    def list_documents(self, user_id: str, columns: str, limit: int,
+                       before: Optional[Tuple[str, str]] = None) -> List[Dict]:
+        """List documents newest first, ordered by ``(created_at, id)``; see ``list_history``."""
+        raise NotImplementedError
+
+    def get_document(self, doc_id: str, user_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def upsert_profile(self, user_id: str, email: Optional[str] = None) -> Optional[Dict]:
+        """Create the profile or update its email, keeping other columns."""
+        raise NotImplementedError
+
+    def get_profile(self, user_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def find_user_id_by_email(self, email: str) -> Optional[str]:
+        raise NotImplementedError
+
+
+class SupabaseRepository(Repository):
+    """Repository backed by the shared Supabase client."""
+
+    name = 'supabase'
+
+    def available(self) -> bool:
+        return get_supabase() is not None
+
+    def insert_rows(self, table, rows):
+        return execute(table, 'insert', get_supabase().table(table).insert(rows)).data
+
+    def list_history(self, user_id, columns, limit, before=None):
+        query = get_supabase().table('user_history').select(columns).eq('user_id', user_id)
+        if before:
+            query = query.or_(self._keyset_filter('timestamp', before))
+        query = query.order('timestamp', desc=True).order('id', desc=True)
+        return execute('user_history', 'select', query.limit(limit)).data
+
+    def list_documents(self, user_id, columns, limit, before=None):
+        query = get_supabase().table('generated_documents').select(columns).eq('user_id', user_id)
+        if before:
+            query = query.or_(self._keyset_filter('created_at', before))
+        query = query.order('created_at', desc=True).order('id', desc=True)
+        return execute('generated_documents', 'select', query.limit(limit)).data
+
+    @staticmethod
+    def _keyset_filter(column, before):
+        # Values are quoted because timestamps contain PostgREST's reserved characters
+        value, row_id = before
+        return f'{column}.lt."{value}",and({column}.eq."{value}",id.lt."{row_id}")'
+
+    def get_document(self, doc_id, user_id):
+        query = get_supabase().table('generated_documents').select('*').eq('id', doc_id).eq('user_id', user_id)
+        response = execute('generated_documents', 'select', query)
+        return response.data[0] if response.data else None
+
+    def upsert_profile(self, user_id, email=None):
+        data = {'user_id': user_id}
+        if email:
+            data['email'] = email
+        query = get_supabase().table('user_profiles').upsert(data, on_conflict='user_id')
+        response = execute('user_profiles', 'upsert', query)
+        return response.data[0] if response.data else None
+
+    def get_profile(self, user_id):
+        query = get_supabase().table('user_profiles').select('*').eq('user_id', user_id)
+        response = execute('user_profiles', 'select', query)
+        return response.data[0] if response.data else None
+
+    def find_user_id_by_email(self, email):
+        supabase = get_supabase()
+        query = supabase.table('user_profiles').select('user_id').eq('email', email).limit(1)
+        response = execute('user_profiles', 'select', query)
+        if response.data:
+            return response.data[0]['user_id']
+        # Users without a profile row are found through the auth.users email index
+        return execute('get_user_id_by_email', 'rpc', supabase.rpc('get_user_id_by_email', {'p_email': email})).data
+
+
+class SQLiteRepository(Repository):
+    """Repository backed by a local SQLite database in WAL mode."""
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = SQLITE_DB_PATH):
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return True
+
+    def _connection(self):
+        # A connection must not be used across a fork, so children reconnect
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.executescript(SQLITE_SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _timed(self, table: str, operation: str):
+        """Hold the connection lock and record the call in the shared query stats."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            with self._lock:
+                yield self._connection()
+            ok = True
+        finally:
+            record_call(table, operation, (time.perf_counter() - started) * 1000, ok)
+
+    @staticmethod
+    def _row(table: str, row: sqlite3.Row) -> Dict:
+        item = dict(row)
+        for column in JSON_COLUMNS.get(table, ()):
+            if item.get(column) is not None:
+                item[column] = json.loads(item[column])
+        return item
+
+    @staticmethod
+    def _columns(table: str, columns: str) -> str:
+        if columns.strip() == '*':
+            return '*'
+        names = [name.strip() for name in columns.split(',')]
+        allowed = TABLE_COLUMNS[table] + ('id',)
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown columns for {table}: {', '.join(unknown)}")
+        return ', '.join(names)
+
+    def insert_rows(self, table, rows):
+        if not rows:
+            return []
+        allowed = TABLE_COLUMNS[table]
+        columns = sorted({column for row in rows for column in row})
+        unknown = [column for column in columns if column not in allowed]
+        if unknown:
+            raise ValueError(f"Could not find the {', '.join(unknown)} column(s) of {table}")
+        json_columns = JSON_COLUMNS.get(table, ())
+        values = [
+            tuple(json.dumps(row.get(column)) if column in json_columns and row.get(column) is not None
+                  else row.get(column) for column in columns)
+            for row in rows
+        ]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with self._timed(table, 'insert') as conn:
+            with conn:
+                conn.executemany(sql, values)
+        return rows
+
+    def list_history(self, user_id, columns, limit, before=None):
+        sql = f"SELECT {self._columns('user_history', columns)} FROM user_history WHERE user_id = ?"
+        params = [user_id]
+        if before:
+            sql += ' AND (timestamp < ? OR (timestamp = ? AND id < ?))'
+            params.extend([before[0], before[0], before[1]])
+        sql += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+        with self._timed('user_history', 'select') as conn:
+            rows = conn.execute(sql, params + [limit]).fetchall()
+        return [self._row('user_history', row) for row in rows]
+
+    def list_documents(self, user_id, columns, limit, before=None):
+        sql = f"SELECT {self._columns('generated_documents', columns)} FROM generated_documents WHERE user_id = ?"
+        params = [user_id]
+        if before:
+            sql += ' AND (created_at < ? OR (created_at = ? AND id < ?))'
+            params.extend([before[0], before[0], before[1]])
+        sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+        with self._timed('generated_documents', 'select') as conn:
+            rows = conn.execute(sql, params + [limit]).fetchall()
+        return [self._row('generated_documents', row) for row in rows]
+
+    def get_document(self, doc_id, user_id):
+        with self._timed('generated_documents', 'select') as conn:
+            row = conn.execute(
+                'SELECT * FROM generated_documents WHERE id = ? AND user_id = ?', (doc_id, user_id)
+            ).fetchone()
+        return self._row('generated_documents', row) if row else None
+
+    def upsert_profile(self, user_id, email=None):
+        now = datetime.utcnow().isoformat()
+        with self._timed('user_profiles', 'upsert') as conn:
+            with conn:
+                row = conn.execute(
+                    'INSERT INTO user_profiles (user_id, email) VALUES (?, ?)'
+                    ' ON CONFLICT(user_id) DO UPDATE SET email = COALESCE(excluded.email, email), updated_at = ?'
+                    ' RETURNING *',
+                    (user_id, email, now)
+                ).fetchone()
+        return dict(row) if row else None
+
+    def get_profile(self, user_id):
+        with self._timed('user_profiles', 'select') as conn:
+            row = conn.execute('SELECT * FROM user_profiles WHERE user_id = ?', (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_user_id_by_email(self, email):
+        with self._timed('user_profiles', 'select') as conn:
+            row = conn.execute('SELECT user_id FROM user_profiles WHERE email = ? LIMIT 1', (email,)).fetchone()
+        return row['user_id'] if row else None
+
+
+BACKENDS = {
+    'supabase': SupabaseRepository,
+    'sqlite': SQLiteRepository,
+}
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_repository() -> Repository:
+    """Return the process-wide repository selected by DATA_BACKEND."""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                if DATA_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown DATA_BACKEND {DATA_BACKEND!r}; expected one of {', '.join(BACKENDS)}")
+                _repository = BACKENDS[DATA_BACKEND]()
+                print(f"Using {_repository.name} data backend")
+    return _repository
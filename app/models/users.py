@@ -1,26 +1,22 @@
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from app.models.db import get_supabase
+from app.models.repository import get_repository
+from app.utils.ttl_cache import TTLCache
 
-load_dotenv()
+USER_LOOKUP_CACHE_TTL = float(os.getenv('USER_LOOKUP_CACHE_TTL', '300'))
+PROFILE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', '300'))
 
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_KEY')
-
-# Initialize Supabase client with service key for server-side operations
-supabase = None
-if SUPABASE_URL and SUPABASE_SERVICE_KEY and SUPABASE_URL != 'your_supabase_url_here':
-    try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    except Exception as e:
-        print(f"Failed to initialize Supabase client: {e}")
-        supabase = None
+# email -> user id mappings resolved by get_user_by_email or seen at login
+_user_id_by_email = TTLCache(USER_LOOKUP_CACHE_TTL, max_entries=10000)
+# user_profiles rows keyed by user id
+_profiles = TTLCache(PROFILE_CACHE_TTL, max_entries=10000)
 
 def get_user(user_id):
+    supabase = get_supabase()
     if not supabase:
         return None
     try:
-        # Get from auth user
+        # Auth users live in Supabase Auth whatever DATA_BACKEND is set to
         auth_response = supabase.auth.admin.get_user_by_id(user_id)
         if auth_response.user:
             return auth_response.user
@@ -28,45 +24,77 @@ def get_user(user_id):
         print(f"Error in get_user: {e}")
     return None
 
-def get_user_by_email(email):
-    if not supabase:
+def remember_user_email(user_id, email):
+    """Record an email -> user id mapping seen elsewhere, e.g. at login."""
+    if user_id and email:
+        _user_id_by_email.set(email.lower(), str(user_id))
+
+def get_user_id_by_email(email):
+    """Resolve an email to a user id through indexed lookups only.
+
+    Tries the cache, then the email-indexed user_profiles table, then the
+    get_user_id_by_email RPC (defined in supabase_setup.sql), which uses
+    the auth.users email index. Cost does not grow with the user base.
+    """
+    repository = get_repository()
+    if not repository.available() or not email:
         return None
+    email = email.lower()
+    user_id = _user_id_by_email.get(email)
+    if user_id:
+        return user_id
     try:
-        # Get user from Supabase Auth by email
-        response = supabase.auth.admin.list_users()
-        for user in response.users:
-            if user.email == email:
-                return user
+        user_id = repository.find_user_id_by_email(email)
     except Exception as e:
-        print(f"Supabase connection error in get_user_by_email: {e}")
+        print(f"Database error in get_user_id_by_email: {e}")
+        return None
+    if user_id:
+        remember_user_email(user_id, email)
+    return user_id
+
+def get_user_by_email(email):
+    if not get_repository().available():
+        return None
+    user_id = get_user_id_by_email(email)
+    if user_id:
+        return get_user(user_id)
     return None
 
 def add_user_profile(user_id, email=None, username=None):
-    if not supabase:
+    """Get or create the user's profile in a single idempotent upsert.
+
+    Only ``user_id`` and ``email`` are sent, so an existing row keeps its
+    language preference. Profiles are cached per process, so repeat logins
+    within PROFILE_CACHE_TTL make no database call at all.
+    """
+    repository = get_repository()
+    if not repository.available():
         return None
+    remember_user_email(user_id, email)
+    profile = _profiles.get(str(user_id))
+    if profile is not None:
+        return profile
     try:
-        # Check if user already exists in user_profiles table
-        existing_user = get_user_profile(user_id)
-        if existing_user:
-            return existing_user
-
-        data = {
-            'user_id': user_id,
-            'language_preference': 'en'
-        }
-        response = supabase.table('user_profiles').insert(data).execute()
-        return response.data
+        profile = repository.upsert_profile(user_id, email.lower() if email else None)
+        if profile:
+            _profiles.set(str(user_id), profile)
+            return profile
     except Exception as e:
         print(f"Error in add_user_profile: {e}")
-        return None
+    return None
 
 def get_user_profile(user_id):
-    if not supabase:
+    repository = get_repository()
+    if not repository.available():
         return None
+    profile = _profiles.get(str(user_id))
+    if profile is not None:
+        return profile
     try:
-        response = supabase.table('user_profiles').select('*').eq('user_id', user_id).execute()
-        if response.data:
-            return response.data[0]
+        profile = repository.get_profile(user_id)
+        if profile:
+            _profiles.set(str(user_id), profile)
+            return profile
     except Exception as e:
         print(f"Error in get_user_profile: {e}")
     return None
@@ -0,0 +1,202 @@
+"""In-process write-behind queue for database inserts.
+
+Rows are buffered and written in per-table batches by a background thread,
+so request handlers do not wait for a database round-trip. A batch is
+flushed once ``max_batch`` rows are buffered or ``flush_interval`` seconds
+have passed. Failed batches are retried with backoff, and the buffer is
+drained at interpreter shutdown. The buffer is bounded: when it is full
+``enqueue`` returns False and the caller writes synchronously instead.
+
+Flushes are serialised: ``flush`` returns only once every row buffered
+before the call is written, including a batch the background thread took
+a moment earlier, so readers can flush to see their own writes, and
+batches reach the database in the order their rows were buffered, except
+that tables named in ``table_order`` are written first in each flush.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Sequence
+
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+WRITE_BEHIND_MAX_BATCH = int(os.getenv('WRITE_BEHIND_MAX_BATCH', '50'))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', '1.0'))
+WRITE_BEHIND_MAX_BUFFER = int(os.getenv('WRITE_BEHIND_MAX_BUFFER', '10000'))
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv('WRITE_BEHIND_MAX_RETRIES', '3'))
+
+
+class WriteBehindQueue:
+    """Batches rows per table and writes them with ``writer(table, rows)``."""
+
+    def __init__(self, writer: Callable[[str, List[Dict]], None], max_batch: int = WRITE_BEHIND_MAX_BATCH,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL, max_buffer: int = WRITE_BEHIND_MAX_BUFFER,
+                 max_retries: int = WRITE_BEHIND_MAX_RETRIES, table_order: Sequence[str] = ()):
+        self.writer = writer
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        # Tables written first in each flush, so rows referring to them land after them
+        self.table_order = tuple(table_order)
+
+        self._buffer = []
+        self._cond = threading.Condition()
+        # Held from taking a batch until it is written or put back for a retry
+        self._flush_lock = threading.Lock()
+        # Failed attempts of the batch at the front of the buffer, and when to retry it
+        self._attempts = 0
+        self._retry_at = 0.0
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.counters = {
+            'enqueued': 0,
+            'rejected': 0,
+            'written': 0,
+            'batches': 0,
+            'retries': 0,
+            'failed': 0,
+        }
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):
+            # A fork while the flusher was writing would leave the lock held forever in the child
+            os.register_at_fork(after_in_child=self._reset_flush_lock)
+
+    def _reset_flush_lock(self):
+        self._flush_lock = threading.Lock()
+        self._attempts = 0
+        self._retry_at = 0.0
+
+    def _ensure_started(self):
+        # A thread started before a pre-fork server forks does not exist in the
+        # children, so each process starts its own flusher on first use.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._buffer = []
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, table: str, row: Dict) -> bool:
+        """Buffer a row for ``table``; return False if the buffer is full or closed."""
+        with self._cond:
+            self._ensure_started()
+            if self._closed or len(self._buffer) >= self.max_buffer:
+                self.counters['rejected'] += 1
+                return False
+            self._buffer.append((table, row))
+            self.counters['enqueued'] += 1
+            if len(self._buffer) >= self.max_batch:
+                self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._buffer) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write everything buffered so far, grouped by table in arrival order.
+
+        Waits for a flush already in progress on another thread, so on
+        return all rows enqueued before the call have been written or
+        dropped after their retries. A failed batch goes back to the front
+        of the buffer and the backoff is slept without holding the flush
+        lock, so other threads can keep enqueueing and flushing.
+        """
+        while True:
+            with self._flush_lock:
+                delay = self._retry_at - time.monotonic()
+                if delay <= 0:
+                    if self._flush_once():
+                        return
+                    delay = self._retry_at - time.monotonic()
+            time.sleep(max(delay, 0.0))
+
+    def _batches(self, pending):
+        batches = OrderedDict((table, []) for table in self.table_order)
+        for table, row in pending:
+            batches.setdefault(table, []).append(row)
+        return [(table, rows[start:start + self.max_batch])
+                for table, rows in batches.items()
+                for start in range(0, len(rows), self.max_batch)]
+
+    def _flush_once(self) -> bool:
+        """Write the buffer; return False if a batch must be retried after the backoff."""
+        with self._cond:
+            pending, self._buffer = self._buffer, []
+        if not pending:
+            return True
+
+        batches = self._batches(pending)
+        for i, (table, rows) in enumerate(batches):
+            if not self._write(table, rows):
+                retry = [(table, row) for table, rows in batches[i:] for row in rows]
+                with self._cond:
+                    self._buffer[:0] = retry
+                return False
+        return True
+
+    def _write(self, table: str, rows: List[Dict]) -> bool:
+        """Write one batch; return False if it failed and should be retried."""
+        try:
+            self.writer(table, rows)
+        except Exception as e:
+            print(f"Write-behind batch of {len(rows)} rows to {table} failed (attempt {self._attempts + 1}): {e}")
+            if self._attempts < self.max_retries:
+                self._retry_at = time.monotonic() + min(0.2 * (2 ** self._attempts), 5.0)
+                self._attempts += 1
+                with self._cond:
+                    self.counters['retries'] += 1
+                return False
+        else:
+            self._attempts = 0
+            with self._cond:
+                self.counters['written'] += len(rows)
+                self.counters['batches'] += 1
+            return True
+
+        self._attempts = 0
+        if len(rows) == 1:
+            print(f"Dropping row for {table} after {self.max_retries} retries")
+            with self._cond:
+                self.counters['failed'] += 1
+            return True
+
+        # Isolate rows that keep failing so one bad row does not drop the batch
+        for row in rows:
+            try:
+                self.writer(table, [row])
+                written, failed = 1, 0
+            except Exception as e:
+                print(f"Dropping row for {table} after retries: {e}")
+                written, failed = 0, 1
+            with self._cond:
+                self.counters['written'] += written
+                self.counters['failed'] += failed
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting rows and drain the buffer."""
+        with self._cond:
+            if self._closed or self._pid != os.getpid():
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return dict(self.counters, buffered=len(self._buffer))
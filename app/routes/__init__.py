@@ -6,15 +6,11 @@ auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 main_bp = Blueprint('main', __name__)
 document_bp = Blueprint('document', __name__)
 
-try:
-    # Import routes to register them with blueprints
-    from . import auth_routes
-    from . import main_routes
-    from . import document
+# Import routes to register them with blueprints. A failing import is a
+# broken deployment, so it propagates instead of leaving routes missing.
+from . import auth_routes  # noqa: E402,F401
+from . import main_routes  # noqa: E402,F401
+from . import document  # noqa: E402,F401
 
-    # Import error handlers
-    from . import errors
-except Exception as e:
-    print(f"Error in routes/__init__.py: {str(e)}")
-    import traceback
-    traceback.print_exc()
+# Import error handlers
+from . import errors  # noqa: E402,F401
@@ -1,20 +1,21 @@
 """Authentication routes for the application."""
 import os
-import jwt
 from flask import render_template, redirect, url_for, request, flash, session, jsonify
-from supabase import create_client, Client
-from google.oauth2 import id_token
-from google.auth.transport import requests
 
 from . import auth_bp
 from app.models.users import get_user, get_user_by_email, add_user_profile, get_user_profile
 from app.models.history import add_user_history
+from app.models.db import get_auth_client
 
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_KEY')  # Use service role key for server-side operations
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def _verify_google_token(credential):
+    """Verify a Google ID token; google-auth is only imported when Google sign-in is used"""
+    from google.oauth2 import id_token
+    from google.auth.transport import requests
+    return id_token.verify_oauth2_token(credential, requests.Request(), GOOGLE_CLIENT_ID)
 
 @auth_bp.route('/login', methods=['GET'])
 def login():
@@ -45,7 +46,7 @@ def api_signup():
             return jsonify({'error': 'Password must be at least 6 characters long'}), 400
 
         # Sign up with Supabase Auth
-        response = supabase.auth.sign_up({
+        response = get_auth_client().auth.sign_up({
             'email': email,
             'password': password,
             'options': {
@@ -98,16 +99,14 @@ def api_login():
             return jsonify({'error': 'Please enter a valid email address'}), 400
 
         # Sign in with Supabase Auth
-        response = supabase.auth.sign_in_with_password({
+        response = get_auth_client().auth.sign_in_with_password({
             'email': email,
             'password': password
         })
 
         if response.user and response.session:
-            # Get or create user profile
-            profile = get_user_profile(response.user.id)
-            if not profile:
-                add_user_profile(response.user.id, response.user.email, response.user.email.split('@')[0])
+            # Get or create user profile in one upsert; the history row below is written behind
+            add_user_profile(response.user.id, response.user.email, response.user.email.split('@')[0])
 
             # Store user data in session
             session['user_id'] = response.user.id
@@ -155,8 +154,7 @@ def api_google_login():
             return jsonify({'error': 'Google OAuth not configured'}), 400
             
         # Verify the Google ID token
-        idinfo = id_token.verify_oauth2_token(
-            credential, requests.Request(), GOOGLE_CLIENT_ID)
+        idinfo = _verify_google_token(credential)
         
         if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
             return jsonify({'error': 'Invalid token issuer'}), 400
@@ -166,13 +164,13 @@ def api_google_login():
         
         # Check if user exists in Supabase
         try:
-            response = supabase.auth.sign_in_with_password({
+            response = get_auth_client().auth.sign_in_with_password({
                 'email': email,
                 'password': 'google_oauth_user'  # Placeholder password
             })
         except:
             # User doesn't exist, create account
-            response = supabase.auth.sign_up({
+            response = get_auth_client().auth.sign_up({
                 'email': email,
                 'password': 'google_oauth_user',
                 'options': {
@@ -184,10 +182,8 @@ def api_google_login():
             })
         
         if response.user:
-            # Get or create user profile
-            profile = get_user_profile(response.user.id)
-            if not profile:
-                add_user_profile(response.user.id, response.user.email, name or response.user.email.split('@')[0])
+            # Get or create user profile in one upsert; the history row below is written behind
+            add_user_profile(response.user.id, response.user.email, name or response.user.email.split('@')[0])
             
             # Store user data in session
             session['user_id'] = response.user.id
@@ -229,8 +225,7 @@ def api_google_signup():
             return jsonify({'error': 'Google OAuth not configured'}), 400
             
         # Verify the Google ID token
-        idinfo = id_token.verify_oauth2_token(
-            credential, requests.Request(), GOOGLE_CLIENT_ID)
+        idinfo = _verify_google_token(credential)
         
         if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
             return jsonify({'error': 'Invalid token issuer'}), 400
@@ -239,7 +234,7 @@ def api_google_signup():
         name = idinfo.get('name', '')
         
         # Create new user account
-        response = supabase.auth.sign_up({
+        response = get_auth_client().auth.sign_up({
             'email': email,
             'password': 'google_oauth_user',
             'options': {
@@ -284,7 +279,7 @@ def api_google_signup():
 @auth_bp.route('/logout')
 def logout():
     try:
-        supabase.auth.sign_out()
+        get_auth_client().auth.sign_out()
     except:
         pass
     session.pop('user_id', None)
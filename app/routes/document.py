@@ -1,537 +1,59 @@
 """Document generation routes."""
-from flask import render_template, request, flash, session, jsonify
+from flask import render_template, request, flash, session, jsonify, send_file, Response
 from . import document_bp
-from app.services.processor import LegalDocumentProcessor
-from app.models.history import add_user_history, save_generated_document
-import spacy
+from app.services.processor import PROMPT_BATCH_SIZE, PROMPT_N_PROCESS, UNKNOWN_DOCUMENT_TYPE
+from app.services.container import services
+from app.services.entity_extraction import ENTITY_MAX_CONTENT, entity_extractor
+from app.services.translation import get_translation_service
+from app.models.repository import get_repository
+from app.models.history import add_user_history, save_generated_document, get_saved_document
+from app.services.exporter import MIMETYPES, export_document, export_stats
+from app.services.default_data import get_default_data_for_document
+from app.services.document_schema import SCHEMAS
+from app.services import bulk
+from app.services.custom_template_store import VersionLimitError
+from app.services.template_sandbox import CUSTOM_TEMPLATE_MAX_SOURCE, TemplateLimitError, check_source
+import io
 import json
+import os
+import shutil
 import tempfile
-from docx import Document
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_JUSTIFY
-from reportlab.lib.units import inch
 from datetime import datetime
-try:
-    from dateutil.relativedelta import relativedelta
-except ImportError:
-    # Fallback if dateutil is not available
-    relativedelta = None
 import re
-import requests
 
 
-nlp = spacy.load('en_core_web_sm')
-processor = LegalDocumentProcessor()
-
-def translate_text(text, target_lang):
-    """Translate text using MyMemory API"""
-    if not text.strip():
-        return text
-
-    try:
-        url = f"https://api.mymemory.translated.net/get?q={text}&langpair=en|{target_lang}"
-        print(f"Translating: '{text}' to {target_lang} using URL: {url}")
-        response = requests.get(url, timeout=5)
-        data = response.json()
-        print(f"Translation response: {data}")
-        if data['responseStatus'] == 200:
-            translated = data['responseData']['translatedText']
-            print(f"Translated '{text}' to '{translated}'")
-            return translated
-        else:
-            print(f"Translation failed for '{text}'")
-            return text  # Fallback to original text
-    except Exception as e:
-        print(f"Translation error for '{text}': {e}")
-        return text  # Fallback to original text
-
-def get_default_data_for_document(doc_type, language):
-    """Get default data for realistic document generation"""
-    current_date = datetime.now()
-    
-    defaults = {
-        'date': current_date.strftime('%B %d, %Y'),
-        'month': current_date.strftime('%B'),
-        'year': current_date.strftime('%Y'),
-        'execution_date': current_date.strftime('%d/%m/%Y'),
-        'execution_place': 'Chennai',
-        'witness1_name': 'Mr. Witness One',
-        'witness1_address': 'No. 123, Main Street, Chennai - 600001',
-        'witness2_name': 'Mr. Witness Two', 
-        'witness2_address': 'No. 456, Second Street, Chennai - 600002',
-        'jurisdiction': 'Chennai',
-        'registration_office': 'Chennai',
-        'stamp_duty_bearer': 'Vendee'
-    }
-    
-    if doc_type == 'rental_agreement':
-        defaults.update({
-            'owner_age': '45',
-            'renter_age': '35',
-            'owner_father': 'Father Name',
-            'renter_father': 'Father Name',
-            'owner_address': 'No. 123, Main Street',
-            'owner_city': 'Chennai',
-            'owner_pincode': '600001',
-            'renter_address': 'No. 456, Second Street',
-            'renter_city': 'Chennai',
-            'renter_pincode': '600002',
-            'property_address': 'No. 789, Property Street',
-            'property_city': 'Chennai',
-            'property_pincode': '600073',
-            'start_date': '1st April 2024',
-            'effective_date': '1st April 2024',
-            'duration': '11',
-            'renewal_period': '11',
-            'rent_amount': '15,000',
-            'rent_amount_words': 'Fifteen Thousand',
-            'rent_due_date': '1st',
-            'rent_increase_percentage': '10',
-            'security_deposit': '30,000',
-            'security_deposit_words': 'Thirty Thousand',
-            'notice_period': '2'
-        })
-    elif doc_type == 'land_sale_deed':
-        defaults.update({
-            'seller_age': '50',
-            'buyer_age': '40',
-            'seller_father': 'Father Name',
-            'buyer_father': 'Father Name',
-            'seller_address': 'No. 123, Main Street',
-            'seller_city': 'Chennai',
-            'seller_pincode': '600001',
-            'buyer_address': 'No. 456, Second Street',
-            'buyer_city': 'Chennai',
-            'buyer_pincode': '600002',
-            'property_address': 'No. 789, Property Street',
-            'property_city': 'Chennai',
-            'property_pincode': '600073',
-            'sale_amount': '50,00,000',
-            'sale_amount_words': 'Fifty Lakhs',
-            'sale_date': '1st April 2024',
-            'survey_number': '123/45',
-            'area': '2400',
-            'north_boundary': 'Main Road',
-            'south_boundary': 'Residential Area',
-            'east_boundary': 'Park',
-            'west_boundary': 'Commercial Area'
-        })
-    elif doc_type == 'power_of_attorney':
-        defaults.update({
-            'principal_age': '55',
-            'attorney_age': '40',
-            'principal_father': 'Father Name',
-            'attorney_father': 'Father Name',
-            'principal_address': 'No. 123, Main Street',
-            'principal_city': 'Chennai',
-            'principal_pincode': '600001',
-            'attorney_address': 'No. 456, Second Street',
-            'attorney_city': 'Chennai',
-            'attorney_pincode': '600002',
-            'matter_description': 'property management and legal representation',
-            'effective_date': '1st April 2024',
-            'expiry_date': '31st March 2025'
-        })
-    elif doc_type == 'house_lease':
-        # Calculate end date based on lease period
-        def calculate_end_date(start_date_str, lease_period_years):
-            try:
-                if relativedelta:
-                    # Handle different date formats
-                    for fmt in ['%dst %B %Y', '%dnd %B %Y', '%drd %B %Y', '%dth %B %Y', '%d %B %Y']:
-                        try:
-                            start_date_obj = datetime.strptime(start_date_str, fmt)
-                            break
-                        except ValueError:
-                            continue
-                    else:
-                        # Fallback to current date
-                        start_date_obj = datetime.now()
-                    
-                    end_date_obj = start_date_obj + relativedelta(years=int(lease_period_years))
-                    day = end_date_obj.day
-                    if day == 1:
-                        suffix = 'st'
-                    elif day == 2:
-                        suffix = 'nd'
-                    elif day == 3:
-                        suffix = 'rd'
-                    else:
-                        suffix = 'th'
-                    return end_date_obj.strftime(f'%d{suffix} %B %Y')
-                else:
-                    # Simple fallback calculation without dateutil
-                    return '31st March 2026'
-            except:
-                return '31st March 2026'
-        
-        end_date_str = calculate_end_date('1st April 2024', '2')
-            
-        defaults.update({
-            'lessor_age': '50',
-            'lessee_age': '35',
-            'lessor_father': 'Father Name',
-            'lessee_father': 'Father Name',
-            'lessor_address': 'No. 123, Main Street',
-            'lessor_city': 'Chennai',
-            'lessor_pincode': '600001',
-            'lessee_address': 'No. 456, Second Street',
-            'lessee_city': 'Chennai',
-            'lessee_pincode': '600002',
-            'property_address': 'No. 789, Property Street',
-            'property_city': 'Chennai',
-            'property_pincode': '600073',
-            'lease_period': '2',
-            'start_date': '1st April 2024',
-            'end_date': end_date_str,
-            'lease_amount': '25,000',
-            'lease_amount_words': 'Twenty Five Thousand',
-            'rent_due_date': '1st',
-            'security_deposit': '50,000',
-            'security_deposit_words': 'Fifty Thousand',
-            'notice_period': '3',
-            'number_of_rooms': '3'
-        })
-    
-    # Apply language-specific translations
-    translations = {
-        'en': {
-            'Father Name': 'Father Name',
-            'Mr. Witness One': 'Mr. Witness One',
-            'Chennai': 'Chennai'
-        },
-        'hi': {
-            'Father Name': 'अपने पिता का नाम',
-            'Mr. Witness One': 'श्री विजय एक',
-            'Chennai': 'चेन्नई'
-        },
-        'bn': {
-            'Father Name': 'আমার পিতার নাম',
-            'Mr. Witness One': 'শ্রী বিজয় এক',
-            'Chennai': 'চেন্নাই'
-        },
-        'te': {
-            'Father Name': 'నా పిల్లి పేరు',
-            'Mr. Witness One': 'శ్రీ విజయ ఒక',
-            'Chennai': 'చెన్నై'
-        },
-        'mr': {
-            'Father Name': 'माझा वडील यांचा नाव',
-            'Mr. Witness One': 'श्री విజయ एक',
-            'Chennai': 'चेन्नई'
-        },
-        'ur': {
-            'Father Name': 'میرے والد کا نام',
-            'Mr. Witness One': 'شری ویجی ہے',
-            'Chennai': 'چینనాی'
-        },
-        'gu': {
-            'Father Name': 'માઝા પિતાનું નામ',
-            'Mr. Witness One': 'શ્રી વિજય એક',
-            'Chennai': 'ચેન્નઈ'
-        },
-        'kn': {
-            'Father Name': 'ನನ್ನ ಪಿತಾನ ಹೆಸರು',
-            'Mr. Witness One': 'ಶ್ರೀ ವಿಜಯ ಒಂದು',
-            'Chennai': 'ಚೆನ್ನಾಯ'
-        },
-        'or': {
-            'Father Name': 'ଆମଦ୍ବାରା ପିତାଙ୍କ ନାମ',
-            'Mr. Witness One': 'ଶ୍ରୀ ବିଜଯ଼ ଏକ',
-            'Chennai': 'ଚେନ୍ନାଇ'
-        },
-        'ta': {
-            'Father Name': 'என் தந்தை பெயர்',
-            'Mr. Witness One': 'சிறுவர் விஜய் ஒன்று',
-            'Chennai': 'சென்னை'
-        }
-    }
-
-    for key, value in defaults.items():
-        if isinstance(value, str) and value in translations.get(language, {}):
-            defaults[key] = translations[language][value]
-        elif isinstance(value, str) and value.lower() in translations.get(language, {}):
-            defaults[key] = translations[language][value.lower()]
-
-    return defaults
-
-documents = {
-    'rental_agreement': {
-        'templates': {
-            'en': 'rental_agreement_template.txt',
-            'hi': 'hi/rental_agreement_template.txt',
-            'bn': 'bn/rental_agreement_template.txt',
-            'te': 'te/rental_agreement_template.txt',
-            'mr': 'mr/rental_agreement_template.txt',
-            'ur': 'ur/rental_agreement_template.txt',
-            'gu': 'gu/rental_agreement_template.txt',
-            'kn': 'kn/rental_agreement_template.txt',
-            'or': 'or/rental_agreement_template.txt',
-            'ta': 'ta/rental_agreement_template.txt'
-        },
-        'fields': ['owner_name', 'owner_age', 'owner_father', 'owner_address', 'owner_city', 'owner_pincode',
-                   'renter_name', 'renter_age', 'renter_father', 'renter_address', 'renter_city', 'renter_pincode',
-                   'property_address', 'property_city', 'property_pincode', 'start_date', 'effective_date',
-                   'duration', 'renewal_period', 'rent_amount', 'rent_amount_words', 'rent_due_date',
-                   'rent_increase_percentage', 'security_deposit', 'security_deposit_words', 'notice_period',
-                   'jurisdiction', 'witness1_name', 'witness1_address', 'witness2_name', 'witness2_address',
-                   'execution_date', 'execution_place', 'date', 'month', 'year']
-    },
-    'land_sale_deed': {
-        'templates': {
-            'en': 'land_sale_deed_template.txt',
-            'hi': 'hi/land_sale_deed_template.txt',
-            'bn': 'bn/land_sale_deed_template.txt',
-            'te': 'te/land_sale_deed_template.txt',
-            'mr': 'mr/land_sale_deed_template.txt',
-            'ur': 'ur/land_sale_deed_template.txt',
-            'gu': 'gu/land_sale_deed_template.txt',
-            'kn': 'kn/land_sale_deed_template.txt',
-            'or': 'or/land_sale_deed_template.txt',
-            'ta': 'ta/land_sale_deed_template.txt'
-        },
-        'fields': ['seller', 'seller_age', 'seller_father', 'seller_address', 'seller_city', 'seller_pincode',
-                   'buyer', 'buyer_age', 'buyer_father', 'buyer_address', 'buyer_city', 'buyer_pincode',
-                   'sale_amount', 'sale_amount_words', 'stamp_duty_bearer', 'registration_office',
-                   'survey_number', 'area', 'north_boundary', 'south_boundary', 'east_boundary', 'west_boundary',
-                   'property_address', 'property_city', 'property_pincode', 'witness1_name', 'witness1_address',
-                   'witness2_name', 'witness2_address', 'execution_date', 'execution_place', 'date', 'month', 'year']
-    },
-    'power_of_attorney': {
-        'templates': {
-            'en': 'power_of_attorney_template.txt',
-            'hi': 'hi/power_of_attorney_template.txt',
-            'bn': 'bn/power_of_attorney_template.txt',
-            'te': 'te/power_of_attorney_template.txt',
-            'mr': 'mr/power_of_attorney_template.txt',
-            'ur': 'ur/power_of_attorney_template.txt',
-            'gu': 'gu/power_of_attorney_template.txt',
-            'kn': 'kn/power_of_attorney_template.txt',
-            'or': 'or/power_of_attorney_template.txt',
-            'ta': 'ta/power_of_attorney_template.txt'
-        },
-        'fields': ['principal', 'principal_age', 'principal_father', 'principal_address', 'principal_city', 'principal_pincode',
-                   'attorney', 'attorney_age', 'attorney_father', 'attorney_address', 'attorney_city', 'attorney_pincode',
-                   'matter_description', 'effective_date', 'expiry_date', 'registration_office', 'stamp_duty_bearer',
-                   'witness1_name', 'witness1_address', 'witness2_name', 'witness2_address', 'execution_date', 'execution_place',
-                   'date', 'month', 'year']
-    },
-    'house_lease': {
-        'templates': {
-            'en': 'house_lease_template.txt',
-            'hi': 'hi/house_lease_template.txt',
-            'bn': 'bn/house_lease_template.txt',
-            'te': 'te/house_lease_template.txt',
-            'mr': 'mr/house_lease_template.txt',
-            'ur': 'ur/house_lease_template.txt',
-            'gu': 'gu/house_lease_template.txt',
-            'kn': 'kn/house_lease_template.txt',
-            'or': 'or/house_lease_template.txt',
-            'ta': 'ta/house_lease_template.txt'
-        },
-        'fields': ['lessor', 'lessor_age', 'lessor_father', 'lessor_address', 'lessor_city', 'lessor_pincode',
-                   'lessee', 'lessee_age', 'lessee_father', 'lessee_address', 'lessee_city', 'lessee_pincode',
-                   'property_address', 'property_city', 'property_pincode', 'lease_period', 'start_date', 'end_date',
-                   'lease_amount', 'lease_amount_words', 'rent_due_date', 'security_deposit', 'security_deposit_words',
-                   'notice_period', 'jurisdiction', 'number_of_rooms', 'witness1_name', 'witness1_address',
-                   'witness2_name', 'witness2_address', 'execution_date', 'execution_place', 'date', 'month', 'year']
-    }
-}
+PROMPT_BATCH_MAX = int(os.getenv('PROMPT_BATCH_MAX', '500'))
+PROMPT_N_PROCESS_MAX = int(os.getenv('PROMPT_N_PROCESS_MAX', str(os.cpu_count() or 1)))
+# How long GET /api/entities/<key> waits for a running extraction before answering 'pending'
+ENTITY_WAIT_SECONDS = float(os.getenv('ENTITY_WAIT_SECONDS', '5'))
+# Largest custom template upload body; JSON escaping can make it several times the source
+CUSTOM_TEMPLATE_MAX_UPLOAD = int(os.getenv('CUSTOM_TEMPLATE_MAX_UPLOAD', str(6 * CUSTOM_TEMPLATE_MAX_SOURCE)))
 
 @document_bp.route('/document/<doc_type>')
 def document_form(doc_type):
-    if doc_type not in documents:
+    schema = SCHEMAS.get(doc_type)
+    if not schema:
         return render_template('index.html', error='Invalid document type')
-    language_mapping = {
-        'en': 'English',
-        'hi': 'Hindi',
-        'bn': 'Bengali',
-        'te': 'Telugu',
-        'mr': 'Marathi',
-        'ur': 'Urdu',
-        'gu': 'Gujarati',
-        'kn': 'Kannada',
-        'or': 'Odia',
-        'ta': 'Tamil'
-    }
-    languages = [{'code': lang, 'name': language_mapping.get(lang, lang.upper())} for lang in documents[doc_type]['templates'].keys()]
-    return render_template('document_form.html', doc_type=doc_type, fields=documents[doc_type]['fields'], languages=languages)
+    return render_template('document_form.html', doc_type=doc_type, fields=schema.form_fields, languages=schema.language_options)
 
 @document_bp.route('/generate', methods=['POST'])
 def generate_document():
     print("DEBUG: generate_document route called")
     doc_type = request.form.get('doc_type')
     language = request.form.get('language', 'en')
-    if not doc_type or doc_type not in documents:
+    # Versioned filename of a stored custom template picked on the form
+    custom_template = request.form.get('custom_template') or None
+    schema = SCHEMAS.get(doc_type)
+    if not schema:
         return render_template('index.html', error='Invalid document type')
 
-    # Collect field values and check for missing ones
-    fields = documents[doc_type]['fields']
-    data = {field: request.form.get(field, '').strip() for field in fields}
-
-    # Map form fields to template placeholders
-    field_mapping = {
-        'rental_agreement': {
-            'owner_name': 'landlord',
-            'owner_age': 'landlord_age',
-            'owner_father': 'landlord_father',
-            'owner_address': 'landlord_address',
-            'owner_city': 'landlord_city',
-            'owner_pincode': 'landlord_pincode',
-            'renter_name': 'tenant',
-            'renter_age': 'tenant_age',
-            'renter_father': 'tenant_father',
-            'renter_address': 'tenant_address',
-            'renter_city': 'tenant_city',
-            'renter_pincode': 'tenant_pincode',
-            'property_address': 'property_address',
-            'property_city': 'property_city',
-            'property_pincode': 'property_pincode',
-            'start_date': 'start_date',
-            'effective_date': 'effective_date',
-            'duration': 'duration',
-            'renewal_period': 'renewal_period',
-            'rent_amount': 'rent_amount',
-            'rent_amount_words': 'rent_amount_words',
-            'rent_due_date': 'rent_due_date',
-            'rent_increase_percentage': 'rent_increase_percentage',
-            'security_deposit': 'security_deposit',
-            'security_deposit_words': 'security_deposit_words',
-            'notice_period': 'notice_period',
-            'jurisdiction': 'jurisdiction',
-            'witness1_name': 'witness1_name',
-            'witness1_address': 'witness1_address',
-            'witness2_name': 'witness2_name',
-            'witness2_address': 'witness2_address',
-            'execution_date': 'execution_date',
-            'execution_place': 'execution_place',
-            'date': 'date',
-            'month': 'month',
-            'year': 'year'
-        },
-        'land_sale_deed': {
-            'seller': 'seller',
-            'seller_age': 'seller_age',
-            'seller_father': 'seller_father',
-            'seller_address': 'seller_address',
-            'seller_city': 'seller_city',
-            'seller_pincode': 'seller_pincode',
-            'buyer': 'buyer',
-            'buyer_age': 'buyer_age',
-            'buyer_father': 'buyer_father',
-            'buyer_address': 'buyer_address',
-            'buyer_city': 'buyer_city',
-            'buyer_pincode': 'buyer_pincode',
-            'sale_amount': 'sale_amount',
-            'sale_amount_words': 'sale_amount_words',
-            'stamp_duty_bearer': 'stamp_duty_bearer',
-            'registration_office': 'registration_office',
-            'survey_number': 'survey_number',
-            'area': 'area',
-            'north_boundary': 'north_boundary',
-            'south_boundary': 'south_boundary',
-            'east_boundary': 'east_boundary',
-            'west_boundary': 'west_boundary',
-            'property_address': 'property_address',
-            'property_city': 'property_city',
-            'property_pincode': 'property_pincode',
-            'witness1_name': 'witness1_name',
-            'witness1_address': 'witness1_address',
-            'witness2_name': 'witness2_name',
-            'witness2_address': 'witness2_address',
-            'execution_date': 'execution_date',
-            'execution_place': 'execution_place',
-            'date': 'date',
-            'month': 'month',
-            'year': 'year'
-        },
-        'power_of_attorney': {
-            'principal': 'principal',
-            'principal_age': 'principal_age',
-            'principal_father': 'principal_father',
-            'principal_address': 'principal_address',
-            'principal_city': 'principal_city',
-            'principal_pincode': 'principal_pincode',
-            'attorney': 'attorney',
-            'attorney_age': 'attorney_age',
-            'attorney_father': 'attorney_father',
-            'attorney_address': 'attorney_address',
-            'attorney_city': 'attorney_city',
-            'attorney_pincode': 'attorney_pincode',
-            'matter_description': 'matter_description',
-            'effective_date': 'effective_date',
-            'expiry_date': 'expiry_date',
-            'registration_office': 'registration_office',
-            'stamp_duty_bearer': 'stamp_duty_bearer',
-            'witness1_name': 'witness1_name',
-            'witness1_address': 'witness1_address',
-            'witness2_name': 'witness2_name',
-            'witness2_address': 'witness2_address',
-            'execution_date': 'execution_date',
-            'execution_place': 'execution_place',
-            'date': 'date',
-            'month': 'month',
-            'year': 'year'
-        },
-        'house_lease': {
-            'lessor': 'lessor',
-            'lessor_age': 'lessor_age',
-            'lessor_father': 'lessor_father',
-            'lessor_address': 'lessor_address',
-            'lessor_city': 'lessor_city',
-            'lessor_pincode': 'lessor_pincode',
-            'lessee': 'lessee',
-            'lessee_age': 'lessee_age',
-            'lessee_father': 'lessee_father',
-            'lessee_address': 'lessee_address',
-            'lessee_city': 'lessee_city',
-            'lessee_pincode': 'lessee_pincode',
-            'property_address': 'property_address',
-            'property_city': 'property_city',
-            'property_pincode': 'property_pincode',
-            'lease_period': 'lease_period',
-            'start_date': 'start_date',
-            'end_date': 'end_date',
-            'lease_amount': 'lease_amount',
-            'lease_amount_words': 'lease_amount_words',
-            'rent_due_date': 'rent_due_date',
-            'security_deposit': 'security_deposit',
-            'security_deposit_words': 'security_deposit_words',
-            'notice_period': 'notice_period',
-            'jurisdiction': 'jurisdiction',
-            'number_of_rooms': 'number_of_rooms',
-            'witness1_name': 'witness1_name',
-            'witness1_address': 'witness1_address',
-            'witness2_name': 'witness2_name',
-            'witness2_address': 'witness2_address',
-            'execution_date': 'execution_date',
-            'execution_place': 'execution_place',
-            'date': 'date',
-            'month': 'month',
-            'year': 'year'
-        }
-    }
-
-    if doc_type in field_mapping:
-        mapped_data = {}
-        for form_field, template_field in field_mapping[doc_type].items():
-            mapped_data[template_field] = data.get(form_field, '')
-        data = mapped_data
+    # Collect field values, keyed by the template placeholders they fill
+    data = schema.from_form(request.form)
 
     # Translate data if language is not English
     if language != 'en':
         print(f"Translating data to {language}")
-        translated_data = {}
-        for key, value in data.items():
-            if value.strip():  # Only translate non-empty values
-                translated = translate_text(value, language)
-                translated_data[key] = translated
-                print(f"Translated {key}: '{value}' -> '{translated}'")
-            else:
-                translated_data[key] = value
-        data = translated_data
+        data = get_translation_service().translate_fields(data, language)
         print(f"Translation complete for {language}")
 
     # No longer require all fields to be filled. Missing fields will simply be empty in the template.
@@ -539,14 +61,15 @@ def generate_document():
 
     # if missing_fields:
     #     error_msg = f"Please fill in all required fields: {', '.join(missing_fields)}"
-    #     languages = list(documents[doc_type]['templates'].keys())
-    #     return render_template('document_form.html', doc_type=doc_type, fields=fields, error=error_msg, values=data, languages=languages, selected_language=language)
+    #     return render_template('document_form.html', doc_type=doc_type, fields=schema.form_fields, error=error_msg, values=schema.to_form_values(data), languages=schema.language_options, selected_language=language)
 
     try:
-        document = processor.generate_document(doc_type, data, language)
-        # Use spaCy to extract entities
-        doc_nlp = nlp(document)
-        entities = [(ent.text, ent.label_) for ent in doc_nlp.ents]
+        if custom_template:
+            document = services.document_generator.render_stored(custom_template, data)
+        else:
+            document = services.processor.generate_document(doc_type, data, language)
+        # Entities are extracted in the background and fetched by the page, by key, after first paint
+        entities_key = entity_extractor.submit(document, language)
 
         # Log history and save document
         print(f"DEBUG: Session contents: {dict(session)}")
@@ -575,14 +98,14 @@ def generate_document():
             print("DEBUG: No user_id found in session - user not logged in")
             print(f"DEBUG: Available session data: {dict(session)}")
 
-        return render_template('view_document.html', doc_type=doc_type, content=document, entities=entities)
+        return render_template('view_document.html', doc_type=doc_type, content=document, language=language,
+                               entities_key=entities_key)
     except Exception as e:
         import traceback
         error_message = f"Error generating document: {str(e)}"
         print(traceback.format_exc())
         flash(error_message, 'danger')
-        languages = list(documents[doc_type]['templates'].keys())
-        return render_template('document_form.html', doc_type=doc_type, fields=fields, error=error_message, values=data, languages=languages, selected_language=language)
+        return render_template('document_form.html', doc_type=doc_type, fields=schema.form_fields, error=error_message, values=schema.to_form_values(data), languages=schema.language_options, selected_language=language)
 
 @document_bp.route('/generate_from_prompt', methods=['POST'])
 def generate_from_prompt():
@@ -597,20 +120,19 @@ def generate_from_prompt():
         language = language_match.group(1).lower() if language_match else 'en'
 
         # Classify document type
-        doc_type = processor.classify_document_type(prompt)
+        doc_type = services.processor.classify_document_type(prompt)
         if not doc_type:
             flash('Could not determine document type from your prompt. Please try rephrasing.', 'error')
             return render_template('index.html')
 
         # Extract entities
-        entities = processor.extract_entities(prompt)
+        entities = services.processor.extract_entities(prompt)
 
         # Generate document
-        document = processor.generate_document(doc_type, entities, language=language)
+        document = services.processor.generate_document(doc_type, entities, language=language)
 
-        # Extract entities from generated document for display
-        doc_nlp = nlp(document)
-        extracted_entities = [(ent.text, ent.label_) for ent in doc_nlp.ents]
+        # Extract entities from generated document for display, off the request path
+        entities_key = entity_extractor.submit(document, language)
 
         # Log history and save document
         print(f"DEBUG PROMPT: Session contents: {dict(session)}")
@@ -638,12 +160,47 @@ def generate_from_prompt():
             print("DEBUG PROMPT: No user_id found in session - user not logged in")
 
         flash(f'Document type classified as: {doc_type.replace("_", " ").title()}', 'success')
-        return render_template('view_document.html', doc_type=doc_type, content=document, entities=extracted_entities, prompt=prompt)
+        return render_template('view_document.html', doc_type=doc_type, content=document, language=language, prompt=prompt,
+                               entities_key=entities_key)
 
     except Exception as e:
         flash(f'Error generating document: {str(e)}', 'error')
         return render_template('index.html')
 
+@document_bp.route('/api/entities/<key>')
+def api_entities_by_key(key):
+    """Return the entities of a document whose extraction was started when it was rendered"""
+    result = entity_extractor.lookup(key, timeout=ENTITY_WAIT_SECONDS)
+    if result is None:
+        # Evicted, or started by another worker process
+        return jsonify({'error': 'Unknown entities key'}), 404
+    if result['status'] == 'error':
+        return jsonify(result), 500
+    return jsonify(result), 202 if result['status'] == 'pending' else 200
+
+@document_bp.route('/api/entities', methods=['POST'])
+def api_entities():
+    """Extract named entities from document content for the entities panel"""
+    try:
+        data = request.get_json() or {}
+        content = data.get('content', '')
+        language = data.get('language', 'en')
+
+        if not content:
+            return jsonify({'error': 'No content provided'}), 400
+        if len(content) > ENTITY_MAX_CONTENT:
+            return jsonify({'error': f'Content is longer than {ENTITY_MAX_CONTENT} characters'}), 413
+
+        return jsonify(entity_extractor.extract(content, language))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@document_bp.route('/api/translation/stats')
+def api_translation_stats():
+    """Report translation cache, deadline and circuit breaker counters"""
+    return jsonify(get_translation_service().stats())
+
 @document_bp.route('/download/<doc_type>/<format>')
 def download_document(doc_type, format):
     # This would need the document content stored in session or database
@@ -661,18 +218,20 @@ def api_process_prompt():
         if not prompt:
             return jsonify({'error': 'No prompt provided'}), 400
         
-        # Classify document type
-        doc_type = processor.classify_document_type(prompt)
+        # Classify document type; None when no keyword matched
+        doc_type, confidence, candidates = services.processor.rank_document_types(prompt)
         
         # Extract entities
-        entities = processor.extract_entities(prompt)
+        entities = services.processor.extract_entities(prompt)
         
         # Identify missing fields
-        missing_fields = processor.identify_missing_fields(doc_type, entities)
+        missing_fields = services.processor.identify_missing_fields(doc_type, entities)
         
         # Prepare response
         response = {
-            'document_type': doc_type,
+            'document_type': doc_type or UNKNOWN_DOCUMENT_TYPE,
+            'confidence': confidence,
+            'candidates': candidates,
             'extracted_entities': entities,
             'missing_fields': missing_fields,
             'status': 'success'
@@ -683,6 +242,32 @@ def api_process_prompt():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@document_bp.route('/api/process-prompts', methods=['POST'])
+def api_process_prompts():
+    """Classify and extract information from many prompts in one pass"""
+    try:
+        data = request.get_json() or {}
+        prompts = data.get('prompts')
+
+        if not isinstance(prompts, list) or not prompts:
+            return jsonify({'error': 'Provide a non-empty list of prompts'}), 400
+        if len(prompts) > PROMPT_BATCH_MAX:
+            return jsonify({'error': f'At most {PROMPT_BATCH_MAX} prompts per request'}), 400
+        if not all(isinstance(prompt, str) and prompt.strip() for prompt in prompts):
+            return jsonify({'error': 'Every prompt must be a non-empty string'}), 400
+
+        try:
+            batch_size = max(1, min(int(data.get('batch_size', PROMPT_BATCH_SIZE)), PROMPT_BATCH_MAX))
+            n_process = max(1, min(int(data.get('n_process', PROMPT_N_PROCESS)), PROMPT_N_PROCESS_MAX))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'batch_size and n_process must be integers'}), 400
+
+        results = services.processor.process_prompts(prompts, batch_size=batch_size, n_process=n_process)
+        return jsonify({'results': results, 'count': len(results), 'status': 'success'})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @document_bp.route('/api/generate-document', methods=['POST'])
 def api_generate_document():
     """Generate final document with all required data"""
@@ -699,10 +284,8 @@ def api_generate_document():
         
         # Generate document content
         if custom_template:
-            from jinja2 import Template
             try:
-                template = Template(custom_template)
-                document_content = template.render(**filled_data)
+                document_content = services.document_generator.render_custom(custom_template, filled_data)
             except Exception as e:
                 return jsonify({'error': f'Error rendering custom template: {str(e)}'}), 400
         elif 'content' in filled_data:
@@ -712,7 +295,7 @@ def api_generate_document():
             # Merge filled_data with default values for a complete document
             complete_data = get_default_data_for_document(doc_type, language)
             complete_data.update(filled_data)  # User data overrides defaults
-            document_content = processor.generate_document(doc_type, complete_data, language=language)
+            document_content = services.processor.generate_document(doc_type, complete_data, language=language)
         
         # Log history and save document
         print(f"DEBUG API: Session contents: {dict(session)}")
@@ -750,96 +333,145 @@ def api_generate_document():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def create_docx_file(content, doc_type):
-    """Create DOCX file from content"""
+@document_bp.route('/api/bulk-generate', methods=['POST'])
+def api_bulk_generate():
+    """Generate one document per uploaded CSV/JSONL row and stream back a ZIP"""
+    upload = request.files.get('file')
+    doc_type = request.form.get('document_type')
+    language = request.form.get('language', 'en')
+    format_type = request.form.get('format', 'docx')
+    input_format = request.form.get('input_format') or bulk.input_format_for(upload.filename if upload else '')
+
+    if not upload:
+        return jsonify({'error': 'Upload a CSV or JSONL file as "file"'}), 400
+    if doc_type not in SCHEMAS:
+        return jsonify({'error': 'Invalid document type'}), 400
+    if format_type not in MIMETYPES:
+        return jsonify({'error': 'Unsupported format'}), 400
+    if input_format not in bulk.INPUT_FORMATS:
+        return jsonify({'error': 'Input must be CSV or JSONL'}), 400
+
+    custom_template = request.form.get('custom_template') or None
+    if custom_template:
+        # Report a bad template once, up front, instead of once per row
+        try:
+            check_source(custom_template)
+            services.document_generator.custom_templates.get(custom_template)
+        except Exception as e:
+            return jsonify({'error': f'Custom template error: {str(e)}'}), 400
+
+    job = bulk.BulkJob(doc_type, language, format_type, custom_template)
+    if 'user_id' in session:
+        add_user_history(session['user_id'], 'bulk_generate', f'Bulk generated {doc_type} as {format_type} in {language}')
+
+    # Uploads are closed when the request ends, before the archive has been streamed
+    source = io.TextIOWrapper(tempfile.TemporaryFile(), encoding='utf-8-sig', newline='')
+    shutil.copyfileobj(upload.stream, source.buffer)
+    source.seek(0)
+
+    def stream():
+        try:
+            yield from bulk.generate_zip(bulk.read_rows(source, input_format), job)
+        finally:
+            source.close()
+
+    response = Response(stream(), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename={doc_type}_{format_type}.zip'
+    response.headers['X-Bulk-Job-Id'] = job.id
+    return response
+
+@document_bp.route('/api/bulk-generate/<job_id>')
+def api_bulk_progress(job_id):
+    """Report progress and row errors of a bulk generation job"""
+    report = bulk.get_job_report(job_id)
+    if not report:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(report)
+
+def custom_template_info(record):
+    """Describe a stored custom template version for the template picker"""
+    return {
+        'filename': record['filename'],
+        'display_name': f"{record['name']} (v{record['version']})",
+        'name': record['name'],
+        'version': record['version'],
+        'variables': record['variables'],
+        'created_at': datetime.fromtimestamp(record['created_at']).isoformat(timespec='seconds'),
+    }
+
+@document_bp.route('/api/custom_templates', methods=['GET', 'POST'])
+def api_custom_templates():
+    """List the latest version of each custom template, or save a new version"""
+    store = services.document_generator.custom_store
+    if request.method == 'GET':
+        return jsonify([custom_template_info(record) for record in store.list_latest()])
+
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    # Checked before the body is read, so an oversized upload is never buffered
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length required'}), 411
+    if request.content_length > CUSTOM_TEMPLATE_MAX_UPLOAD:
+        return jsonify({'error': f'Upload is larger than {CUSTOM_TEMPLATE_MAX_UPLOAD} bytes'}), 413
+
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename')
+    content = data.get('content')
+    if not filename or not isinstance(content, str) or not content:
+        return jsonify({'error': 'Missing filename or content'}), 400
     try:
-        doc = Document()
-        doc.add_heading(f'{doc_type.replace("_", " ").title()}', 0)
-        
-        # Add content
-        paragraphs = content.split('\n')
-        for para in paragraphs:
-            if para.strip():
-                doc.add_paragraph(para.strip())
-        
-        # Save to temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.docx')
-        doc.save(temp_file.name)
-        temp_file.close()
-        
-        from flask import send_file
-        from datetime import datetime
+        # Refuse templates that could never be rendered
+        check_source(content)
+        services.document_generator.custom_templates.get(content)
+        record = store.save(filename, content)
+    except TemplateLimitError as e:
+        return jsonify({'error': f'Custom template error: {str(e)}'}), 413
+    except VersionLimitError as e:
+        return jsonify({'error': f'Custom template error: {str(e)}'}), 409
+    except Exception as e:
+        return jsonify({'error': f'Custom template error: {str(e)}'}), 400
+    return jsonify(custom_template_info(record))
+
+def send_export(content, doc_type, format_type):
+    """Build an export in memory and stream it as a download"""
+    try:
+        buffer = export_document(content, doc_type, format_type)
         return send_file(
-            temp_file.name,
+            buffer,
             as_attachment=True,
-            download_name=f'{doc_type}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.docx',
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            download_name=f'{doc_type}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{format_type}',
+            mimetype=MIMETYPES[format_type]
         )
-    
     except Exception as e:
-        return jsonify({'error': f'Error creating DOCX: {str(e)}'}), 500
+        return jsonify({'error': f'Error creating {format_type.upper()}: {str(e)}'}), 500
+
+def create_docx_file(content, doc_type):
+    """Create DOCX file from content"""
+    return send_export(content, doc_type, 'docx')
 
 def create_pdf_file(content, doc_type):
     """Create PDF file from content"""
-    try:
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_path = temp_file.name
-        temp_file.close()
-
-        doc = SimpleDocTemplate(temp_path, pagesize=A4, leftMargin=54, rightMargin=54, topMargin=54, bottomMargin=54)
-        styles = getSampleStyleSheet()
-
-        body_style = ParagraphStyle(
-            name='Body',
-            parent=styles['Normal'],
-            fontSize=11,
-            leading=16,
-            alignment=TA_JUSTIFY,
-        )
-        title_style = ParagraphStyle(
-            name='Title',
-            parent=styles['Heading1'],
-            fontSize=18,
-            leading=22,
-            spaceAfter=12,
-        )
-
-        story = []
-        story.append(Paragraph(doc_type.replace('_', ' ').title(), title_style))
-        story.append(Spacer(1, 0.2 * inch))
-
-        # Convert plain text line breaks to simple paragraphs
-        for block in content.split('\n\n'):
-            block_html = block.strip().replace('\n', '<br/>')
-            if not block_html:
-                continue
-            story.append(Paragraph(block_html, body_style))
-            story.append(Spacer(1, 0.12 * inch))
+    return send_export(content, doc_type, 'pdf')
 
-        doc.build(story)
-
-        from flask import send_file
-        from datetime import datetime
-        return send_file(
-            temp_path,
-            as_attachment=True,
-            download_name=f'{doc_type}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
-            mimetype='application/pdf'
-        )
-    except Exception as e:
-        return jsonify({'error': f'Error creating PDF: {str(e)}'}), 500
+@document_bp.route('/api/export/stats')
+def api_export_stats():
+    """Report export counts, build time, output size and cache stats"""
+    return jsonify(export_stats())
 
 @document_bp.route('/edit_document', methods=['GET', 'POST'])
 def edit_document():
     doc_type = request.args.get('doc_type')
     content = request.args.get('content')
+    language = request.args.get('language', 'en')
 
     if request.method == 'POST':
         edited_content = request.form.get('edited_content')
         doc_type = request.form.get('doc_type')
-        return render_template('view_document.html', doc_type=doc_type, content=edited_content, entities=[]) # Simplified entities for now
+        language = request.form.get('language', 'en')
+        return render_template('view_document.html', doc_type=doc_type, content=edited_content, language=language,
+                               entities_key=entity_extractor.submit(edited_content or '', language))
 
-    return render_template('edit_document.html', doc_type=doc_type, content=content)
+    return render_template('edit_document.html', doc_type=doc_type, content=content, language=language)
 
 @document_bp.route('/api/document/<doc_id>/view')
 def api_view_document(doc_id):
@@ -848,24 +480,23 @@ def api_view_document(doc_id):
         if 'user_id' not in session:
             return jsonify({'error': 'Authentication required'}), 401
         
-        from app.models.history import supabase
-        if not supabase:
+        if not get_repository().available():
             return jsonify({'error': 'Database connection failed'}), 500
         
-        # Get document from database
-        response = supabase.table('generated_documents').select('*').eq('id', doc_id).eq('user_id', session['user_id']).execute()
+        # Get document from database, including one still queued for writing
+        document = get_saved_document(doc_id, session['user_id'])
         
-        if not response.data:
+        if not document:
             return jsonify({'error': 'Document not found'}), 404
         
-        document = response.data[0]
-        
         # Return HTML view of the document
+        language = document.get('language', 'en')
         return render_template('view_document.html', 
                              doc_type=document['document_type'], 
                              content=document['content'], 
-                             entities=[],
-                             title=document['title'])
+                             language=language,
+                             title=document['title'],
+                             entities_key=entity_extractor.submit(document['content'], language))
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -877,18 +508,15 @@ def api_download_document(doc_id, format):
         if 'user_id' not in session:
             return jsonify({'error': 'Authentication required'}), 401
         
-        from app.models.history import supabase
-        if not supabase:
+        if not get_repository().available():
             return jsonify({'error': 'Database connection failed'}), 500
         
-        # Get document from database
-        response = supabase.table('generated_documents').select('*').eq('id', doc_id).eq('user_id', session['user_id']).execute()
+        # Get document from database, including one still queued for writing
+        document = get_saved_document(doc_id, session['user_id'])
         
-        if not response.data:
+        if not document:
             return jsonify({'error': 'Document not found'}), 404
         
-        document = response.data[0]
-        
         # Log download activity
         result = add_user_history(session['user_id'], 'download_saved_document', f'Downloaded saved {document["document_type"]} as {format}', doc_id)
         print(f"DEBUG DOWNLOAD: History add result: {result}")
@@ -912,19 +540,16 @@ def api_revert_document(doc_id):
             flash('Please log in to access saved documents.', 'error')
             return render_template('index.html')
         
-        from app.models.history import supabase
-        if not supabase:
+        if not get_repository().available():
             flash('Database connection failed.', 'error')
             return render_template('index.html')
         
-        # Get document from database
-        response = supabase.table('generated_documents').select('*').eq('id', doc_id).eq('user_id', session['user_id']).execute()
+        # Get document from database, including one still queued for writing
+        document = get_saved_document(doc_id, session['user_id'])
         
-        if not response.data:
+        if not document:
             flash('Document not found.', 'error')
             return render_template('index.html')
-        
-        document = response.data[0]
         doc_type = document['document_type']
         language = document['language']
         saved_data = document.get('data', {})
@@ -933,50 +558,19 @@ def api_revert_document(doc_id):
         add_user_history(session['user_id'], 'revert_document', f'Reverted to saved {doc_type}')
         
         # Get document configuration
-        if doc_type not in documents:
+        schema = SCHEMAS.get(doc_type)
+        if not schema:
             flash('Invalid document type.', 'error')
             return render_template('index.html')
         
         # Convert template field names back to form field names
-        reverse_field_mapping = {
-            'rental_agreement': {
-                'landlord': 'owner_name', 'landlord_age': 'owner_age', 'landlord_father': 'owner_father',
-                'landlord_address': 'owner_address', 'landlord_city': 'owner_city', 'landlord_pincode': 'owner_pincode',
-                'tenant': 'renter_name', 'tenant_age': 'renter_age', 'tenant_father': 'renter_father',
-                'tenant_address': 'renter_address', 'tenant_city': 'renter_city', 'tenant_pincode': 'renter_pincode'
-            },
-            'land_sale_deed': {},
-            'power_of_attorney': {},
-            'house_lease': {}
-        }
-        
-        # Map saved data back to form fields
-        form_data = {}
-        if doc_type in reverse_field_mapping:
-            for template_field, form_field in reverse_field_mapping[doc_type].items():
-                if template_field in saved_data:
-                    form_data[form_field] = saved_data[template_field]
-            # Copy unmapped fields directly
-            for key, value in saved_data.items():
-                if key not in reverse_field_mapping[doc_type] and key in documents[doc_type]['fields']:
-                    form_data[key] = value
-        else:
-            form_data = saved_data
-        
-        # Prepare language options
-        language_mapping = {
-            'en': 'English', 'hi': 'Hindi', 'bn': 'Bengali', 'te': 'Telugu',
-            'mr': 'Marathi', 'ur': 'Urdu', 'gu': 'Gujarati', 'kn': 'Kannada',
-            'or': 'Odia', 'ta': 'Tamil'
-        }
-        languages = [{'code': lang, 'name': language_mapping.get(lang, lang.upper())} 
-                    for lang in documents[doc_type]['templates'].keys()]
+        form_data = schema.to_form_values(saved_data)
         
         # Render the document form with saved data
         return render_template('document_form.html', 
                              doc_type=doc_type, 
-                             fields=documents[doc_type]['fields'],
-                             languages=languages,
+                             fields=schema.form_fields,
+                             languages=schema.language_options,
                              selected_language=language,
                              values=form_data,
                              reverted=True)
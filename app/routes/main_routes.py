@@ -1,8 +1,10 @@
 """Main application routes."""
-from flask import render_template, session, flash
+from flask import render_template, session, flash, request, jsonify
 from . import main_bp
 from app.models.users import get_user_from_session
-from app.models.history import get_user_history, get_user_documents
+from app.models.history import get_history_page, write_queue
+from app.models.db import db_stats
+from app.services.warmup import is_ready, warmup_status
 
 @main_bp.route('/')
 def index():
@@ -17,13 +19,32 @@ def user_history():
 
     user = get_user_from_session(session)
     print(f"Fetching fresh history for user: {session['user_id']}")
-    history = get_user_history(session['user_id'])
-    documents = get_user_documents(session['user_id'])
-    print(f"Retrieved {len(history)} history records and {len(documents)} documents")
+    page = get_history_page(
+        session['user_id'],
+        history_before=request.args.get('history_before'),
+        documents_before=request.args.get('documents_before')
+    )
+    print(f"Retrieved {len(page['history'])} history records and {len(page['documents'])} documents")
     
     from flask import make_response
-    response = make_response(render_template('history.html', user=user, history=history, documents=documents))
+    response = make_response(render_template('history.html', user=user, **page))
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
     return response
+
+@main_bp.route('/api/db/stats')
+def api_db_stats():
+    """Report per-table query latency histograms and write-behind counters"""
+    return jsonify({'queries': db_stats(), 'write_behind': write_queue.stats()})
+
+@main_bp.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@main_bp.route('/readyz')
+def readyz():
+    """Readiness: 200 only once warm-up has finished, so traffic never hits a cold worker"""
+    status = warmup_status()
+    return jsonify(status), 200 if is_ready() else 503
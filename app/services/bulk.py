@@ -0,0 +1,407 @@
+"""Bulk document generation from CSV or JSONL rows.
+
+Each input row holds template fields for one document of a single
+doc_type and language. Rows are rendered with
+``LegalDocumentProcessor.generate_document`` and exported to DOCX or PDF
+in a pool of worker processes, so throughput scales with cores. Results
+are streamed into a ZIP archive as they complete.
+
+Memory stays bounded whatever the input size: rows are read lazily, at
+most ``BULK_MAX_IN_FLIGHT`` rows are being rendered at a time, and each
+file leaves the process as soon as it is written to the archive. Rows
+that fail are reported in ``report.json`` at the end of the archive
+instead of aborting the batch.
+
+Job progress is kept in memory and also published as JSON to
+``BULK_JOB_DIR``, at most every ``BULK_PROGRESS_INTERVAL`` seconds, so
+any worker process on the host can answer a progress poll, not only the
+one streaming the archive. Servers spread over several hosts must route
+polls to the host that runs the job.
+
+A job may render every row with one user-supplied custom template
+instead of the shipped one. It is rendered in the template sandbox, and
+each worker compiles it once and reuses it for the rest of the rows.
+
+Run offline with::
+
+    python -m app.services.bulk rows.csv --doc-type rental_agreement --format pdf -o leases.zip
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from app.services.default_data import get_default_data_for_document
+from app.services.document_generator import TEMPLATE_FILES
+from app.services.exporter import BUILDERS
+from app.utils.ttl_cache import TTLCache
+
+BULK_WORKERS = int(os.getenv('BULK_WORKERS', '0')) or os.cpu_count() or 2
+BULK_MAX_IN_FLIGHT = int(os.getenv('BULK_MAX_IN_FLIGHT', '0')) or BULK_WORKERS * 2
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', '5000'))
+BULK_JOB_TTL = float(os.getenv('BULK_JOB_TTL', '3600'))
+# Forking a threaded web server is unsafe, so workers are spawned by default
+BULK_START_METHOD = os.getenv('BULK_START_METHOD', 'spawn')
+# Shared by all worker processes on the host, for progress polls
+BULK_JOB_DIR = os.getenv('BULK_JOB_DIR') or os.path.join(tempfile.gettempdir(), 'doc-writer-bulk-jobs')
+BULK_PROGRESS_INTERVAL = float(os.getenv('BULK_PROGRESS_INTERVAL', '0.5'))
+
+INPUT_FORMATS = ('csv', 'jsonl')
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+_pool = None
+_pool_lock = threading.Lock()
+jobs = TTLCache(BULK_JOB_TTL, max_entries=1000)
+
+# Set in each worker process by _init_worker
+_processor = None
+
+
+def _init_worker():
+    global _processor
+    from app.services.processor import LegalDocumentProcessor
+    _processor = LegalDocumentProcessor()
+    _processor.document_generator.preload_templates()
+
+
+def render_row(doc_type: str, language: str, fmt: str, fields: Dict,
+               custom_template: Optional[str] = None) -> bytes:
+    """Render one row to export bytes inside a worker process."""
+    data = get_default_data_for_document(doc_type, language)
+    data.update(fields)
+    if custom_template:
+        content = _processor.document_generator.render_custom(custom_template, data)
+    else:
+        content = _processor.generate_document(doc_type, data, language=language)
+    buffer = BUILDERS[fmt](content, doc_type)
+    try:
+        return buffer.read()
+    finally:
+        buffer.close()
+
+
+def _render_task(row_number: int, doc_type: str, language: str, fmt: str, fields: Dict,
+                 custom_template: Optional[str] = None):
+    try:
+        return row_number, render_row(doc_type, language, fmt, fields, custom_template), None
+    except Exception as e:
+        return row_number, None, f"{type(e).__name__}: {e}"
+
+
+def get_pool(workers: int = BULK_WORKERS) -> ProcessPoolExecutor:
+    """Return the shared worker pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(BULK_START_METHOD),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def read_rows(stream: Iterable[str], input_format: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Yield ``(row_number, fields, error)`` for each input row.
+
+    Empty values are dropped so the document defaults apply to them. A row
+    that cannot be parsed is yielded with an error instead of fields.
+    """
+    if input_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(stream), start=1):
+            yield row_number, {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and isinstance(value, str) and value.strip()
+            }, None
+    elif input_format == 'jsonl':
+        row_number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_number, None, 'Row is not a JSON object'
+                continue
+            yield row_number, {key: value for key, value in row.items() if value not in (None, '')}, None
+    else:
+        raise ValueError(f"Unsupported input format: {input_format}")
+
+
+def input_format_for(filename: str) -> Optional[str]:
+    """Guess the input format from a file name."""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    return None
+
+
+class BulkJob:
+    """Progress and per-row errors of one bulk run."""
+
+    def __init__(self, doc_type: str, language: str, fmt: str, custom_template: Optional[str] = None,
+                 shared: bool = True):
+        self.id = uuid.uuid4().hex
+        # Publish progress to BULK_JOB_DIR for the other worker processes
+        self.shared = shared
+        self._published_at = None
+        self.doc_type = doc_type
+        self.language = language
+        self.format = fmt
+        self.custom_template = custom_template
+        self.status = 'running'
+        self.rows_read = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.truncated = False
+        self.errors = []
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def fail_row(self, row_number: int, error: str):
+        self.failed += 1
+        self.errors.append({'row': row_number, 'error': error})
+        self.publish()
+
+    def finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+        self.publish(force=True)
+
+    def publish(self, force: bool = False):
+        """Write the report to BULK_JOB_DIR, at most every BULK_PROGRESS_INTERVAL unless forced."""
+        if not self.shared:
+            return
+        now = time.monotonic()
+        if not force and self._published_at is not None and now - self._published_at < BULK_PROGRESS_INTERVAL:
+            return
+        self._published_at = now
+        path = _job_path(self.id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(BULK_JOB_DIR, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not publish bulk job progress: {e}")
+
+    def progress(self) -> Dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        done = self.succeeded + self.failed
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'document_type': self.doc_type,
+            'language': self.language,
+            'format': self.format,
+            'custom_template': bool(self.custom_template),
+            'rows_read': self.rows_read,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'pending': self.rows_read - done,
+            'truncated': self.truncated,
+            'elapsed_seconds': round(elapsed, 2),
+            'rows_per_second': round(done / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    def report(self) -> Dict:
+        return dict(self.progress(), errors=self.errors)
+
+
+class _ChunkSink:
+    """Write-only, unseekable stream that collects ZIP output for streaming."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b''.join(chunks)
+
+
+def generate_zip(rows: Iterable[Tuple[int, Optional[Dict], Optional[str]]], job: BulkJob,
+                 max_rows: Optional[int] = BULK_MAX_ROWS, workers: int = BULK_WORKERS,
+                 max_in_flight: int = BULK_MAX_IN_FLIGHT) -> Iterator[bytes]:
+    """Render ``rows`` in the worker pool and yield the ZIP archive in chunks."""
+    jobs.set(job.id, job)
+    if job.shared:
+        _prune_job_files()
+    job.publish(force=True)
+    pool = get_pool(workers)
+    sink = _ChunkSink()
+    pending = set()
+
+    def store(archive, future):
+        row_number, data, error = future.result()
+        if error:
+            job.fail_row(row_number, error)
+            return
+        name = f"{job.doc_type}_{row_number:05d}.{job.format}"
+        # DOCX and PDF are already compressed
+        archive.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+        job.succeeded += 1
+        job.publish()
+
+    try:
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for row_number, fields, error in rows:
+                if max_rows and job.rows_read >= max_rows:
+                    job.truncated = True
+                    break
+                job.rows_read += 1
+                if error:
+                    job.fail_row(row_number, error)
+                    continue
+                pending.add(pool.submit(_render_task, row_number, job.doc_type, job.language, job.format,
+                                        fields, job.custom_template))
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        store(archive, future)
+                    yield from sink.drain()
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    store(archive, future)
+                yield from sink.drain()
+
+            job.finish('completed')
+            archive.writestr('report.json', json.dumps(job.report(), indent=2, ensure_ascii=False))
+        yield from sink.drain()
+    except BrokenProcessPool:
+        _reset_pool()
+        job.finish('failed')
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+        if job.status == 'running':
+            # The consumer stopped reading, e.g. the client disconnected
+            job.finish('cancelled')
+
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(BULK_JOB_DIR, f"{job_id}.json")
+
+
+def _prune_job_files():
+    """Remove published reports older than BULK_JOB_TTL."""
+    cutoff = time.time() - BULK_JOB_TTL
+    try:
+        entries = list(os.scandir(BULK_JOB_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def get_job(job_id: str) -> Optional[BulkJob]:
+    """Return a job running in this process."""
+    return jobs.get(job_id)
+
+
+def get_job_report(job_id: str) -> Optional[Dict]:
+    """Return the report of a job run by any worker process on this host, or None."""
+    if not _JOB_ID.match(job_id or ''):
+        return None
+    job = jobs.get(job_id)
+    if job is not None:
+        return job.report()
+    path = _job_path(job_id)
+    try:
+        if os.path.getmtime(path) < time.time() - BULK_JOB_TTL:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Generate one document per CSV/JSONL row into a ZIP archive.')
+    parser.add_argument('input', help='CSV with a header row, or JSONL with one object per line')
+    parser.add_argument('--doc-type', required=True, choices=sorted(TEMPLATE_FILES))
+    parser.add_argument('--language', default='en')
+    parser.add_argument('--format', choices=sorted(BUILDERS), default='docx')
+    parser.add_argument('--input-format', choices=INPUT_FORMATS, help='Defaults to the input file extension')
+    parser.add_argument('--custom-template', help='Render rows with this Jinja template instead of the shipped one')
+    parser.add_argument('-o', '--output', help='Output ZIP path (default: <doc_type>_<format>.zip)')
+    parser.add_argument('--workers', type=int, default=BULK_WORKERS)
+    parser.add_argument('--max-rows', type=int, default=0, help='Stop after this many rows (default: no limit)')
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or input_format_for(args.input)
+    if not input_format:
+        parser.error('Cannot tell the input format from the file name; pass --input-format')
+    output = args.output or f"{args.doc_type}_{args.format}.zip"
+    custom_template = None
+    if args.custom_template:
+        with open(args.custom_template, encoding='utf-8') as f:
+            custom_template = f.read()
+
+    job = BulkJob(args.doc_type, args.language, args.format, custom_template, shared=False)
+    last_report = 0.0
+    with open(args.input, encoding='utf-8-sig', newline='') as source, open(output, 'wb') as target:
+        rows = read_rows(source, input_format)
+        for chunk in generate_zip(rows, job, max_rows=args.max_rows or None, workers=args.workers,
+                                  max_in_flight=args.workers * 2):
+            target.write(chunk)
+            if time.monotonic() - last_report >= 1.0:
+                last_report = time.monotonic()
+                progress = job.progress()
+                print(f"{progress['succeeded']} rendered, {progress['failed']} failed, "
+                      f"{progress['rows_per_second']} rows/s", file=sys.stderr)
+
+    progress = job.progress()
+    print(f"Wrote {output}: {progress['succeeded']} rendered, {progress['failed']} failed "
+          f"in {progress['elapsed_seconds']}s", file=sys.stderr)
+    for error in job.errors[:20]:
+        print(f"  row {error['row']}: {error['error']}", file=sys.stderr)
+    return 1 if job.failed else 0
+
+
+if __name__ == '__main__':
+    # Run through the imported module so worker processes unpickle the
+    # same functions instead of a second copy living in __main__
+    from app.services.bulk import main as bulk_main
+    sys.exit(bulk_main())
@@ -0,0 +1,71 @@
+"""Process-wide service container.
+
+Routes, the warm-up and the CLIs get their services from ``services``
+instead of building their own at import time, so one processor, template
+generator, NLP registry and database client are shared per process. Every
+service is built on first access; importing this module (or the routes)
+loads no model and opens no connection.
+"""
+import threading
+from typing import Callable, Dict, List
+
+
+class ServiceContainer:
+    """Builds each service once, on first access, and shares it."""
+
+    def __init__(self):
+        # Re-entrant: building the processor first builds the generator
+        self._lock = threading.RLock()
+        self._instances: Dict[str, object] = {}
+
+    def _get(self, name: str, factory: Callable[[], object]):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = self._instances[name] = factory()
+        return instance
+
+    @property
+    def document_generator(self):
+        from app.services.document_generator import DocumentGenerator
+        return self._get('document_generator', DocumentGenerator)
+
+    @property
+    def processor(self):
+        from app.services.processor import LegalDocumentProcessor
+        return self._get('processor', lambda: LegalDocumentProcessor(document_generator=self.document_generator))
+
+    @property
+    def nlp_registry(self):
+        from app.services.nlp_registry import nlp_registry
+        return nlp_registry
+
+    @property
+    def supabase(self):
+        """The shared Supabase data client, or None if it is not configured."""
+        from app.models.db import get_supabase
+        return get_supabase()
+
+    @property
+    def repository(self):
+        from app.models.repository import get_repository
+        return get_repository()
+
+    @property
+    def translation(self):
+        from app.services.translation import get_translation_service
+        return get_translation_service()
+
+    def loaded(self) -> List[str]:
+        """Names of the services built so far in this process."""
+        return sorted(self._instances)
+
+    def reset(self):
+        """Drop built services so the next access builds them again."""
+        with self._lock:
+            self._instances.clear()
+
+
+services = ServiceContainer()
@@ -0,0 +1,243 @@
+"""Versioned store of user-uploaded custom templates.
+
+Every save of a template name gets the next version, ``<name>_v<N><ext>``.
+The sources live content-addressed in ``versions/<sha256>.txt``, so
+identical content is stored once, and the journal ``index.jsonl`` holds
+one line per version with its name, hash, variables and creation time. Saving the same
+content as the latest version of a name returns that version instead of
+adding another. A name keeps at most ``CUSTOM_TEMPLATE_MAX_VERSIONS``
+versions; saving another raises ``VersionLimitError``.
+
+Listing, lookup and version allocation read the index, never the
+directory. Saves hold an exclusive ``flock`` on ``index.lock`` while they
+catch up with the journal and append their line, so concurrent saves
+from any number of processes never hand out the same version, and a save
+costs the same however many templates exist. Each process keeps the
+index in memory and applies only the lines appended since its last read.
+Stores created before the journal had ``index.json``; it is imported by
+the first save.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from app.services.template_bundle import source_hash
+from app.utils.template_validator import extract_template_variables
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are only serialised within one process
+    fcntl = None
+
+INDEX_FILE = 'index.jsonl'
+# Whole-index file written by earlier versions of the store
+LEGACY_INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+BLOB_DIR = 'versions'
+
+CUSTOM_TEMPLATE_MAX_VERSIONS = int(os.getenv('CUSTOM_TEMPLATE_MAX_VERSIONS', '50'))
+
+_VERSIONED_NAME = re.compile(r'^(?P<name>.+)_v(?P<version>\d+)(?P<ext>\.[^.]*)?$')
+_SAFE_NAME = re.compile(r'^[\w.-]+$')
+
+
+class VersionLimitError(ValueError):
+    """A template name already has the maximum number of versions."""
+
+
+def _empty_index() -> Dict:
+    return {'templates': {}, 'files': {}}
+
+
+def _apply(index: Dict, record: Dict):
+    """Add a journal record to the in-memory index."""
+    name = record['name']
+    index['templates'].setdefault(name, []).append({key: value for key, value in record.items() if key != 'name'})
+    index['files'][record['filename']] = name
+
+
+def _clean_name(filename: str) -> str:
+    base_name = os.path.basename(filename or '')
+    if not base_name or base_name.startswith('.') or not _SAFE_NAME.match(base_name):
+        raise ValueError(f"Invalid template name: {filename!r}")
+    return base_name
+
+
+class CustomTemplateStore:
+    """Index-backed, content-deduplicated store of custom template versions."""
+
+    def __init__(self, root_dir: str, max_versions: int = CUSTOM_TEMPLATE_MAX_VERSIONS):
+        self.root_dir = root_dir
+        self.max_versions = max_versions
+        self.blob_dir = os.path.join(root_dir, BLOB_DIR)
+        self.index_path = os.path.join(root_dir, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._index = None
+        # Device and inode of the journal, and how many of its bytes _index holds
+        self._journal_id = None
+        self._offset = 0
+
+    @contextmanager
+    def _locked(self):
+        """Hold the store's write lock across threads and, where supported, processes."""
+        with self._lock:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            with open(os.path.join(self.root_dir, LOCK_FILE), 'a') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self) -> Dict:
+        """Return the index after applying journal lines appended since the last read.
+
+        Callers hold ``_lock``. Without a journal the index is imported from
+        an earlier store's files, in memory until the first save.
+        """
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            if self._index is None or self._journal_id is not None:
+                self._index, self._journal_id, self._offset = self._import_existing(), None, 0
+            return self._index
+        journal_id = (stat.st_dev, stat.st_ino)
+        if journal_id != self._journal_id or stat.st_size < self._offset:
+            self._index, self._journal_id, self._offset = _empty_index(), journal_id, 0
+        if stat.st_size > self._offset:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read(stat.st_size - self._offset)
+            # A line still being appended is applied by a later read
+            complete = data[:data.rfind(b'\n') + 1]
+            for line in complete.splitlines():
+                if line.strip():
+                    _apply(self._index, json.loads(line))
+            self._offset += len(complete)
+        return self._index
+
+    def _write_journal(self, index: Dict):
+        """Atomically create the journal holding every version of ``index``."""
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for name, versions in index['templates'].items():
+                for record in versions:
+                    f.write(json.dumps(dict(record, name=name), ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.index_path)
+
+    def _import_existing(self) -> Dict:
+        legacy_index = os.path.join(self.root_dir, LEGACY_INDEX_FILE)
+        if os.path.exists(legacy_index):
+            with open(legacy_index, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return self._import_legacy_files()
+
+    def _import_legacy_files(self) -> Dict:
+        """Build the first index from ``<name>_v<N>`` files saved before the store existed."""
+        index = _empty_index()
+        if not os.path.isdir(self.root_dir):
+            return index
+        legacy = []
+        for entry in os.scandir(self.root_dir):
+            match = _VERSIONED_NAME.match(entry.name)
+            if match and entry.is_file():
+                legacy.append((match['name'] + (match['ext'] or ''), int(match['version']), entry))
+        for name, version, entry in sorted(legacy, key=lambda item: (item[0], item[1])):
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                record = self._new_version(index['templates'].get(name), name, f.read(), version=version,
+                                           created_at=entry.stat().st_mtime)
+            _apply(index, dict(record, name=name))
+        if legacy:
+            print(f"Indexed {len(legacy)} existing custom template files")
+        return index
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, f"{sha256}.txt")
+
+    def _new_version(self, versions: Optional[List[Dict]], name: str, content: str, version: Optional[int] = None,
+                     created_at: Optional[float] = None) -> Dict:
+        """Store the source blob and return the record of the version after ``versions``."""
+        digest = source_hash(content)
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(self.blob_dir, exist_ok=True)
+            tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, blob_path)
+
+        base_name, ext = os.path.splitext(name)
+        version = version or (versions[-1]['version'] + 1 if versions else 1)
+        record = {
+            'version': version,
+            'filename': f"{base_name}_v{version}{ext}",
+            'sha256': digest,
+            'variables': sorted(extract_template_variables(content)),
+            'created_at': created_at or time.time(),
+        }
+        return record
+
+    def save(self, filename: str, content: str) -> Dict:
+        """Store ``content`` as the next version of ``filename`` and return its record.
+
+        If it is identical to the latest version, that version is returned
+        and nothing is written. Raises ``VersionLimitError`` when the name
+        already has ``max_versions`` versions.
+        """
+        name = _clean_name(filename)
+        with self._locked():
+            index = self._read_index()
+            if self._journal_id is None:
+                self._write_journal(index)
+                index = self._read_index()
+            elif os.path.getsize(self.index_path) > self._offset:
+                # Under the lock an unfinished line is left by a save that crashed
+                os.truncate(self.index_path, self._offset)
+            versions = index['templates'].get(name)
+            if versions and versions[-1]['sha256'] == source_hash(content):
+                return dict(versions[-1], name=name)
+            if versions and len(versions) >= self.max_versions:
+                raise VersionLimitError(f"{name} already has {len(versions)} versions; the limit is {self.max_versions}")
+            record = dict(self._new_version(versions, name, content), name=name)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._read_index()
+        return record
+
+    def get(self, filename: str) -> Optional[Dict]:
+        """Return the record of a versioned filename such as ``lease_v2.txt``."""
+        with self._lock:
+            index = self._read_index()
+            name = index['files'].get(filename)
+            if name is None:
+                return None
+            for record in index['templates'][name]:
+                if record['filename'] == filename:
+                    return dict(record, name=name)
+        return None
+
+    def read(self, filename: str) -> Optional[str]:
+        """Return the source of a versioned filename, or None if it is unknown."""
+        record = self.get(filename)
+        if record is None:
+            return None
+        with open(self._blob_path(record['sha256']), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def versions(self, name: str) -> List[Dict]:
+        with self._lock:
+            index = self._read_index()
+            return [dict(record, name=name) for record in index['templates'].get(name, [])]
+
+    def list_latest(self) -> List[Dict]:
+        """Return the latest version of every template name, sorted by name."""
+        with self._lock:
+            index = self._read_index()
+            return [dict(versions[-1], name=name, version_count=len(versions))
+                    for name, versions in sorted(index['templates'].items()) if versions]
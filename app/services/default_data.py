@@ -0,0 +1,257 @@
+"""Default field values used to complete partially filled documents.
+
+The defaults only depend on the document type and language, so they are
+built once, at import, into a frozen table per (doc_type, language) with
+the translations already applied. A call copies its table and adds the
+date fields, which are computed once per day.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+try:
+    from dateutil.relativedelta import relativedelta
+except ImportError:
+    # Fallback if dateutil is not available
+    relativedelta = None
+
+
+def calculate_end_date(start_date_str, lease_period_years):
+    """Return the date ``lease_period_years`` after a date such as '1st April 2024'."""
+    try:
+        if relativedelta:
+            # Handle different date formats
+            for fmt in ['%dst %B %Y', '%dnd %B %Y', '%drd %B %Y', '%dth %B %Y', '%d %B %Y']:
+                try:
+                    start_date_obj = datetime.strptime(start_date_str, fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                # Fallback to current date
+                start_date_obj = datetime.now()
+
+            end_date_obj = start_date_obj + relativedelta(years=int(lease_period_years))
+            day = end_date_obj.day
+            if day == 1:
+                suffix = 'st'
+            elif day == 2:
+                suffix = 'nd'
+            elif day == 3:
+                suffix = 'rd'
+            else:
+                suffix = 'th'
+            return end_date_obj.strftime(f'%d{suffix} %B %Y')
+        else:
+            # Simple fallback calculation without dateutil
+            return '31st March 2026'
+    except Exception:
+        return '31st March 2026'
+
+
+COMMON_DEFAULTS = {
+    'execution_place': 'Chennai',
+    'witness1_name': 'Mr. Witness One',
+    'witness1_address': 'No. 123, Main Street, Chennai - 600001',
+    'witness2_name': 'Mr. Witness Two',
+    'witness2_address': 'No. 456, Second Street, Chennai - 600002',
+    'jurisdiction': 'Chennai',
+    'registration_office': 'Chennai',
+    'stamp_duty_bearer': 'Vendee'
+}
+
+DOCUMENT_DEFAULTS = {
+    'rental_agreement': {
+        'owner_age': '45',
+        'renter_age': '35',
+        'owner_father': 'Father Name',
+        'renter_father': 'Father Name',
+        'owner_address': 'No. 123, Main Street',
+        'owner_city': 'Chennai',
+        'owner_pincode': '600001',
+        'renter_address': 'No. 456, Second Street',
+        'renter_city': 'Chennai',
+        'renter_pincode': '600002',
+        'property_address': 'No. 789, Property Street',
+        'property_city': 'Chennai',
+        'property_pincode': '600073',
+        'start_date': '1st April 2024',
+        'effective_date': '1st April 2024',
+        'duration': '11',
+        'renewal_period': '11',
+        'rent_amount': '15,000',
+        'rent_amount_words': 'Fifteen Thousand',
+        'rent_due_date': '1st',
+        'rent_increase_percentage': '10',
+        'security_deposit': '30,000',
+        'security_deposit_words': 'Thirty Thousand',
+        'notice_period': '2'
+    },
+    'land_sale_deed': {
+        'seller_age': '50',
+        'buyer_age': '40',
+        'seller_father': 'Father Name',
+        'buyer_father': 'Father Name',
+        'seller_address': 'No. 123, Main Street',
+        'seller_city': 'Chennai',
+        'seller_pincode': '600001',
+        'buyer_address': 'No. 456, Second Street',
+        'buyer_city': 'Chennai',
+        'buyer_pincode': '600002',
+        'property_address': 'No. 789, Property Street',
+        'property_city': 'Chennai',
+        'property_pincode': '600073',
+        'sale_amount': '50,00,000',
+        'sale_amount_words': 'Fifty Lakhs',
+        'sale_date': '1st April 2024',
+        'survey_number': '123/45',
+        'area': '2400',
+        'north_boundary': 'Main Road',
+        'south_boundary': 'Residential Area',
+        'east_boundary': 'Park',
+        'west_boundary': 'Commercial Area'
+    },
+    'power_of_attorney': {
+        'principal_age': '55',
+        'attorney_age': '40',
+        'principal_father': 'Father Name',
+        'attorney_father': 'Father Name',
+        'principal_address': 'No. 123, Main Street',
+        'principal_city': 'Chennai',
+        'principal_pincode': '600001',
+        'attorney_address': 'No. 456, Second Street',
+        'attorney_city': 'Chennai',
+        'attorney_pincode': '600002',
+        'matter_description': 'property management and legal representation',
+        'effective_date': '1st April 2024',
+        'expiry_date': '31st March 2025'
+    },
+    'house_lease': {
+        'lessor_age': '50',
+        'lessee_age': '35',
+        'lessor_father': 'Father Name',
+        'lessee_father': 'Father Name',
+        'lessor_address': 'No. 123, Main Street',
+        'lessor_city': 'Chennai',
+        'lessor_pincode': '600001',
+        'lessee_address': 'No. 456, Second Street',
+        'lessee_city': 'Chennai',
+        'lessee_pincode': '600002',
+        'property_address': 'No. 789, Property Street',
+        'property_city': 'Chennai',
+        'property_pincode': '600073',
+        'lease_period': '2',
+        'start_date': '1st April 2024',
+        'end_date': calculate_end_date('1st April 2024', '2'),
+        'lease_amount': '25,000',
+        'lease_amount_words': 'Twenty Five Thousand',
+        'rent_due_date': '1st',
+        'security_deposit': '50,000',
+        'security_deposit_words': 'Fifty Thousand',
+        'notice_period': '3',
+        'number_of_rooms': '3'
+    }
+}
+
+# Default values translated into each language
+TRANSLATIONS = {
+    'en': {
+        'Father Name': 'Father Name',
+        'Mr. Witness One': 'Mr. Witness One',
+        'Chennai': 'Chennai'
+    },
+    'hi': {
+        'Father Name': 'अपने पिता का नाम',
+        'Mr. Witness One': 'श्री विजय एक',
+        'Chennai': 'चेन्नई'
+    },
+    'bn': {
+        'Father Name': 'আমার পিতার নাম',
+        'Mr. Witness One': 'শ্রী বিজয় এক',
+        'Chennai': 'চেন্নাই'
+    },
+    'te': {
+        'Father Name': 'నా పిల్లి పేరు',
+        'Mr. Witness One': 'శ్రీ విజయ ఒక',
+        'Chennai': 'చెన్నై'
+    },
+    'mr': {
+        'Father Name': 'माझा वडील यांचा नाव',
+        'Mr. Witness One': 'श्री విజయ एक',
+        'Chennai': 'चेन्नई'
+    },
+    'ur': {
+        'Father Name': 'میرے والد کا نام',
+        'Mr. Witness One': 'شری ویجی ہے',
+        'Chennai': 'چینనాی'
+    },
+    'gu': {
+        'Father Name': 'માઝા પિતાનું નામ',
+        'Mr. Witness One': 'શ્રી વિજય એક',
+        'Chennai': 'ચેન્નઈ'
+    },
+    'kn': {
+        'Father Name': 'ನನ್ನ ಪಿತಾನ ಹೆಸರು',
+        'Mr. Witness One': 'ಶ್ರೀ ವಿಜಯ ಒಂದು',
+        'Chennai': 'ಚೆನ್ನಾಯ'
+    },
+    'or': {
+        'Father Name': 'ଆମଦ୍ବାରା ପିତାଙ୍କ ନାମ',
+        'Mr. Witness One': 'ଶ୍ରୀ ବିଜଯ଼ ଏକ',
+        'Chennai': 'ଚେନ୍ନାଇ'
+    },
+    'ta': {
+        'Father Name': 'என் தந்தை பெயர்',
+        'Mr. Witness One': 'சிறுவர் விஜய் ஒன்று',
+        'Chennai': 'சென்னை'
+    }
+}
+
+
+def _translate(defaults: Dict[str, str], language: Optional[str]) -> Dict[str, str]:
+    translations = TRANSLATIONS.get(language, {})
+    translated = dict(defaults)
+    for key, value in defaults.items():
+        if isinstance(value, str) and value in translations:
+            translated[key] = translations[value]
+        elif isinstance(value, str) and value.lower() in translations:
+            translated[key] = translations[value.lower()]
+    return translated
+
+
+def _build_tables() -> Dict[Tuple[Optional[str], Optional[str]], Mapping[str, str]]:
+    # None stands for any other doc_type or language: base defaults, untranslated
+    tables = {}
+    for doc_type in list(DOCUMENT_DEFAULTS) + [None]:
+        defaults = dict(COMMON_DEFAULTS, **DOCUMENT_DEFAULTS.get(doc_type, {}))
+        for language in list(TRANSLATIONS) + [None]:
+            tables[doc_type, language] = MappingProxyType(_translate(defaults, language))
+    return tables
+
+
+DEFAULT_TABLES = _build_tables()
+
+
+@lru_cache(maxsize=2)
+def _date_fields(day: date) -> Mapping[str, str]:
+    return MappingProxyType({
+        'date': day.strftime('%B %d, %Y'),
+        'month': day.strftime('%B'),
+        'year': day.strftime('%Y'),
+        'execution_date': day.strftime('%d/%m/%Y'),
+    })
+
+
+def get_default_table(doc_type, language) -> Mapping[str, str]:
+    """Return the frozen defaults for a document type and language, without date fields."""
+    doc_type = doc_type if doc_type in DOCUMENT_DEFAULTS else None
+    language = language if language in TRANSLATIONS else None
+    return DEFAULT_TABLES[doc_type, language]
+
+
+def get_default_data_for_document(doc_type, language):
+    """Get default data for realistic document generation"""
+    # A mappingproxy's copy() is a plain dict copy, much faster than dict(proxy)
+    defaults = get_default_table(doc_type, language).copy()
+    defaults.update(_date_fields(date.today()))
+    return defaults
@@ -0,0 +1,119 @@
+"""Keyword classifier for document types.
+
+All keywords of all document types are compiled into one trie-shaped
+regular expression, so a prompt is scanned once however many types are
+registered, and shared prefixes cost nothing extra. Keywords match on
+word boundaries together with their common inflections (rent, rents,
+rented, renting, renter, rental), which gives lemma-like matching without
+running a spaCy lemmatizer.
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Keyword score at which a type's evidence counts as 0.5; more matches approach 1.0
+CLASSIFIER_EVIDENCE_SCALE = float(os.getenv('CLASSIFIER_EVIDENCE_SCALE', '1.0'))
+
+
+def inflections(keyword: str) -> List[str]:
+    """Return the keyword with its regular plural, verb, agent-noun and adjective forms."""
+    stem = keyword[:-1] if keyword.endswith('e') else keyword
+    forms = {keyword, keyword + 's', keyword + 'es', stem + 'ed', stem + 'ing', stem + 'er', stem + 'ers',
+             stem + 'al', stem + 'als'}
+    if keyword.endswith('y') and len(keyword) > 2 and keyword[-2] not in 'aeiou':
+        forms.add(keyword[:-1] + 'ies')
+    return sorted(forms)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Build a regex alternation factored by common prefixes."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node) -> str:
+        ends_here = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if ends_here:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class KeywordClassifier:
+    """Scores document types by the distinct keywords a prompt mentions.
+
+    A keyword shared by several types counts less toward each of them. A
+    type's evidence grows with its score, ``score / (score + scale)``, so
+    one distinct keyword gives 0.5 and every further one adds less. The
+    confidence of the best type is the evidence of its lead over the
+    runner-up, so keywords pointing to other types count against it. The
+    best type is always returned when anything matched, ties going to the
+    type registered first; a tie shows as a confidence of 0.
+    """
+
+    def __init__(self, keywords_by_type: Dict[str, Iterable[str]], evidence_scale: float = CLASSIFIER_EVIDENCE_SCALE):
+        self.evidence_scale = evidence_scale
+        self.types = list(keywords_by_type)
+        self._order = {doc_type: i for i, doc_type in enumerate(self.types)}
+
+        types_by_keyword = {}
+        for doc_type, keywords in keywords_by_type.items():
+            for keyword in keywords:
+                types_by_keyword.setdefault(keyword.lower(), []).append(doc_type)
+
+        # Matched text -> (keyword, weight per type); a form may belong to several keywords
+        self._forms = {}
+        for keyword, doc_types in types_by_keyword.items():
+            for form in inflections(keyword):
+                self._forms.setdefault(form, []).append((keyword, doc_types))
+
+        pattern = _trie_pattern(self._forms) if self._forms else r'(?!)'
+        self._regex = re.compile(r'\b' + pattern + r'\b', re.IGNORECASE)
+
+    def matched_keywords(self, prompt: str) -> Dict[str, List[str]]:
+        """Return the distinct keywords found in ``prompt`` with the types they point to."""
+        found = {}
+        for match in self._regex.finditer(prompt or ''):
+            for keyword, doc_types in self._forms.get(match.group(0).lower(), ()):
+                found[keyword] = doc_types
+        return found
+
+    def scores(self, prompt: str) -> List[Tuple[str, float]]:
+        """Return ``(doc_type, keyword score)`` pairs, best first, for types with any match."""
+        scores = {}
+        for doc_types in self.matched_keywords(prompt).values():
+            weight = 1.0 / len(doc_types)
+            for doc_type in doc_types:
+                scores[doc_type] = scores.get(doc_type, 0.0) + weight
+        # Equal scores keep registration order, so the ranking is stable
+        return sorted(scores.items(), key=lambda item: (-item[1], self._order[item[0]]))
+
+    def _evidence(self, score: float) -> float:
+        return score / (score + self.evidence_scale)
+
+    def rank(self, prompt: str) -> List[Tuple[str, float]]:
+        """Return ``(doc_type, evidence)`` pairs, best first, for types with any match."""
+        return [(doc_type, round(self._evidence(score), 3)) for doc_type, score in self.scores(prompt)]
+
+    def classify(self, prompt: str) -> Tuple[Optional[str], float, List[Tuple[str, float]]]:
+        """Return the best type, its confidence and the full ranking.
+
+        The type is None only when nothing matched.
+        """
+        scored = self.scores(prompt)
+        ranked = [(doc_type, round(self._evidence(score), 3)) for doc_type, score in scored]
+        if not scored:
+            return None, 0.0, ranked
+        best_type, best = scored[0]
+        runner_up = scored[1][1] if len(scored) > 1 else 0.0
+        # Shared keywords add fractional weights, so a tie may differ by rounding
+        lead = best - runner_up if best - runner_up > 1e-9 else 0.0
+        return best_type, round(self._evidence(lead), 3), ranked
@@ -0,0 +1,172 @@
+"""Schema of every supported document type, in one place.
+
+Each entry in ``DOCUMENT_DEFINITIONS`` lists a document type's form
+fields, the template placeholders they fill where the names differ, the
+fields a prompt must supply, its classifier keywords, its template file
+and whether missing placeholders are filled with generic values. At
+import every definition is compiled into a ``DocumentSchema`` holding
+parallel form/template field arrays, both direction maps, the required
+set, field types, labels and language options, so requests map and
+validate fields without building any tables.
+
+Adding a document type means adding its definition here and its
+template files.
+"""
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+LANGUAGE_NAMES = {
+    'en': 'English',
+    'hi': 'Hindi',
+    'bn': 'Bengali',
+    'te': 'Telugu',
+    'mr': 'Marathi',
+    'ur': 'Urdu',
+    'gu': 'Gujarati',
+    'kn': 'Kannada',
+    'or': 'Odia',
+    'ta': 'Tamil'
+}
+
+# Fields every document ends with: witnesses, execution and the current date
+_SIGNATURE_FIELDS = ['witness1_name', 'witness1_address', 'witness2_name', 'witness2_address',
+                     'execution_date', 'execution_place', 'date', 'month', 'year']
+
+DOCUMENT_DEFINITIONS = {
+    'rental_agreement': {
+        'template': 'rental_agreement_template.txt',
+        'keywords': ['rental', 'rent', 'lease', 'tenant', 'landlord', 'monthly'],
+        'fields': ['owner_name', 'owner_age', 'owner_father', 'owner_address', 'owner_city', 'owner_pincode',
+                   'renter_name', 'renter_age', 'renter_father', 'renter_address', 'renter_city', 'renter_pincode',
+                   'property_address', 'property_city', 'property_pincode', 'start_date', 'effective_date',
+                   'duration', 'renewal_period', 'rent_amount', 'rent_amount_words', 'rent_due_date',
+                   'rent_increase_percentage', 'security_deposit', 'security_deposit_words', 'notice_period',
+                   'jurisdiction'] + _SIGNATURE_FIELDS,
+        # The form asks for the owner and renter; the templates call them landlord and tenant
+        'template_fields': {
+            'owner_name': 'landlord', 'owner_age': 'landlord_age', 'owner_father': 'landlord_father',
+            'owner_address': 'landlord_address', 'owner_city': 'landlord_city', 'owner_pincode': 'landlord_pincode',
+            'renter_name': 'tenant', 'renter_age': 'tenant_age', 'renter_father': 'tenant_father',
+            'renter_address': 'tenant_address', 'renter_city': 'tenant_city', 'renter_pincode': 'tenant_pincode'
+        },
+        'required': ['landlord', 'landlord_address', 'tenant', 'tenant_address', 'property_address',
+                     'rent_amount', 'start_date', 'duration']
+    },
+    'land_sale_deed': {
+        'template': 'land_sale_deed_template.txt',
+        'keywords': ['sale', 'deed', 'property', 'buyer', 'seller', 'purchase'],
+        'fields': ['seller', 'seller_age', 'seller_father', 'seller_address', 'seller_city', 'seller_pincode',
+                   'buyer', 'buyer_age', 'buyer_father', 'buyer_address', 'buyer_city', 'buyer_pincode',
+                   'sale_amount', 'sale_amount_words', 'stamp_duty_bearer', 'registration_office',
+                   'survey_number', 'area', 'north_boundary', 'south_boundary', 'east_boundary', 'west_boundary',
+                   'property_address', 'property_city', 'property_pincode'] + _SIGNATURE_FIELDS,
+        'required': ['seller', 'seller_address', 'buyer', 'buyer_address', 'property_address', 'sale_amount']
+    },
+    'power_of_attorney': {
+        'template': 'power_of_attorney_template.txt',
+        'keywords': ['power', 'attorney', 'delegate', 'authority', 'behalf'],
+        'fields': ['principal', 'principal_age', 'principal_father', 'principal_address', 'principal_city',
+                   'principal_pincode', 'attorney', 'attorney_age', 'attorney_father', 'attorney_address',
+                   'attorney_city', 'attorney_pincode', 'matter_description', 'effective_date', 'expiry_date',
+                   'registration_office', 'stamp_duty_bearer'] + _SIGNATURE_FIELDS,
+        'required': ['principal', 'principal_address', 'attorney', 'attorney_address', 'matter_description',
+                     'effective_date', 'expiry_date']
+    },
+    'house_lease': {
+        'template': 'house_lease_template.txt',
+        'keywords': ['house', 'lease', 'lessor', 'lessee', 'property'],
+        'fields': ['lessor', 'lessor_age', 'lessor_father', 'lessor_address', 'lessor_city', 'lessor_pincode',
+                   'lessee', 'lessee_age', 'lessee_father', 'lessee_address', 'lessee_city', 'lessee_pincode',
+                   'property_address', 'property_city', 'property_pincode', 'lease_period', 'start_date', 'end_date',
+                   'lease_amount', 'lease_amount_words', 'rent_due_date', 'security_deposit',
+                   'security_deposit_words', 'notice_period', 'jurisdiction', 'number_of_rooms'] + _SIGNATURE_FIELDS,
+        'required': ['lessor', 'lessor_age', 'lessor_father', 'lessor_address', 'lessor_city', 'lessor_pincode',
+                     'lessee', 'lessee_age', 'lessee_father', 'lessee_address', 'lessee_city', 'lessee_pincode',
+                     'property_address', 'property_city', 'property_pincode', 'lease_period', 'start_date',
+                     'end_date', 'lease_amount', 'lease_amount_words', 'rent_due_date', 'security_deposit',
+                     'security_deposit_words', 'notice_period', 'number_of_rooms'],
+        # Placeholders left empty are filled with generic values instead of rendering blank
+        'fill_missing': True
+    }
+}
+
+# Field type by exact name, then by name suffix; anything else is text
+_FIELD_TYPES = {
+    'date': 'date', 'month': 'text', 'year': 'number',
+    'rent_amount': 'amount', 'sale_amount': 'amount', 'lease_amount': 'amount', 'security_deposit': 'amount',
+    'duration': 'months', 'renewal_period': 'months', 'notice_period': 'months', 'lease_period': 'years',
+    'rent_due_date': 'day', 'area': 'number', 'number_of_rooms': 'number', 'rent_increase_percentage': 'percent',
+}
+_SUFFIX_TYPES = (('_age', 'number'), ('_pincode', 'pincode'), ('_date', 'date'), ('_words', 'text'))
+_TYPE_UNITS = {'months': ' (months)', 'years': ' (years)', 'percent': ' (%)'}
+
+
+def field_type(template_field: str) -> str:
+    if template_field in _FIELD_TYPES:
+        return _FIELD_TYPES[template_field]
+    for suffix, type_name in _SUFFIX_TYPES:
+        if template_field.endswith(suffix):
+            return type_name
+    return 'text'
+
+
+class DocumentSchema:
+    """Compiled fields, field maps and languages of one document type."""
+
+    def __init__(self, doc_type: str, definition: Dict, languages: Tuple[str, ...] = tuple(LANGUAGE_NAMES)):
+        renames = definition.get('template_fields', {})
+        self.doc_type = doc_type
+        self.template = definition['template']
+        self.keywords = tuple(definition['keywords'])
+        self.fill_missing = definition.get('fill_missing', False)
+        self.languages = tuple(definition.get('languages', languages))
+        self.language_options = tuple(MappingProxyType({'code': code, 'name': LANGUAGE_NAMES.get(code, code.upper())})
+                                      for code in self.languages)
+
+        # Parallel arrays: form_fields[i] fills the template placeholder template_fields[i]
+        self.form_fields = tuple(definition['fields'])
+        self.template_fields = tuple(renames.get(field, field) for field in self.form_fields)
+        self.field_pairs = tuple(zip(self.form_fields, self.template_fields))
+        self.to_template = MappingProxyType(dict(self.field_pairs))
+        self.to_form = MappingProxyType({template: form for form, template in self.field_pairs})
+
+        self.required_fields = tuple(definition['required'])
+        self.required_set = frozenset(self.required_fields)
+        self.field_types = MappingProxyType({field: field_type(field) for field in self.template_fields})
+        self.labels = MappingProxyType({
+            field: field.replace('_', ' ').title() + _TYPE_UNITS.get(self.field_types[field], '')
+            for field in self.template_fields
+        })
+
+        unknown = self.required_set.difference(self.template_fields)
+        if unknown:
+            raise ValueError(f"{doc_type}: required fields not in its field list: {sorted(unknown)}")
+
+    def from_form(self, form: Mapping) -> Dict[str, str]:
+        """Map submitted form values to template placeholders; absent fields are empty."""
+        return {template: (form.get(field) or '').strip() for field, template in self.field_pairs}
+
+    def to_form_values(self, data: Mapping) -> Dict:
+        """Map template-keyed data, such as a saved document's, back to form field names."""
+        values = {}
+        for field, template in self.field_pairs:
+            if template in data:
+                values[field] = data[template]
+            elif field in data:
+                values[field] = data[field]
+        return values
+
+    def missing_fields(self, data: Mapping) -> List[str]:
+        """Return the required fields that are absent or empty in ``data``, in schema order."""
+        return [field for field in self.required_fields if not data.get(field)]
+
+
+SCHEMAS = MappingProxyType({doc_type: DocumentSchema(doc_type, definition)
+                            for doc_type, definition in DOCUMENT_DEFINITIONS.items()})
+
+# doc_type -> base template file, as the template registry expects
+TEMPLATE_FILES = MappingProxyType({doc_type: schema.template for doc_type, schema in SCHEMAS.items()})
+
+
+def get_schema(doc_type) -> Optional[DocumentSchema]:
+    return SCHEMAS.get(doc_type)
@@ -0,0 +1,155 @@
+"""Deferred, cached named-entity extraction for generated documents.
+
+Entity extraction over a full rendered contract is the most expensive NLP
+step of document generation, and its result is only shown as a side panel.
+The work is therefore taken off the request thread: generation routes may
+start it in the background, and the page fetches the result after first
+paint. Results are cached by a hash of (language, content); the routes
+render that key into the page, and the page fetches the result by key
+instead of posting the document back. A failed extraction is cached as
+well, so polls for its key get the error instead of waiting forever.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+
+from app.services.nlp_registry import get_nlp
+
+ENTITY_EXTRACTION_ENABLED = os.getenv('ENTITY_EXTRACTION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+MULTILINGUAL_MODEL = os.getenv('SPACY_MULTILINGUAL_MODEL', 'xx_ent_wiki_sm')
+ENTITY_CACHE_SIZE = int(os.getenv('ENTITY_CACHE_SIZE', '256'))
+ENTITY_WORKERS = int(os.getenv('ENTITY_WORKERS', '1'))
+# Longest content, in characters, that is run through NER
+ENTITY_MAX_CONTENT = int(os.getenv('ENTITY_MAX_CONTENT', str(200 * 1024)))
+
+
+class EntityExtractor:
+    """Runs NER off the request path and caches results by content hash."""
+
+    def __init__(self, enabled: bool = ENTITY_EXTRACTION_ENABLED, cache_size: int = ENTITY_CACHE_SIZE,
+                 max_workers: int = ENTITY_WORKERS, multilingual_model: Optional[str] = MULTILINGUAL_MODEL):
+        self.enabled = enabled
+        self.cache_size = cache_size
+        self.max_workers = max_workers
+        self.multilingual_model = multilingual_model
+        self._cache = OrderedDict()
+        self._errors = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._multilingual_available = None
+
+    @staticmethod
+    def content_key(content: str, language: str = 'en') -> str:
+        return hashlib.sha256(f"{language}\0{content}".encode('utf-8')).hexdigest()
+
+    def _model_for(self, language: str) -> Tuple[bool, Optional[str]]:
+        """Return (supported, model_name) for a document language.
+
+        English uses the default pipeline. Other languages are routed to the
+        multilingual NER model when it is installed and skipped otherwise,
+        since the English model finds nothing useful in Indic or Urdu script.
+        """
+        if language == 'en':
+            return True, None
+        if self._multilingual_available is None:
+            import spacy
+            self._multilingual_available = bool(self.multilingual_model) and spacy.util.is_package(self.multilingual_model)
+        if self._multilingual_available:
+            return True, self.multilingual_model
+        return False, None
+
+    @staticmethod
+    def _remember(cache: OrderedDict, key: str, value, size: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+    def _extract(self, key: str, content: str, language: str) -> List[Tuple[str, str]]:
+        try:
+            supported, model_name = self._model_for(language)
+            entities = []
+            if supported:
+                doc = get_nlp('ner', model_name)(content)
+                entities = [(ent.text, ent.label_) for ent in doc.ents]
+        except Exception as e:
+            with self._lock:
+                self._remember(self._errors, key, f"{type(e).__name__}: {e}", self.cache_size)
+                self._pending.pop(key, None)
+            raise
+        with self._lock:
+            self._errors.pop(key, None)
+            self._remember(self._cache, key, entities, self.cache_size)
+            self._pending.pop(key, None)
+        return entities
+
+    def submit(self, content: str, language: str = 'en') -> Optional[str]:
+        """Start extraction in the background and return the cache key.
+
+        Returns None when extraction is disabled, the language is skipped or
+        the content is longer than ``ENTITY_MAX_CONTENT``.
+        """
+        if not self.enabled or not content or len(content) > ENTITY_MAX_CONTENT:
+            return None
+        if not self._model_for(language)[0]:
+            return None
+        key = self.content_key(content, language)
+        with self._lock:
+            if key in self._cache or key in self._pending:
+                return key
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='entities')
+            self._pending[key] = self._executor.submit(self._extract, key, content, language)
+        return key
+
+    def lookup(self, key: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Return the result for a key from ``submit``, waiting up to ``timeout`` for in-flight work.
+
+        Returns None for an unknown or evicted key, status 'pending' if the
+        work did not finish in time and status 'error' if it failed.
+        """
+        with self._lock:
+            entities = self._cache.get(key)
+            if entities is not None:
+                self._cache.move_to_end(key)
+                return {'status': 'ready', 'entities': entities, 'cached': True}
+            error = self._errors.get(key)
+            future = self._pending.get(key)
+        if error is not None and future is None:
+            return {'status': 'error', 'error': error, 'entities': []}
+        if future is None:
+            return None
+        try:
+            entities = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return {'status': 'pending', 'entities': []}
+        except Exception as e:
+            return {'status': 'error', 'error': f"{type(e).__name__}: {e}", 'entities': []}
+        return {'status': 'ready', 'entities': entities, 'cached': False}
+
+    def extract(self, content: str, language: str = 'en') -> Dict:
+        """Return entities for ``content``, reusing cached or in-flight work."""
+        if not self.enabled:
+            return {'status': 'disabled', 'entities': []}
+        if not self._model_for(language)[0]:
+            return {'status': 'skipped', 'entities': []}
+        if len(content) > ENTITY_MAX_CONTENT:
+            raise ValueError(f"Content is longer than {ENTITY_MAX_CONTENT} characters")
+
+        key = self.content_key(content, language)
+        with self._lock:
+            entities = self._cache.get(key)
+            if entities is not None:
+                self._cache.move_to_end(key)
+                return {'status': 'ready', 'entities': entities, 'cached': True}
+            future = self._pending.get(key)
+
+        entities = future.result() if future is not None else self._extract(key, content, language)
+        return {'status': 'ready', 'entities': entities, 'cached': False}
+
+
+entity_extractor = EntityExtractor()
@@ -0,0 +1,79 @@
+"""Single-pass regex scanner for typed entity matches.
+
+The patterns of every entity kind are joined into one alternation of
+named groups and compiled once, so one ``finditer`` pass over a prompt
+yields every amount, date, location and duration in document order.
+Each hit carries its kind and character offsets, which lets callers
+tell a rent from a deposit or a start date from an end date by the
+words around it.
+"""
+import re
+from typing import Dict, List, NamedTuple
+
+
+class EntityMatch(NamedTuple):
+    kind: str
+    # The pattern's first capture group when it has one, else the whole match
+    value: str
+    text: str
+    start: int
+    end: int
+
+
+class PatternScanner:
+    """Finds all non-overlapping matches of several named patterns at once.
+
+    When two patterns match at the same position the one registered first
+    wins, so more specific patterns (dates) go before looser ones (bare
+    amounts).
+    """
+
+    def __init__(self, patterns: Dict[str, str], flags: int = re.IGNORECASE):
+        self.kinds = list(patterns)
+        alternatives = []
+        # kind -> (index of the kind's group, index of its value group or None)
+        self._groups = {}
+        group = 1
+        for kind, pattern in patterns.items():
+            inner = re.compile(pattern, flags).groups
+            self._groups[kind] = (group, group + 1 if inner else None)
+            alternatives.append(f'(?P<{kind}>{pattern})')
+            group += 1 + inner
+        self._regex = re.compile('|'.join(alternatives), flags)
+
+    def scan(self, text: str) -> List[EntityMatch]:
+        """Return every match in ``text``, in order of position."""
+        matches = []
+        for match in self._regex.finditer(text or ''):
+            kind = match.lastgroup
+            group, value_group = self._groups[kind]
+            value = match.group(value_group) if value_group else None
+            whole = match.group(group)
+            # Patterns may swallow spaces around a value; offsets follow the trimmed text
+            start = match.start(group) + len(whole) - len(whole.lstrip())
+            whole = whole.strip()
+            matches.append(EntityMatch(kind, value if value is not None else whole, whole,
+                                       start, start + len(whole)))
+        return matches
+
+    def group_by_kind(self, text: str) -> Dict[str, List[EntityMatch]]:
+        """Return the matches in ``text`` keyed by kind, each list in order of position."""
+        grouped = {kind: [] for kind in self.kinds}
+        for match in self.scan(text):
+            grouped[match.kind].append(match)
+        return grouped
+
+
+_WORD = re.compile(r"[\w.']+")
+
+
+def cue_before(text: str, start: int, cues, window: int = 3) -> bool:
+    """Return True if one of the ``window`` words before offset ``start`` is a cue."""
+    words = _WORD.findall(text[max(0, start - 40):start].lower())
+    return any(word.rstrip('.') in cues or word in cues for word in words[-window:])
+
+
+def cue_after(text: str, end: int, cues, window: int = 3) -> bool:
+    """Return True if one of the ``window`` words after offset ``end`` is a cue."""
+    words = _WORD.findall(text[end:end + 40].lower())
+    return any(word.rstrip('.') in cues or word in cues for word in words[:window])
@@ -0,0 +1,173 @@
+"""Content-addressed cache of export artifacts.
+
+Exports are keyed by (content hash, format, export-style version), so the
+same document downloaded again is served from memory instead of being laid
+out again by ReportLab or python-docx. An optional on-disk tier keeps
+artifacts across restarts and shares them between worker processes. Its
+size bound holds for the directory as a whole: after each write the
+directory is scanned and the least recently used files, by mtime, are
+removed; a disk hit touches its file.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR') or None
+EXPORT_CACHE_DISK_MAX_BYTES = int(os.getenv('EXPORT_CACHE_DISK_MAX_BYTES', str(512 * 1024 * 1024)))
+
+
+def export_key(content: str, doc_type: str, fmt: str, style_version: int) -> str:
+    """Return the cache key for an export; doc_type is part of the rendered heading."""
+    digest = hashlib.sha256(f"{doc_type}\0{content}".encode('utf-8')).hexdigest()
+    return f"{digest}.v{style_version}.{fmt}"
+
+
+class ExportCache:
+    """Size-bounded LRU of export bytes with an optional disk tier."""
+
+    def __init__(self, max_bytes: int = EXPORT_CACHE_MAX_BYTES, disk_dir: Optional[str] = EXPORT_CACHE_DIR,
+                 disk_max_bytes: int = EXPORT_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # Single artifacts larger than this are streamed but not cached
+        self.max_item_bytes = max_bytes // 4
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        # Size of the disk tier as of the last scan
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+            'uncacheable': 0,
+        }
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.counters['hits'] += 1
+                return data
+        data = self._disk_get(key)
+        with self._lock:
+            if data is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['disk_hits'] += 1
+            self._memory_put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> bool:
+        """Cache ``data`` and return False if it is too large to be cached."""
+        if len(data) > self.max_item_bytes:
+            with self._lock:
+                self.counters['uncacheable'] += 1
+            return False
+        with self._lock:
+            self.counters['stores'] += 1
+            self._memory_put(key, data)
+        self._disk_put(key, data)
+        return True
+
+    def _memory_put(self, key: str, data: bytes):
+        previous = self._items.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._items[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes and self._items:
+            _, evicted = self._items.popitem(last=False)
+            self._size -= len(evicted)
+            self.counters['evictions'] += 1
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = os.path.join(self.disk_dir, key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        self._touch(path)
+        return data
+
+    @staticmethod
+    def _touch(path: str):
+        # The mtime is the recency every worker's eviction scan sees
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _disk_put(self, key: str, data: bytes):
+        if not self.disk_dir:
+            return
+        path = os.path.join(self.disk_dir, key)
+        if os.path.exists(path):
+            self._touch(path)
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Export cache disk write failed: {e}")
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """Remove the least recently used artifacts until the directory fits its bound."""
+        entries = []
+        try:
+            for entry in os.scandir(self.disk_dir):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        except OSError as e:
+            print(f"Export cache disk scan failed: {e}")
+            return
+        total = sum(size for _, _, size in entries)
+        evicted = 0
+        for _, name, size in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+                evicted += 1
+            except OSError:
+                pass
+            # Also when another worker removed it first
+            total -= size
+        with self._lock:
+            self._disk_size = total
+            self.counters['disk_evictions'] += evicted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update(
+                entries=len(self._items),
+                bytes=self._size,
+                max_bytes=self.max_bytes,
+                disk_enabled=bool(self.disk_dir),
+                disk_bytes=self._disk_size,
+            )
+        return stats
+
+
+export_cache = ExportCache()
@@ -0,0 +1,168 @@
+"""DOCX and PDF export of generated documents.
+
+Exports are built in memory and streamed straight into the response.
+Buffers spill to an anonymous temporary file only past
+``EXPORT_SPOOL_MAX_BYTES``, and that file is deleted when the response
+closes it, so nothing is left behind on disk.
+
+``export_document`` fronts the builders with the content-addressed export
+cache, so repeat downloads of the same content skip the layout pass.
+python-docx and ReportLab are imported by the first export of each format.
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from app.services.export_cache import export_cache, export_key
+
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv('EXPORT_SPOOL_MAX_BYTES', str(8 * 1024 * 1024)))
+
+# Bump whenever the layout produced by the builders changes, so cached
+# artifacts from the previous layout are no longer served.
+EXPORT_STYLE_VERSION = 1
+
+MIMETYPES = {
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'pdf': 'application/pdf',
+}
+
+_pdf_styles = None
+_stats_lock = threading.Lock()
+_stats = {fmt: {'count': 0, 'seconds': 0.0, 'bytes': 0} for fmt in MIMETYPES}
+
+
+def _get_pdf_styles():
+    """Build the paragraph styles once; they are immutable after creation."""
+    global _pdf_styles
+    if _pdf_styles is None:
+        from reportlab.lib.enums import TA_JUSTIFY
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        styles = getSampleStyleSheet()
+        _pdf_styles = {
+            'body': ParagraphStyle(
+                name='Body',
+                parent=styles['Normal'],
+                fontSize=11,
+                leading=16,
+                alignment=TA_JUSTIFY,
+            ),
+            'title': ParagraphStyle(
+                name='Title',
+                parent=styles['Heading1'],
+                fontSize=18,
+                leading=22,
+                spaceAfter=12,
+            ),
+        }
+    return _pdf_styles
+
+
+def _new_buffer():
+    return tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+
+
+def _record(fmt: str, started: float, buffer) -> None:
+    size = buffer.seek(0, os.SEEK_END)
+    with _stats_lock:
+        _stats[fmt]['count'] += 1
+        _stats[fmt]['seconds'] += time.perf_counter() - started
+        _stats[fmt]['bytes'] += size
+    buffer.seek(0)
+
+
+def build_docx(content: str, doc_type: str):
+    """Return a rewound file-like object holding the DOCX export."""
+    from docx import Document
+    started = time.perf_counter()
+    doc = Document()
+    doc.add_heading(f'{doc_type.replace("_", " ").title()}', 0)
+
+    # Add content
+    for para in content.split('\n'):
+        if para.strip():
+            doc.add_paragraph(para.strip())
+
+    buffer = _new_buffer()
+    doc.save(buffer)
+    _record('docx', started, buffer)
+    return buffer
+
+
+def build_pdf(content: str, doc_type: str):
+    """Return a rewound file-like object holding the PDF export."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    started = time.perf_counter()
+    buffer = _new_buffer()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=54, rightMargin=54, topMargin=54, bottomMargin=54)
+    styles = _get_pdf_styles()
+
+    story = [Paragraph(doc_type.replace('_', ' ').title(), styles['title']), Spacer(1, 0.2 * inch)]
+
+    # Convert plain text line breaks to simple paragraphs
+    for block in content.split('\n\n'):
+        block_html = block.strip().replace('\n', '<br/>')
+        if not block_html:
+            continue
+        story.append(Paragraph(block_html, styles['body']))
+        story.append(Spacer(1, 0.12 * inch))
+
+    doc.build(story)
+    _record('pdf', started, buffer)
+    return buffer
+
+
+def preload() -> None:
+    """Build the PDF styles and lay out a throwaway PDF and DOCX.
+
+    This loads fonts and python-docx's default template before the first
+    export, without counting toward the export stats.
+    """
+    from docx import Document
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph
+    styles = _get_pdf_styles()
+    SimpleDocTemplate(io.BytesIO(), pagesize=A4).build([
+        Paragraph('Warm-up', styles['title']),
+        Paragraph('Warm-up', styles['body']),
+    ])
+    Document().save(io.BytesIO())
+
+
+BUILDERS = {
+    'docx': build_docx,
+    'pdf': build_pdf,
+}
+
+
+def export_document(content: str, doc_type: str, fmt: str):
+    """Return a rewound file-like export, served from the cache when possible."""
+    key = export_key(content, doc_type, fmt, EXPORT_STYLE_VERSION)
+    data = export_cache.get(key)
+    if data is not None:
+        return io.BytesIO(data)
+
+    buffer = BUILDERS[fmt](content, doc_type)
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    if size <= export_cache.max_item_bytes:
+        data = buffer.read()
+        buffer.close()
+        export_cache.put(key, data)
+        return io.BytesIO(data)
+    return buffer
+
+
+def export_stats() -> Dict[str, Dict]:
+    """Return export count, total/average build time and bytes per format."""
+    with _stats_lock:
+        stats = {
+            fmt: dict(values, avg_ms=round(values['seconds'] * 1000 / values['count'], 2) if values['count'] else 0.0)
+            for fmt, values in _stats.items()
+        }
+    stats['cache'] = export_cache.stats()
+    return stats
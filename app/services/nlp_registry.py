@@ -0,0 +1,112 @@
+"""Process-wide registry of spaCy pipelines.
+
+Each pipeline is loaded once per process, on first use, with only the
+components its use case needs. spaCy itself is imported on first load, so
+importing this module is cheap. Load time and resident-memory growth are
+recorded per profile so the cost of every model load is visible.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+DEFAULT_MODEL = os.getenv('SPACY_MODEL', 'en_core_web_sm')
+
+# Components kept for each use case; everything else in the model is excluded
+# at load time so it is neither deserialised nor kept in memory.
+# None keeps the full pipeline.
+PROFILES: Dict[str, Optional[Tuple[str, ...]]] = {
+    'full': None,
+    'ner': ('ner',),
+    'tokenizer': (),
+}
+
+
+def _rss_bytes() -> int:
+    """Return the current resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is a peak value in KB on Linux; good enough as a fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _model_components(model_name: str):
+    """Return the component names declared by an installed model package or model directory."""
+    import spacy
+    try:
+        path = model_name if os.path.isdir(model_name) else spacy.util.get_package_path(model_name)
+        meta = spacy.util.get_model_meta(path)
+        return list(meta.get('pipeline', [])) + list(meta.get('disabled', []))
+    except Exception:
+        return []
+
+
+class NLPRegistry:
+    """Loads and shares spaCy pipelines keyed by (model, profile)."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        self.model_name = model_name
+        self._pipelines = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, profile: str = 'full', model_name: Optional[str] = None):
+        """Return the pipeline for ``profile``, loading it on first use."""
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown NLP profile: {profile}")
+        key = (model_name or self.model_name, profile)
+        nlp = self._pipelines.get(key)
+        if nlp is not None:
+            return nlp
+        with self._lock:
+            nlp = self._pipelines.get(key)
+            if nlp is None:
+                nlp = self._load(*key)
+                self._pipelines[key] = nlp
+        return nlp
+
+    def is_loaded(self, profile: str = 'full', model_name: Optional[str] = None) -> bool:
+        return (model_name or self.model_name, profile) in self._pipelines
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return load time, memory growth and components per loaded pipeline."""
+        return {f"{model}:{profile}": dict(info) for (model, profile), info in self._stats.items()}
+
+    def _load(self, model_name: str, profile: str):
+        keep = PROFILES[profile]
+        exclude = []
+        if keep is not None:
+            exclude = [name for name in _model_components(model_name) if name not in keep]
+
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        import spacy
+        try:
+            nlp = spacy.load(model_name, exclude=exclude)
+        except OSError:
+            subprocess.run([sys.executable, "-m", "spacy", "download", model_name])
+            nlp = spacy.load(model_name, exclude=exclude)
+        elapsed = time.perf_counter() - started
+        rss_delta = max(_rss_bytes() - rss_before, 0)
+
+        self._stats[(model_name, profile)] = {
+            'load_seconds': round(elapsed, 4),
+            'rss_delta_bytes': rss_delta,
+            'components': list(nlp.pipe_names),
+        }
+        print(f"Loaded spaCy pipeline {model_name}:{profile} in {elapsed:.2f}s "
+              f"(+{rss_delta / (1024 * 1024):.1f} MiB RSS, components={nlp.pipe_names})")
+        return nlp
+
+
+nlp_registry = NLPRegistry()
+
+
+def get_nlp(profile: str = 'full', model_name: Optional[str] = None):
+    """Return a shared pipeline from the process-wide registry."""
+    return nlp_registry.get(profile, model_name)
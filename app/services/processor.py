@@ -1,74 +1,96 @@
 import os
 from datetime import datetime
 import re
-import spacy
-from jinja2 import Template
-from docx import Document
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph
-
-# Load spaCy model for NLP processing
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    import subprocess
-    subprocess.run(["python", "-m", "spacy", "download", "en_core_web_sm"])
-    nlp = spacy.load("en_core_web_sm")
 
 from app.services.document_generator import DocumentGenerator
+from app.services.document_schema import SCHEMAS
+from app.services.doc_classifier import KeywordClassifier
+from app.services.nlp_registry import get_nlp
+from app.services.entity_rules import DATE_END_CUES, DEPOSIT_CUES, NOTICE_CUES, rules_for
+from app.services.entity_scanner import PatternScanner, cue_after, cue_before
+
+PROMPT_BATCH_SIZE = int(os.getenv('PROMPT_BATCH_SIZE', '64'))
+# spaCy worker processes per batch; above 1 only pays off for large batches
+PROMPT_N_PROCESS = int(os.getenv('PROMPT_N_PROCESS', '1'))
+# Reported by the prompt APIs when no document type keyword matched
+UNKNOWN_DOCUMENT_TYPE = 'unknown'
+# Role, amount, date and pincode rules; their matches override the positional NER guesses
+ENTITY_RULES_ENABLED = os.getenv('ENTITY_RULES_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# With rules on, statistical NER only fills names the rules missed; turning it off is much faster
+ENTITY_NER_ENABLED = os.getenv('ENTITY_NER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
 
 class LegalDocumentProcessor:
-    def __init__(self):
+    def __init__(self, use_rules=ENTITY_RULES_ENABLED, use_ner=ENTITY_NER_ENABLED, document_generator=None):
+        self.use_rules = use_rules
+        # Without rules, NER is the only source of names
+        self.use_ner = use_ner or not use_rules
+        # Kept in the shape callers already read; the schema registry is the source
         self.document_types = {
-            'rental_agreement': {
-                'keywords': ['rental', 'rent', 'lease', 'tenant', 'landlord', 'monthly'],
-                'required_fields': ['landlord', 'landlord_address', 'tenant', 'tenant_address', 'property_address', 'rent_amount', 'start_date', 'duration'],
-                'template': 'rental_agreement_template.txt'
-            },
-            'land_sale_deed': {
-                'keywords': ['sale', 'deed', 'property', 'buyer', 'seller', 'purchase'],
-                'required_fields': ['seller', 'seller_address', 'buyer', 'buyer_address', 'property_address', 'sale_amount'],
-                'template': 'land_sale_deed_template.txt'
-            },
-            'power_of_attorney': {
-                'keywords': ['power', 'attorney', 'delegate', 'authority', 'behalf'],
-                'required_fields': ['principal', 'principal_address', 'attorney', 'attorney_address', 'matter_description', 'effective_date', 'expiry_date'],
-                'template': 'power_of_attorney_template.txt'
-            },
-            'house_lease': {
-                'keywords': ['house', 'lease', 'lessor', 'lessee', 'property'],
-                'required_fields': ['lessor', 'lessor_age', 'lessor_father', 'lessor_address', 'lessor_city', 'lessor_pincode', 'lessee', 'lessee_age', 'lessee_father', 'lessee_address', 'lessee_city', 'lessee_pincode', 'property_address', 'property_city', 'property_pincode', 'lease_period', 'start_date', 'end_date', 'lease_amount', 'lease_amount_words', 'rent_due_date', 'security_deposit', 'security_deposit_words', 'notice_period', 'number_of_rooms'],
-                'template': 'house_lease_template.txt'
+            doc_type: {
+                'keywords': list(schema.keywords),
+                'required_fields': list(schema.required_fields),
+                'template': schema.template
             }
+            for doc_type, schema in SCHEMAS.items()
         }
-        self.document_generator = DocumentGenerator()
+        self.document_generator = document_generator or DocumentGenerator()
+        self.classifier = KeywordClassifier(
+            {doc_type: list(schema.keywords) for doc_type, schema in SCHEMAS.items()}
+        )
 
+        # Order matters: at a shared position the earlier pattern wins, so a
+        # date or duration is never read as a bare amount
         self.entity_patterns = {
-            'amounts': r'(?:Rs\.?|INR)?\s*(\d+(?:,\d+)*(?:\.\d{2})?)\s*(?:rupees?|Rs\.?|INR)?',
-            'dates': r'\d{1,2}[-/]\d{1,2}[-/]\d{4}|\d{1,2}(?:st|nd|rd|th)?\s+(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{4}',
-            'locations': r'\b(?:at|in)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-            'durations': r'(\d+)\s*(?:year|month|week|day)s?'
+            'dates': r'\d{1,2}[-/.]\d{1,2}[-/.]\d{4}|\d{1,2}(?:st|nd|rd|th)?\s+(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{4}',
+            'durations': r'(\d+)\s*(?:year|month|week|day)s?',
+            # Six digits not followed by a currency word are an Indian PIN code, not a price
+            'pincodes': r'\b[1-9]\d{5}\b(?!\s*(?:rupees?|/-|Rs\b|INR\b))',
+            'amounts': r'(?:(?:Rs\.?|INR|₹)\s*)?(\d+(?:,\d+)*(?:\.\d{2})?)\s*(?:rupees?|Rs\.?|INR)?',
+            # Place names stay case-sensitive although the scanner ignores case
+            'locations': r'\b(?:at|in)\s+((?-i:[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*))',
         }
+        self.entity_scanner = PatternScanner(self.entity_patterns)
 
     def classify_document_type(self, prompt):
-        """Classify the document type based on the user's prompt"""
-        prompt_lower = prompt.lower()
+        """Classify the document type based on the user's prompt, or None if no keyword matched"""
+        doc_type, _, _ = self.classifier.classify(prompt)
+        return doc_type
 
-        # Count keyword matches for each document type
-        scores = {}
-        for doc_type, info in self.document_types.items():
-            score = sum(1 for keyword in info['keywords'] if keyword in prompt_lower)
-            scores[doc_type] = score
+    def rank_document_types(self, prompt):
+        """Return the best document type (or None), its confidence and all scored candidates"""
+        doc_type, confidence, ranked = self.classifier.classify(prompt)
+        candidates = [{'document_type': name, 'confidence': score} for name, score in ranked]
+        return doc_type, confidence, candidates
 
-        # Return the document type with the highest score
-        if scores:
-            return max(scores, key=scores.get)
-        return None
+    def _nlp(self):
+        # Only named entities are used, so the NER-only pipeline suffices; the rules need just a tokenizer
+        return get_nlp('ner' if self.use_ner else 'tokenizer')
 
     def extract_entities(self, prompt):
-        """Extract entities from the user's prompt using spaCy and regex patterns"""
-        doc = nlp(prompt)
+        """Extract entities from the user's prompt using spaCy, rules and regex patterns"""
+        return self._entities_from_doc(prompt, self._nlp()(prompt))
+
+    def extract_entities_batch(self, prompts, batch_size=PROMPT_BATCH_SIZE, n_process=PROMPT_N_PROCESS):
+        """Extract entities from many prompts in one ``nlp.pipe`` pass"""
+        docs = self._nlp().pipe(prompts, batch_size=batch_size, n_process=n_process)
+        return [self._entities_from_doc(prompt, doc) for prompt, doc in zip(prompts, docs)]
+
+    def process_prompts(self, prompts, batch_size=PROMPT_BATCH_SIZE, n_process=PROMPT_N_PROCESS):
+        """Classify and extract entities for a batch of prompts"""
+        results = []
+        for prompt, entities in zip(prompts, self.extract_entities_batch(prompts, batch_size, n_process)):
+            doc_type, confidence, candidates = self.rank_document_types(prompt)
+            results.append({
+                'document_type': doc_type or UNKNOWN_DOCUMENT_TYPE,
+                'confidence': confidence,
+                'candidates': candidates,
+                'extracted_entities': entities,
+                'missing_fields': self.identify_missing_fields(doc_type, entities),
+            })
+        return results
+
+    def _entities_from_doc(self, prompt, doc):
+        """Map a parsed prompt's named entities and regex matches to template fields"""
         entities = {}
 
         # Extract named entities using spaCy
@@ -113,28 +135,45 @@ class LegalDocumentProcessor:
                 elif 'address' not in entities:
                     entities['address'] = ent.text
 
-        # Extract amounts using regex
-        amount_match = re.search(self.entity_patterns['amounts'], prompt, re.IGNORECASE)
-        if amount_match:
-            entities['rent_amount'] = amount_match.group(1)
-            entities['sale_amount'] = amount_match.group(1)
-            entities['lease_amount'] = amount_match.group(1)
-
-        # Extract dates
-        date_match = re.search(self.entity_patterns['dates'], prompt, re.IGNORECASE)
-        if date_match:
-            entities['start_date'] = date_match.group(0)
-            entities['effective_date'] = date_match.group(0)
-            entities['expiry_date'] = date_match.group(0)
-            entities['sale_date'] = date_match.group(0)
-
-        # Extract durations
-        duration_match = re.search(self.entity_patterns['durations'], prompt, re.IGNORECASE)
-        if duration_match:
-            entities['duration'] = duration_match.group(0)
-            entities['renewal_period'] = duration_match.group(0)
-            entities['lease_period'] = duration_match.group(0)
-            entities['notice_period'] = duration_match.group(0)
+        # Amounts, dates and durations from one scan; cue words before a match pick its field
+        matches = self.entity_scanner.group_by_kind(prompt)
+
+        amounts = [m for m in matches['amounts'] if not cue_before(prompt, m.start, DEPOSIT_CUES)]
+        deposits = [m for m in matches['amounts'] if cue_before(prompt, m.start, DEPOSIT_CUES)]
+        if amounts:
+            entities['rent_amount'] = amounts[0].value
+            entities['sale_amount'] = amounts[0].value
+            entities['lease_amount'] = amounts[0].value
+        if deposits:
+            entities['security_deposit'] = deposits[0].value
+
+        end_dates = [m for m in matches['dates'] if cue_before(prompt, m.start, DATE_END_CUES)]
+        start_dates = [m for m in matches['dates'] if m not in end_dates]
+        if start_dates:
+            entities['start_date'] = start_dates[0].text
+            entities['effective_date'] = start_dates[0].text
+            entities['sale_date'] = start_dates[0].text
+        # A lone date also stands in for the expiry date, as before
+        end_date = end_dates[0] if end_dates else (start_dates[1] if len(start_dates) > 1 else None)
+        if end_date:
+            entities['expiry_date'] = end_date.text
+            entities['end_date'] = end_date.text
+        elif start_dates:
+            entities['expiry_date'] = start_dates[0].text
+
+        if matches['pincodes']:
+            entities['property_pincode'] = matches['pincodes'][0].text
+
+        notices = [m for m in matches['durations'] if cue_before(prompt, m.start, NOTICE_CUES)
+                   or cue_after(prompt, m.end, NOTICE_CUES, window=1)]
+        terms = [m for m in matches['durations'] if m not in notices]
+        if terms:
+            entities['duration'] = terms[0].text
+            entities['renewal_period'] = terms[0].text
+            entities['lease_period'] = terms[0].text
+        notice = notices[0] if notices else (terms[0] if terms else None)
+        if notice:
+            entities['notice_period'] = notice.text
 
         # Extract other specific fields if they are present in the prompt
         # For example, extracting property description for land_sale_deed
@@ -150,25 +189,20 @@ class LegalDocumentProcessor:
             if match:
                 entities['matter_description'] = match.group(1).strip() + ' purposes'
         
-        # You might need more specific regex or NLP rules for other fields like father's name, city, pincode, etc.
-        # For now, let's assume these would be provided through the form or default values.
+        # Role cues, parentage, pincodes, amounts and dates found by the rules take precedence
+        if self.use_rules:
+            entities.update(rules_for(doc.vocab).extract(doc))
 
         return entities
 
     def identify_missing_fields(self, doc_type, entities):
         """Identify missing required fields for the document type"""
-        required_fields = self.document_types[doc_type]['required_fields']
-        missing_fields = []
-        
-        for field in required_fields:
-            if field not in entities or not entities[field]:
-                missing_fields.append(field)
-        
-        return missing_fields
+        schema = SCHEMAS.get(doc_type)
+        return schema.missing_fields(entities) if schema else []
 
     def generate_document(self, doc_type, entities, language='en'):
         """Generate document content by filling the template with extracted entities"""
-        if doc_type not in self.document_types:
+        if doc_type not in SCHEMAS:
             raise ValueError(f"Unsupported document type: {doc_type}")
 
         # Delegate to DocumentGenerator for multi-language support
@@ -176,6 +210,7 @@ class LegalDocumentProcessor:
 
     def generate_docx(self, content, filename):
         """Generate a .docx file from the document content"""
+        from docx import Document
         doc = Document()
         doc.add_heading('Legal Document', 0)
 
@@ -189,6 +224,9 @@ class LegalDocumentProcessor:
 
     def generate_pdf(self, content, filename):
         """Generate a .pdf file from the document content"""
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import SimpleDocTemplate, Paragraph
         doc = SimpleDocTemplate(filename, pagesize=letter)
         styles = getSampleStyleSheet()
 
@@ -0,0 +1,138 @@
+"""Precompiled bundle of the shipped document templates.
+
+Parsing and compiling a Jinja template costs milliseconds, and every
+process used to pay it for each of the ~40 (language, doc_type)
+templates it touched. The build step compiles them all ahead of time
+into Python modules with ``Environment.compile_templates``, next to a
+manifest holding each source's hash and variable set::
+
+    python -m app.services.template_bundle
+
+At runtime a template is loaded from the bundle through Jinja's
+``ModuleLoader`` only when its source still hashes to the manifest
+entry. An edited or new template is compiled from source as before, so a
+stale bundle costs speed, never correctness.
+"""
+import argparse
+import compileall
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, FrozenSet, List, Optional
+
+from jinja2 import Environment, ModuleLoader, Template, TemplateNotFound
+
+from app.utils.template_validator import extract_template_variables
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEMPLATE_BUNDLE_DIR = os.getenv('TEMPLATE_BUNDLE_DIR', os.path.join(PROJECT_ROOT, 'build', 'templates'))
+MANIFEST_FILE = 'manifest.json'
+
+
+def source_hash(source: str) -> str:
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def template_names(base_dir: str, template_files: Dict[str, str]) -> List[str]:
+    """Return the loader names of every shipped template, base and per-language."""
+    names = list(template_files.values())
+    for language in sorted(os.listdir(base_dir)):
+        if len(language) != 2 or not os.path.isdir(os.path.join(base_dir, language)):
+            continue
+        names.extend(f"{language}/{file_name}" for file_name in template_files.values()
+                     if os.path.exists(os.path.join(base_dir, language, file_name)))
+    return names
+
+
+def compile_templates(env: Environment, base_dir: str, template_files: Dict[str, str],
+                      target: str = TEMPLATE_BUNDLE_DIR) -> int:
+    """Compile every shipped template into ``target`` and write its manifest.
+
+    ``env`` must be configured like the runtime environment, since its
+    settings (trim_blocks, ...) are baked into the compiled code.
+    """
+    names = template_names(base_dir, template_files)
+    os.makedirs(target, exist_ok=True)
+    env.compile_templates(target, filter_func=set(names).__contains__, zip=None, ignore_errors=False)
+    # Ship bytecode too, so loading a template needs no Python compile either
+    compileall.compile_dir(target, quiet=1)
+
+    manifest = {}
+    for name in names:
+        with open(os.path.join(base_dir, name), 'r', encoding='utf-8') as f:
+            source = f.read()
+        manifest[name] = {
+            'sha256': source_hash(source),
+            'variables': sorted(extract_template_variables(source)),
+        }
+    tmp_path = os.path.join(target, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'jinja_env': _env_signature(env), 'templates': manifest}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(target, MANIFEST_FILE))
+    return len(manifest)
+
+
+def _env_signature(env: Environment) -> Dict:
+    # A bundle built with other syntax settings must not be used
+    return {
+        'trim_blocks': env.trim_blocks,
+        'lstrip_blocks': env.lstrip_blocks,
+        'keep_trailing_newline': env.keep_trailing_newline,
+        'block_start_string': env.block_start_string,
+        'variable_start_string': env.variable_start_string,
+    }
+
+
+class TemplateBundle:
+    """Serves compiled templates from a bundle directory when their source is unchanged."""
+
+    def __init__(self, env: Environment, path: str = TEMPLATE_BUNDLE_DIR):
+        self.env = env
+        self.path = path
+        self._templates = {}
+        self._loader = None
+        try:
+            with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get('jinja_env') != _env_signature(env):
+            print(f"Ignoring template bundle in {path}: built with different Jinja settings")
+            return
+        self._templates = manifest.get('templates', {})
+        self._loader = ModuleLoader(path)
+
+    def __bool__(self) -> bool:
+        return self._loader is not None
+
+    def load(self, name: str, source: str) -> Optional[Template]:
+        """Return the compiled template for ``name`` if ``source`` matches the bundle."""
+        entry = self._templates.get(name)
+        if self._loader is None or entry is None or entry['sha256'] != source_hash(source):
+            return None
+        try:
+            return self._loader.load(self.env, name)
+        except TemplateNotFound:
+            return None
+
+    def variables(self, name: str) -> Optional[FrozenSet[str]]:
+        entry = self._templates.get(name)
+        return frozenset(entry['variables']) if entry else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Precompile the shipped document templates.')
+    parser.add_argument('--target', default=TEMPLATE_BUNDLE_DIR, help='Bundle directory (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    from app.services.document_generator import DocumentGenerator, TEMPLATE_FILES
+    generator = DocumentGenerator()
+    count = compile_templates(generator.env, generator.base_template_dir, TEMPLATE_FILES, args.target)
+    print(f"Compiled {count} templates into {args.target}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
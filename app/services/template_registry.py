@@ -0,0 +1,197 @@
+"""Registry of compiled document templates.
+
+For every (doc_type, language) pair the registry resolves the template
+file once (language directory first, base directory as fallback),
+compiles it and precomputes its variable set. Rendering then needs no
+existence checks, file reads or regex scans. Entries are revalidated by
+mtime at most once per ``reload_interval`` seconds, so edited templates
+are still picked up. Unchanged shipped templates come precompiled from the
+template bundle when one has been built.
+
+User-supplied template sources are compiled once per content hash and
+kept in a bounded LRU (``SourceTemplateCache``).
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from jinja2 import Environment, Template
+
+from app.utils.template_validator import extract_template_variables
+
+TEMPLATE_RELOAD_INTERVAL = float(os.getenv('TEMPLATE_RELOAD_INTERVAL', '5'))
+CUSTOM_TEMPLATE_CACHE_SIZE = int(os.getenv('CUSTOM_TEMPLATE_CACHE_SIZE', '128'))
+
+
+class TemplateEntry:
+    """A compiled template together with its resolved path and variables."""
+
+    __slots__ = ('doc_type', 'language', 'name', 'path', 'template', 'variables', 'mtime', 'checked_at')
+
+    def __init__(self, doc_type: str, language: str, name: str, path: str, template: Template,
+                 variables: FrozenSet[str], mtime: float):
+        self.doc_type = doc_type
+        self.language = language
+        self.name = name
+        self.path = path
+        self.template = template
+        self.variables = variables
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+
+
+class TemplateRegistry:
+    """Holds one compiled TemplateEntry per (doc_type, language)."""
+
+    def __init__(self, env: Environment, base_dir: str, template_files: Dict[str, str],
+                 reload_interval: float = TEMPLATE_RELOAD_INTERVAL, bundle=None):
+        self.env = env
+        self.bundle = bundle
+        self.base_dir = base_dir
+        self.template_files = template_files
+        self.reload_interval = reload_interval
+        self._entries: Dict[Tuple[str, str], TemplateEntry] = {}
+        self._known_languages = None
+        self._lock = threading.Lock()
+        self.counters = {'bundled': 0, 'compiled': 0}
+
+    def languages(self):
+        """Return the language codes that have a template directory."""
+        return sorted(
+            name for name in os.listdir(self.base_dir)
+            if len(name) == 2 and os.path.isdir(os.path.join(self.base_dir, name))
+        )
+
+    def preload(self):
+        """Compile every shipped template for every language directory."""
+        for language in ['en'] + self.languages():
+            for doc_type in self.template_files:
+                self.get(doc_type, language)
+        return len(self._entries)
+
+    def get(self, doc_type: str, language: str = 'en') -> TemplateEntry:
+        """Return the entry for ``doc_type`` in ``language``, compiling it on first use."""
+        if self._known_languages is None:
+            self._known_languages = frozenset(self.languages())
+        if language not in self._known_languages:
+            # Languages without a template directory all share the base template
+            language = 'en'
+        key = (doc_type, language)
+        entry = self._entries.get(key)
+        if entry is not None and not self._is_stale(entry):
+            return entry
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._is_stale(entry):
+                if entry is not None:
+                    # Drop Jinja's own copy of the changed file before recompiling
+                    self._clear_env_cache()
+                entry = self._build(doc_type, language)
+                self._entries[key] = entry
+        return entry
+
+    def invalidate(self, doc_type: Optional[str] = None, language: Optional[str] = None):
+        """Drop cached entries so they are rebuilt on next use."""
+        with self._lock:
+            for key in list(self._entries):
+                if (doc_type is None or key[0] == doc_type) and (language is None or key[1] == language):
+                    del self._entries[key]
+            self._known_languages = None
+            self._clear_env_cache()
+
+    def _clear_env_cache(self):
+        if self.env.cache is not None:
+            self.env.cache.clear()
+
+    def _is_stale(self, entry: TemplateEntry) -> bool:
+        if self.reload_interval <= 0:
+            return False
+        now = time.monotonic()
+        if now - entry.checked_at < self.reload_interval:
+            return False
+        entry.checked_at = now
+        try:
+            return os.path.getmtime(entry.path) != entry.mtime
+        except OSError:
+            return True
+
+    def _resolve(self, doc_type: str, language: str) -> Tuple[str, str]:
+        """Return (template name, full path), preferring the language directory."""
+        if doc_type not in self.template_files:
+            raise ValueError(f"Invalid document type: {doc_type}")
+        file_name = self.template_files[doc_type]
+        if language and language != 'en':
+            lang_path = os.path.join(self.base_dir, language, file_name)
+            if os.path.exists(lang_path):
+                return f"{language}/{file_name}", lang_path
+        return file_name, os.path.join(self.base_dir, file_name)
+
+    def _build(self, doc_type: str, language: str) -> TemplateEntry:
+        name, path = self._resolve(doc_type, language)
+        mtime = os.path.getmtime(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+
+        template = self.bundle.load(name, source) if self.bundle else None
+        if template is not None:
+            self.counters['bundled'] += 1
+            return TemplateEntry(doc_type, language, name, path, template, self.bundle.variables(name), mtime)
+
+        self.counters['compiled'] += 1
+        try:
+            template = self.env.get_template(name)
+        except Exception as e:
+            if name == self.template_files[doc_type]:
+                raise
+            print(f"Error loading language-specific template '{name}': {e}. Falling back to base template.")
+            name = self.template_files[doc_type]
+            path = os.path.join(self.base_dir, name)
+            mtime = os.path.getmtime(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+            template = self.env.get_template(name)
+
+        return TemplateEntry(doc_type, language, name, path, template,
+                             frozenset(extract_template_variables(source)), mtime)
+
+
+class SourceTemplateCache:
+    """Compiled templates for user-supplied sources, keyed by content hash, LRU-bounded."""
+
+    def __init__(self, env: Environment, max_entries: int = CUSTOM_TEMPLATE_CACHE_SIZE):
+        self.env = env
+        self.max_entries = max_entries
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def key(source: str) -> str:
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def get(self, source: str) -> Template:
+        """Return the compiled template for ``source``, compiling it on first use."""
+        key = self.key(source)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.counters['hits'] += 1
+                return template
+            self.counters['misses'] += 1
+
+        # Compile outside the lock; a concurrent miss on the same source just compiles twice
+        template = self.env.from_string(source)
+        with self._lock:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counters, entries=len(self._templates), max_entries=self.max_entries)
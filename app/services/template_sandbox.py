@@ -0,0 +1,417 @@
+"""Sandboxed, resource-limited rendering of user-supplied templates.
+
+Custom templates come straight from users, so they are compiled in an
+immutable Jinja sandbox (no access to unsafe attributes, no mutation of
+the render data) and rendered under limits:
+
+- the source may be at most ``CUSTOM_TEMPLATE_MAX_SOURCE`` characters;
+- rendering may use at most ``CUSTOM_TEMPLATE_CPU_SECONDS`` of the
+  rendering thread's CPU time. A trace hook checks the clock on lines of
+  template code and on Python calls, so loops are bounded whatever they
+  iterate over; calls, attribute lookups and output chunks check it too;
+- the output may be at most ``CUSTOM_TEMPLATE_MAX_OUTPUT`` characters.
+  The stream ``generate()`` yields is counted as it is produced, and
+  every printed value is sized before it becomes text. The steps that
+  can build a large string or list in one go are sized first through
+  the sandbox's overridable hooks: ``+``, ``*``, ``%``, buffered blocks
+  and macro output, the ``str`` methods that pad, replace, join or
+  format, and the filters that stringify or grow their input. Anything
+  that would exceed the output limit is refused before allocating, as
+  are huge powers and summing anything but numbers. ``~`` only joins
+  values that were already bounded, and its result is sized once printed.
+
+Breaking a limit raises ``TemplateLimitError``. ``check_limits`` renders
+a few probe templates at startup and fails if a hook is no longer called,
+for instance after a Jinja upgrade.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from itertools import chain
+from typing import Dict, Optional
+
+from jinja2.filters import make_attrgetter
+from jinja2.runtime import Namespace
+from jinja2.sandbox import ImmutableSandboxedEnvironment, SecurityError, safe_range
+
+CUSTOM_TEMPLATE_MAX_SOURCE = int(os.getenv('CUSTOM_TEMPLATE_MAX_SOURCE', str(100 * 1024)))
+CUSTOM_TEMPLATE_MAX_OUTPUT = int(os.getenv('CUSTOM_TEMPLATE_MAX_OUTPUT', str(1024 * 1024)))
+CUSTOM_TEMPLATE_CPU_SECONDS = float(os.getenv('CUSTOM_TEMPLATE_CPU_SECONDS', '2'))
+
+# Largest exponent allowed in ``**``; 10 ** 100 is harmless, 10 ** 10 ** 9 is not
+MAX_POWER_EXPONENT = 100
+# Largest integer ``**`` may produce, in bits (about 30,000 digits)
+MAX_POWER_BITS = 100000
+# The trace hook reads the CPU clock once per this many traced lines
+_TRACE_CHECK_EVERY = 64
+
+# Width and precision of printf-style conversions, including ``*`` widths
+_PERCENT_SPEC = re.compile(r'%(?:\([^)]*\))?[-+ #0]*(\*|\d*)(?:\.(\*|\d*))?')
+# Width and precision of str.format replacement fields, and nested ``{}`` widths
+_BRACE_SPEC = re.compile(r'\{[^{}]*?:[^{}]*?(\d*)(?:\.(\d+))?[a-zA-Z%]?\}')
+_NESTED_FIELD = re.compile(r'\{[^{}]*\{')
+
+# Filters that turn their input into a string, so must size it first
+_STRING_FILTERS = frozenset([
+    'capitalize', 'center', 'e', 'escape', 'forceescape', 'format', 'indent', 'join', 'lower', 'pprint',
+    'replace', 'string', 'striptags', 'title', 'tojson', 'trim', 'truncate', 'upper', 'urlencode', 'urlize',
+    'wordcount', 'wordwrap', 'xmlattr',
+])
+# str methods whose result can be much longer than the string itself
+_PADDING_METHODS = frozenset(['center', 'ljust', 'rjust', 'zfill'])
+
+
+class TemplateLimitError(SecurityError):
+    """A custom template exceeded its size, output or CPU-time limit."""
+
+
+# Limits of the render running on this thread; unset outside render_limited
+_render = threading.local()
+
+
+def _check_deadline():
+    deadline = getattr(_render, 'deadline', None)
+    if deadline is not None and time.thread_time() > deadline:
+        raise TemplateLimitError(f"Template rendering exceeded {_render.cpu_seconds}s of CPU time")
+
+
+def _deadline_tracer(deadline: float, cpu_seconds: float):
+    """Return a ``sys.settrace`` hook that raises once the thread passes ``deadline``.
+
+    Every line of template code and every Python call counts, so loops
+    are bounded whether they run in the template or in the filters it
+    calls. Lines of other code are not traced, which keeps the overhead
+    low; the size checks bound the work any single call can do.
+    """
+    ticks = 0
+
+    def trace(frame, event, arg):
+        nonlocal ticks
+        ticks += 1
+        if not ticks % _TRACE_CHECK_EVERY and time.thread_time() > deadline:
+            raise TemplateLimitError(f"Template rendering exceeded {cpu_seconds}s of CPU time")
+        if event == 'call' and not isinstance(frame.f_globals.get('environment'), LimitedSandboxedEnvironment):
+            return None
+        return trace
+    return trace
+
+
+def _max_output() -> int:
+    return getattr(_render, 'max_output', CUSTOM_TEMPLATE_MAX_OUTPUT)
+
+
+def _check_size(size, what: str):
+    if isinstance(size, int) and size > _max_output():
+        raise TemplateLimitError(f"{what} would exceed the {_max_output()} character output limit")
+
+
+def rendered_size(value, limit: Optional[int] = None) -> int:
+    """Estimate ``len(str(value))`` without building it.
+
+    Containers are walked, so a list holding the same large list many
+    times is sized as it would print. The walk stops once the estimate
+    passes ``limit`` (the output limit by default).
+    """
+    limit = _max_output() if limit is None else limit
+    size = 0
+    pending = [value]
+    while pending and size <= limit:
+        value = pending.pop()
+        if isinstance(value, str):
+            size += len(value)
+        elif isinstance(value, bool) or value is None:
+            size += 5
+        elif isinstance(value, int):
+            size += value.bit_length() // 3 + 2
+        elif isinstance(value, float):
+            size += len(repr(value))
+        else:
+            if isinstance(value, Namespace):
+                value = value._Namespace__attrs
+            if isinstance(value, dict):
+                pending.extend(chain.from_iterable(value.items()))
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                pending.extend(value)
+            else:
+                # Other objects print as short reprs
+                size += 1
+                continue
+            # Brackets and separators
+            size += 2 + 2 * len(value)
+    return size
+
+
+def _check_value(value, what: str):
+    _check_size(rendered_size(value), what)
+
+
+def _format_size(fmt: str, values, percent: bool) -> int:
+    """Upper bound on the length of ``fmt`` formatted with ``values``."""
+    largest = max((rendered_size(value) for value in values), default=0)
+    biggest_int = max((abs(value) for value in values if isinstance(value, int)), default=0)
+    if percent:
+        fields = _PERCENT_SPEC.findall(fmt)
+        dynamic = sum(part == '*' for field in fields for part in field)
+    else:
+        fields = _BRACE_SPEC.findall(fmt)
+        dynamic = len(_NESTED_FIELD.findall(fmt))
+    widths = sum(int(part) for field in fields for part in field if part.isdigit())
+    return len(fmt) + widths + dynamic * biggest_int + (fmt.count('%' if percent else '{') + 1) * largest
+
+
+def _check_percent(fmt: str, values):
+    if isinstance(values, dict):
+        values = list(values.values())
+    elif not isinstance(values, tuple):
+        values = (values,)
+    _check_size(_format_size(fmt, values, percent=True), 'Formatted string')
+
+
+def _check_replace(s: str, old, new, count=None):
+    old, new = str(old), str(new)
+    if len(new) <= len(old):
+        return
+    occurrences = len(s) + 1 if not old else s.count(old)
+    if isinstance(count, int) and count >= 0:
+        occurrences = min(occurrences, count)
+    _check_size(len(s) + occurrences * (len(new) - len(old)), 'Replacement')
+
+
+def _check_join(separator, items):
+    size = max(len(items) - 1, 0) * rendered_size(separator)
+    for item in items:
+        size += rendered_size(item)
+        if size > _max_output():
+            break
+    _check_size(size, 'Joined string')
+
+
+def _check_filter(name: str, environment, value, args, kwargs):
+    """Refuse a filter call whose result would exceed the output limit."""
+    def arg(position, keyword, default=None):
+        if len(args) > position:
+            return args[position]
+        return kwargs.get(keyword, default)
+
+    if name in _STRING_FILTERS:
+        _check_value(value, f"'{name}' input")
+    if name == 'format' and isinstance(value, str):
+        _check_size(_format_size(value, list(args) + list(kwargs.values()), percent=True), 'Formatted string')
+    elif name in ('center', 'indent'):
+        width = arg(0, 'width')
+        if isinstance(width, str):
+            width = len(width)
+        if name == 'indent' and isinstance(width, int):
+            # indent adds the width to every line
+            width *= str(value).count('\n') + 1
+        _check_size(width, f"'{name}' width")
+    elif name == 'replace':
+        _check_replace(str(value), arg(0, 'old', ''), arg(1, 'new', ''), arg(2, 'count'))
+    elif name == 'join':
+        separator, attribute = arg(0, 'd', ''), arg(1, 'attribute')
+        items = value
+        if attribute is not None:
+            items = list(map(make_attrgetter(environment, attribute), value))
+        _check_join(separator, items)
+    elif name == 'wordwrap':
+        width = arg(0, 'width', 79)
+        wrapstring = arg(2, 'wrapstring') or environment.newline_sequence
+        if isinstance(width, int) and width > 0:
+            text = str(value)
+            _check_size(len(text) + (len(text) // width + 1) * len(str(wrapstring)), 'Wrapped string')
+    elif name == 'urlize':
+        text = str(value)
+        # A link repeats its text in the href and needs a '.', ':' or '@'
+        links = text.count('.') + text.count(':') + text.count('@')
+        extra = rendered_size(arg(3, 'target', '')) + rendered_size(arg(4, 'rel', '')) + 64
+        _check_size(2 * len(text) + links * extra, 'Linked string')
+    elif name == 'batch':
+        fill_with = arg(1, 'fill_with')
+        if fill_with is not None and isinstance(arg(0, 'linecount'), int):
+            _check_size(arg(0, 'linecount') * (rendered_size(fill_with) + 2), 'Batch padding')
+    elif name == 'slice':
+        _check_size(arg(0, 'slices'), 'Slice count')
+    elif name == 'sum':
+        start = arg(1, 'start', 0)
+        if not isinstance(start, (int, float)):
+            raise TemplateLimitError("Custom templates may only sum numbers")
+
+
+class LimitedSandboxedEnvironment(ImmutableSandboxedEnvironment):
+    """Immutable sandbox that also bounds CPU time and the size of built strings."""
+
+    intercepted_binops = frozenset(['+', '*', '**', '%'])
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('finalize', self._finalize_output)
+        super().__init__(*args, **kwargs)
+        self.globals['range'] = self._range
+        self.globals['lipsum'] = self._guard_lipsum(self.globals['lipsum'])
+        for name, func in list(self.filters.items()):
+            self.filters[name] = self._guard_filter(name, func)
+
+    @staticmethod
+    def concat(parts):
+        # Joins buffered output: {% set %} and {% filter %} blocks, macro and caller() bodies
+        parts = list(parts)
+        _check_size(sum(map(len, parts)), 'Block output')
+        return ''.join(parts)
+
+    @staticmethod
+    def _finalize_output(value):
+        _check_value(value, 'Output value')
+        return value
+
+    def call_binop(self, context, operator, left, right):
+        _check_deadline()
+        if operator == '+':
+            if isinstance(left, (str, list, tuple)) and isinstance(right, (str, list, tuple)):
+                _check_size(rendered_size(left) + rendered_size(right), 'Concatenation')
+        elif operator == '*':
+            for sequence, count in ((left, right), (right, left)):
+                if isinstance(sequence, (str, list, tuple)) and isinstance(count, int):
+                    _check_size(rendered_size(sequence) * count, 'Repetition')
+        elif operator == '**':
+            if isinstance(right, (int, float)) and abs(right) > MAX_POWER_EXPONENT:
+                raise TemplateLimitError(f"Exponents above {MAX_POWER_EXPONENT} are not allowed")
+            if isinstance(left, int) and isinstance(right, int) and left.bit_length() * right > MAX_POWER_BITS:
+                raise TemplateLimitError(f"Powers above {MAX_POWER_BITS} bits are not allowed")
+        elif operator == '%' and isinstance(left, str):
+            _check_percent(left, right)
+        return super().call_binop(context, operator, left, right)
+
+    def call(__self, __context, __obj, *args, **kwargs):
+        _check_deadline()
+        owner = getattr(__obj, '__self__', None)
+        if isinstance(owner, str):
+            name = getattr(__obj, '__name__', None)
+            if name in _PADDING_METHODS:
+                _check_size(args[0] if args else kwargs.get('width'), f"'{name}' width")
+            elif name == 'expandtabs':
+                tabsize = args[0] if args else kwargs.get('tabsize', 8)
+                if isinstance(tabsize, int):
+                    _check_size(len(owner) + owner.count('\t') * tabsize, 'Expanded string')
+            elif name == 'replace' and len(args) >= 2:
+                _check_replace(owner, *args[:3])
+            elif name == 'join' and args:
+                items = list(args[0])
+                _check_join(owner, items)
+                args = (items,) + args[1:]
+        return super().call(__context, __obj, *args, **kwargs)
+
+    def wrap_str_format(self, value):
+        wrapper = super().wrap_str_format(value)
+        if wrapper is None:
+            return None
+        fmt = value.__self__
+
+        def sized_format(*args, **kwargs):
+            values = list(args) + list(kwargs.values())
+            if value.__name__ == 'format_map' and args and isinstance(args[0], dict):
+                values = list(args[0].values())
+            _check_size(_format_size(fmt, values, percent=False), 'Formatted string')
+            return wrapper(*args, **kwargs)
+        return sized_format
+
+    def getattr(self, obj, attribute):
+        _check_deadline()
+        return super().getattr(obj, attribute)
+
+    def getitem(self, obj, argument):
+        _check_deadline()
+        return super().getitem(obj, argument)
+
+    @staticmethod
+    def _range(*args):
+        # The sandbox already caps range() at MAX_RANGE items; this bounds nested loops
+        for i, value in enumerate(safe_range(*args)):
+            if not i & 0xFF:
+                _check_deadline()
+            yield value
+
+    @staticmethod
+    def _guard_lipsum(func):
+        def guarded(n=5, html=True, min=20, max=100):
+            # At most ``max`` words of up to a dozen characters per paragraph
+            if isinstance(n, int) and isinstance(max, int):
+                _check_size(n * max * 12, 'lipsum text')
+            return func(n, html, min, max)
+        return guarded
+
+    def _guard_filter(self, name, func):
+        # Filters marked pass_context/pass_environment/pass_eval_context get that first
+        passes_arg = hasattr(func, 'jinja_pass_arg')
+
+        def guarded(*args, **kwargs):
+            _check_deadline()
+            offset = 1 if passes_arg else 0
+            if len(args) > offset:
+                value = args[offset]
+                if name == 'join' and not isinstance(value, (str, list, tuple)):
+                    # Size a generator once and hand the filter the same items
+                    value = list(value)
+                    args = args[:offset] + (value,) + args[offset + 1:]
+                _check_filter(name, self, value, args[offset + 1:], kwargs)
+            return func(*args, **kwargs)
+        # Keep Jinja's pass_context/pass_environment markers
+        guarded.__dict__.update(getattr(func, '__dict__', {}))
+        return guarded
+
+
+def check_source(source: str, max_source: int = CUSTOM_TEMPLATE_MAX_SOURCE):
+    """Refuse sources too large to be worth compiling."""
+    if len(source) > max_source:
+        raise TemplateLimitError(f"Custom template is {len(source)} characters; the limit is {max_source}")
+
+
+def render_limited(template, data: Dict, max_output: Optional[int] = None,
+                   cpu_seconds: Optional[float] = None) -> str:
+    """Render a sandboxed template, raising TemplateLimitError if it breaks a limit."""
+    max_output = CUSTOM_TEMPLATE_MAX_OUTPUT if max_output is None else max_output
+    cpu_seconds = CUSTOM_TEMPLATE_CPU_SECONDS if cpu_seconds is None else cpu_seconds
+    _render.max_output = max_output
+    _render.cpu_seconds = cpu_seconds
+    _render.deadline = time.thread_time() + cpu_seconds
+    previous_trace = sys.gettrace()
+    sys.settrace(_deadline_tracer(_render.deadline, cpu_seconds))
+    try:
+        chunks = []
+        size = 0
+        for chunk in template.generate(**data):
+            size += len(chunk)
+            if size > max_output:
+                raise TemplateLimitError(f"Template output exceeded {max_output} characters")
+            _check_deadline()
+            chunks.append(chunk)
+        return ''.join(chunks)
+    finally:
+        sys.settrace(previous_trace)
+        _render.deadline = None
+        _render.max_output = CUSTOM_TEMPLATE_MAX_OUTPUT
+
+
+# Probe templates and the limit each must trip with a small output limit. They
+# use variables, since Jinja evaluates filters of constants at compile time.
+_LIMIT_PROBES = (
+    ("{{ word * 99 }}", 'Repetition'),
+    ("{{ word | center(99) }}", "'center' width"),
+    ("{{ word.ljust(99) }}", "'ljust' width"),
+    ("{{ '{:99}'.format(word) }}", 'Formatted string'),
+    ("{% set x %}{% for i in range(9) %}{{ word }}{% endfor %}{% endset %}", 'Block output'),
+    ("{{ text }}", 'Output value'),
+)
+
+
+def check_limits(environment: LimitedSandboxedEnvironment):
+    """Raise RuntimeError unless every size hook of ``environment`` is called."""
+    for source, limit in _LIMIT_PROBES:
+        try:
+            render_limited(environment.from_string(source), {'word': 'abc', 'text': 'a' * 99},
+                           max_output=16)
+        except TemplateLimitError as e:
+            if limit in str(e):
+                continue
+        raise RuntimeError(f"Custom template limit '{limit}' is not enforced; "
+                           f"the installed Jinja may not be supported")
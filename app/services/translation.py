@@ -0,0 +1,301 @@
+"""Translation of form data for non-English document generation.
+
+Form values are translated through a pluggable provider (MyMemory by
+default) over a pooled HTTP session. Identical strings are translated once
+per request, cache misses are fanned out concurrently with a per-request
+bound, and results are kept in a persistent on-disk cache keyed by
+(text, source language, target language) with TTL and LRU eviction.
+
+Each batch runs under a deadline budget, and provider calls go through a
+circuit breaker. When the budget runs out or the circuit is open, values
+fall back to their cached translation or stay untranslated, so a slow or
+rate-limiting provider cannot hold a worker for more than the budget.
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+from app.utils.circuit_breaker import CircuitBreaker
+
+if TYPE_CHECKING:
+    import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TRANSLATION_API_URL = os.getenv('TRANSLATION_API_URL', 'https://api.mymemory.translated.net/get')
+TRANSLATION_TIMEOUT = float(os.getenv('TRANSLATION_TIMEOUT', '5'))
+TRANSLATION_MAX_WORKERS = int(os.getenv('TRANSLATION_MAX_WORKERS', '8'))
+TRANSLATION_PER_REQUEST_CONCURRENCY = int(os.getenv('TRANSLATION_PER_REQUEST_CONCURRENCY', '4'))
+TRANSLATION_CACHE_PATH = os.getenv('TRANSLATION_CACHE_PATH', os.path.join(PROJECT_ROOT, 'data', 'translation_cache.sqlite3'))
+TRANSLATION_CACHE_TTL = int(os.getenv('TRANSLATION_CACHE_TTL', str(30 * 24 * 3600)))
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', '50000'))
+TRANSLATION_DEADLINE = float(os.getenv('TRANSLATION_DEADLINE', '8'))
+TRANSLATION_BREAKER_FAILURES = int(os.getenv('TRANSLATION_BREAKER_FAILURES', '5'))
+TRANSLATION_BREAKER_SLOW_CALL = float(os.getenv('TRANSLATION_BREAKER_SLOW_CALL', '2'))
+TRANSLATION_BREAKER_COOLDOWN = float(os.getenv('TRANSLATION_BREAKER_COOLDOWN', '30'))
+
+
+class TranslationProvider:
+    """Interface for translation backends."""
+
+    def translate(self, session: 'requests.Session', text: str, source: str, target: str, timeout: float) -> Optional[str]:
+        """Return the translated text, or None if the provider could not translate it."""
+        raise NotImplementedError
+
+
+class MyMemoryProvider(TranslationProvider):
+    """MyMemory API, or any stand-in server exposing the same ``/get`` contract."""
+
+    def __init__(self, base_url: str = TRANSLATION_API_URL):
+        self.base_url = base_url
+
+    def translate(self, session, text, source, target, timeout):
+        response = session.get(self.base_url, params={'q': text, 'langpair': f'{source}|{target}'}, timeout=timeout)
+        data = response.json()
+        if data.get('responseStatus') == 200:
+            return data['responseData']['translatedText']
+        print(f"Translation failed for '{text}': {data.get('responseDetails')}")
+        return None
+
+
+class TranslationCache:
+    """SQLite-backed translation cache with TTL expiry and LRU eviction."""
+
+    def __init__(self, path: str = TRANSLATION_CACHE_PATH, ttl: int = TRANSLATION_CACHE_TTL,
+                 max_entries: int = TRANSLATION_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS translations ('
+                ' text TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL,'
+                ' translated TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL,'
+                ' PRIMARY KEY (text, source, target))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_translations_accessed_at ON translations(accessed_at)')
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, texts: Iterable[str], source: str, target: str) -> Dict[str, str]:
+        """Return cached, unexpired translations for ``texts``."""
+        texts = list(texts)
+        if not texts:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(texts), 500):
+                chunk = texts[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT text, translated FROM translations WHERE source = ? AND target = ?'
+                    f' AND created_at > ? AND text IN ({placeholders})',
+                    [source, target, now - self.ttl, *chunk]
+                ).fetchall()
+                found.update(rows)
+            if found:
+                conn.executemany(
+                    'UPDATE translations SET accessed_at = ? WHERE text = ? AND source = ? AND target = ?',
+                    [(now, text, source, target) for text in found]
+                )
+                conn.commit()
+        return found
+
+    def put_many(self, translations: Dict[str, str], source: str, target: str):
+        """Store translations and evict least recently used rows over the size limit."""
+        if not translations:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                'INSERT OR REPLACE INTO translations (text, source, target, translated, created_at, accessed_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                [(text, source, target, translated, now, now) for text, translated in translations.items()]
+            )
+            conn.execute('DELETE FROM translations WHERE created_at <= ?', (now - self.ttl,))
+            (count,) = conn.execute('SELECT COUNT(*) FROM translations').fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    'DELETE FROM translations WHERE rowid IN'
+                    ' (SELECT rowid FROM translations ORDER BY accessed_at LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+            conn.commit()
+
+
+class TranslationService:
+    """Translates batches of strings with de-duplication, caching and bounded concurrency."""
+
+    def __init__(self, provider: Optional[TranslationProvider] = None, cache: Optional[TranslationCache] = None,
+                 timeout: float = TRANSLATION_TIMEOUT, max_workers: int = TRANSLATION_MAX_WORKERS,
+                 per_request_concurrency: int = TRANSLATION_PER_REQUEST_CONCURRENCY,
+                 deadline: float = TRANSLATION_DEADLINE, breaker: Optional[CircuitBreaker] = None):
+        self.provider = provider or MyMemoryProvider()
+        self.cache = cache if cache is not None else TranslationCache()
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.per_request_concurrency = max(1, per_request_concurrency)
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker(
+            'translation',
+            failure_threshold=TRANSLATION_BREAKER_FAILURES,
+            slow_call_seconds=TRANSLATION_BREAKER_SLOW_CALL,
+            cooldown=TRANSLATION_BREAKER_COOLDOWN,
+        )
+        self._counters_lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'cache_hits': 0,
+            'translated': 0,
+            'provider_failures': 0,
+            'short_circuited': 0,
+            'deadline_exceeded': 0,
+            'fallbacks': 0,
+        }
+
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translate')
+
+    def _count(self, **increments):
+        with self._counters_lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def _translate_one(self, text: str, source: str, target: str, timeout: float) -> Optional[str]:
+        if not self.breaker.allow():
+            self._count(short_circuited=1)
+            return None
+        started = time.monotonic()
+        try:
+            translated = self.provider.translate(self.session, text, source, target, timeout)
+        except Exception as e:
+            print(f"Translation error for '{text}': {e}")
+            translated = None
+        self.breaker.record(translated is not None, time.monotonic() - started)
+        if translated is None:
+            self._count(provider_failures=1)
+        return translated
+
+    def _cache_late_result(self, text: str, source: str, target: str):
+        """Return a callback caching a translation that finished after the deadline."""
+        def callback(future):
+            translated = future.result()
+            if translated is not None:
+                try:
+                    self.cache.put_many({text: translated}, source, target)
+                except sqlite3.Error as e:
+                    print(f"Translation cache write failed: {e}")
+        return callback
+
+    def translate_many(self, texts: Iterable[str], target: str, source: str = 'en',
+                       deadline: Optional[float] = None) -> Dict[str, str]:
+        """Translate ``texts`` and return a mapping of original to translated text.
+
+        The whole batch is bounded by ``deadline`` seconds (the service
+        default if None). Empty strings, strings the provider fails on and
+        strings still pending when the budget runs out map to themselves.
+        """
+        unique = {text for text in texts if text and text.strip()}
+        results = {}
+        if not unique or source == target:
+            return {text: text for text in unique}
+        expires_at = time.monotonic() + (self.deadline if deadline is None else deadline)
+
+        try:
+            results.update(self.cache.get_many(unique, source, target))
+        except sqlite3.Error as e:
+            print(f"Translation cache read failed: {e}")
+        misses = [text for text in unique if text not in results]
+        self._count(requests=1, cache_hits=len(results))
+
+        fresh = {}
+        in_flight = {}
+        pending = iter(misses)
+        while True:
+            remaining = expires_at - time.monotonic()
+            while remaining > 0 and len(in_flight) < self.per_request_concurrency:
+                text = next(pending, None)
+                if text is None:
+                    break
+                in_flight[self._executor.submit(self._translate_one, text, source, target,
+                                                min(self.timeout, remaining))] = text
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                # Budget exhausted: leave stragglers to finish in the background and cache them
+                print(f"Translation deadline exceeded with {len(in_flight)} calls in flight")
+                self._count(deadline_exceeded=1)
+                for future, text in in_flight.items():
+                    future.add_done_callback(self._cache_late_result(text, source, target))
+                break
+            for future in done:
+                text = in_flight.pop(future)
+                translated = future.result()
+                if translated is not None:
+                    fresh[text] = translated
+
+        try:
+            self.cache.put_many(fresh, source, target)
+        except sqlite3.Error as e:
+            print(f"Translation cache write failed: {e}")
+
+        results.update(fresh)
+        fallbacks = 0
+        for text in misses:
+            if text not in results:
+                results[text] = text
+                fallbacks += 1
+        self._count(translated=len(fresh), fallbacks=fallbacks)
+        return results
+
+    def stats(self) -> Dict:
+        """Return service counters and circuit breaker state."""
+        with self._counters_lock:
+            counters = dict(self.counters)
+        counters['breaker'] = self.breaker.stats()
+        return counters
+
+    def translate_fields(self, data: Dict[str, str], target: str, source: str = 'en') -> Dict[str, str]:
+        """Translate every non-empty value of a form-data dict."""
+        translations = self.translate_many(data.values(), target, source)
+        return {key: translations.get(value, value) for key, value in data.items()}
+
+    def translate_text(self, text: str, target: str, source: str = 'en') -> str:
+        if not text.strip():
+            return text
+        return self.translate_many([text], target, source).get(text, text)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_translation_service() -> TranslationService:
+    """Return the process-wide translation service, creating it on first use."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = TranslationService()
+    return _service
@@ -0,0 +1,101 @@
+"""Process warm-up and readiness state.
+
+Loading the spaCy pipeline, compiling templates and initialising
+ReportLab make the first request of a cold process take seconds. Under a
+pre-forking server ``warm_up`` runs once in the master before workers are
+forked, so the loaded objects are shared copy-on-write and every worker
+starts warm. Readiness is reported as ready only after warm-up has
+finished.
+
+A background warm-up thread is not copied into forked children, so a
+child forked while it runs resets the status to pending and can start
+its own; gunicorn.conf.py refuses background warm-up with preloading.
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+from app.services import exporter
+from app.services.container import services
+
+# sync: warm up before serving (in the master when preloading), background:
+# serve at once and report not ready until done, off: skip and report ready
+WARMUP_MODE = os.getenv('WARMUP', 'sync').lower()
+
+WARMUP_PROMPT = ('Create a rental agreement between Ramesh Kumar and Priya Sharma for a flat in Chennai '
+                 'for Rs. 15,000 per month from 01/04/2024 for 11 months')
+
+_lock = threading.Lock()
+_state = {
+    'status': 'pending',
+    'started_at': None,
+    'finished_at': None,
+    'steps': {},
+    'error': None,
+}
+
+
+def _reset_after_fork():
+    global _lock
+    _lock = threading.Lock()
+    if _state['status'] == 'running':
+        # The thread doing the warm-up stayed behind in the parent
+        _state.update(status='pending', started_at=None)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _step(name: str, func):
+    started = time.perf_counter()
+    result = func()
+    _state['steps'][name] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def warm_up(processor=None) -> Dict:
+    """Load everything the first request would otherwise load, and return the status.
+
+    ``processor`` defaults to the shared one from the service container.
+    """
+    with _lock:
+        if _state['status'] in ('running', 'ready'):
+            return warmup_status()
+        _state.update(status='running', started_at=time.time(), finished_at=None, error=None)
+
+    try:
+        processor = processor or _step('processor', lambda: services.processor)
+        # Loads the spaCy pipeline and compiles the entity rules and scanner
+        _step('nlp', lambda: processor.process_prompts([WARMUP_PROMPT]))
+        _step('templates', processor.document_generator.preload_templates)
+        _step('exporter', exporter.preload)
+    except Exception as e:
+        print(f"Warm-up failed: {type(e).__name__}: {e}")
+        _state.update(status='failed', error=f"{type(e).__name__}: {e}", finished_at=time.time())
+        return warmup_status()
+
+    _state.update(status='ready', finished_at=time.time())
+    print(f"Warm-up finished in {_state['finished_at'] - _state['started_at']:.2f}s: {_state['steps']}")
+    return warmup_status()
+
+
+def start_warm_up(processor=None, mode: str = WARMUP_MODE) -> None:
+    """Warm up according to ``mode``: 'sync', 'background' or 'off'."""
+    if mode == 'off':
+        _state.update(status='skipped', finished_at=time.time())
+    elif mode == 'background':
+        threading.Thread(target=warm_up, args=(processor,), name='warm-up', daemon=True).start()
+    elif mode == 'sync':
+        warm_up(processor)
+    else:
+        raise ValueError(f"Unknown warm-up mode: {mode}")
+
+
+def is_ready() -> bool:
+    return _state['status'] in ('ready', 'skipped')
+
+
+def warmup_status() -> Dict:
+    return dict(_state, steps=dict(_state['steps']))
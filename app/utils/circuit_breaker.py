@@ -0,0 +1,86 @@
+"""Circuit breaker for calls to external services."""
+
+import threading
+import time
+from typing import Dict
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Trips after ``failure_threshold`` consecutive failures or slow calls.
+
+    While open, ``allow()`` returns False until ``cooldown`` seconds have
+    passed; then a single probe call is let through (half-open) and its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, slow_call_seconds: float = 2.0,
+                 cooldown: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown = cooldown
+
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.counters = {
+            'allowed': 0,
+            'short_circuited': 0,
+            'successes': 0,
+            'failures': 0,
+            'slow_calls': 0,
+            'opened': 0,
+            'half_opened': 0,
+            'closed': 0,
+        }
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+                self.counters['half_opened'] += 1
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self._probe_in_flight):
+                if self.state == HALF_OPEN:
+                    self._probe_in_flight = True
+                self.counters['allowed'] += 1
+                return True
+            self.counters['short_circuited'] += 1
+            return False
+
+    def record(self, success: bool, elapsed: float = 0.0):
+        """Record the outcome of an allowed call; slow successes count as failures."""
+        slow = success and elapsed > self.slow_call_seconds
+        with self._lock:
+            if slow:
+                self.counters['slow_calls'] += 1
+            if success and not slow:
+                self.counters['successes'] += 1
+                self._consecutive_failures = 0
+                if self.state != CLOSED:
+                    self.state = CLOSED
+                    self.counters['closed'] += 1
+                    print(f"Circuit '{self.name}' closed")
+            else:
+                if not success:
+                    self.counters['failures'] += 1
+                self._consecutive_failures += 1
+                if self.state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                    if self.state != OPEN:
+                        self.counters['opened'] += 1
+                        print(f"Circuit '{self.name}' opened after {self._consecutive_failures} failed or slow calls")
+                    self.state = OPEN
+                    self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counters, state=self.state, consecutive_failures=self._consecutive_failures)
@@ -15,7 +15,13 @@ def validate_template_data(template_content: str, data: Dict) -> Dict:
     Validate that all template variables have corresponding data.
     Returns a dict with validation results.
     """
-    template_vars = extract_template_variables(template_content)
+    return validate_template_variables(extract_template_variables(template_content), data)
+
+def validate_template_variables(template_vars: Set[str], data: Dict) -> Dict:
+    """
+    Validate data against a precomputed set of template variables.
+    Returns the same result dict as validate_template_data.
+    """
     provided_vars = set(data.keys())
     
     missing_vars = template_vars - provided_vars
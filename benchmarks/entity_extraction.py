@@ -0,0 +1,98 @@
+"""Compare entity extraction accuracy and latency across extraction modes.
+
+Each line of the corpus is ``{"prompt": ..., "expected": {field: value}}``.
+A field counts as correct when the extracted value matches the expected
+one ignoring case, spaces and punctuation (so "Rs. 15,000" matches
+"15,000"). Modes:
+
+- legacy: statistical NER with positional roles plus the regex patterns
+- rules+ner: the Matcher rules on top of the legacy path
+- rules: the Matcher rules on the tokenizer-only pipeline, NER disabled
+
+Run with::
+
+    python benchmarks/entity_extraction.py [corpus.jsonl] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.processor import LegalDocumentProcessor  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'entity_prompts.jsonl')
+
+MODES = {
+    'legacy': {'use_rules': False, 'use_ner': True},
+    'rules+ner': {'use_rules': True, 'use_ner': True},
+    'rules': {'use_rules': True, 'use_ner': False},
+}
+
+
+def _normalize(value) -> str:
+    value = re.sub(r'(?i)\b(?:rs|inr|rupees?)\b|₹|/-', '', str(value))
+    return re.sub(r'[\W_]+', '', value).lower()
+
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_mode(processor, corpus, repeat):
+    prompts = [item['prompt'] for item in corpus]
+    # Load the pipeline and compile the rules before timing
+    processor.extract_entities(prompts[0])
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for prompt in prompts:
+            processor.extract_entities(prompt)
+    elapsed = time.perf_counter() - start
+
+    correct = total = 0
+    misses = []
+    for item in corpus:
+        entities = processor.extract_entities(item['prompt'])
+        for field, expected in item['expected'].items():
+            total += 1
+            if _normalize(entities.get(field, '')) == _normalize(expected):
+                correct += 1
+            else:
+                misses.append((field, expected, entities.get(field)))
+    return {
+        'accuracy': correct / total if total else 0.0,
+        'correct': correct,
+        'total': total,
+        'ms_per_prompt': elapsed * 1000 / (repeat * len(prompts)),
+        'misses': misses,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('corpus', nargs='?', default=DEFAULT_CORPUS)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed passes over the corpus')
+    parser.add_argument('--mode', choices=sorted(MODES), action='append', help='Modes to run (default: all)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='List fields each mode got wrong')
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    print(f"{len(corpus)} prompts, {sum(len(item['expected']) for item in corpus)} labelled fields")
+    print(f"{'mode':<10} {'accuracy':>9} {'fields':>9} {'ms/prompt':>10}")
+    for mode in args.mode or MODES:
+        result = run_mode(LegalDocumentProcessor(**MODES[mode]), corpus, args.repeat)
+        print(f"{mode:<10} {result['accuracy']:>9.1%} {result['correct']:>4}/{result['total']:<4} "
+              f"{result['ms_per_prompt']:>10.3f}")
+        if args.verbose:
+            for field, expected, got in result['misses']:
+                print(f"    {field}: expected {expected!r}, got {got!r}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+"""Gunicorn settings; every value can be overridden from the environment.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+# Each worker shares the preloaded models copy-on-write, so memory grows
+# slowly with workers; threads cover requests blocked on I/O
+workers = int(os.getenv('WEB_CONCURRENCY', '0')) or (os.cpu_count() or 1)
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+
+# Import wsgi (and warm up) once in the master before forking
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+# A background warm-up would run in the master and never reach the forked
+# workers, leaving them unready; preloading needs a sync warm-up
+if preload_app and os.getenv('WARMUP', 'sync').lower() == 'background':
+    raise RuntimeError("WARMUP=background needs GUNICORN_PRELOAD=false, so each worker warms up itself")
+
+# PDF exports and bulk ZIP streams can run long
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycle workers after this many requests (0: never) to bound slow leaks
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0')) or max_requests // 10
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+GC_FREEZE = os.getenv('GUNICORN_GC_FREEZE', 'true').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded, before the first fork.
+    # Frozen objects are skipped by the collector, so workers' collections
+    # no longer write to (and un-share) the pages holding the warm models.
+    if GC_FREEZE and preload_app:
+        gc.collect()
+        gc.freeze()
+        server.log.info("Froze %d objects in the permanent GC generation", gc.get_freeze_count())
@@ -13,6 +13,7 @@ DROP TABLE IF EXISTS public.user_profiles CASCADE;
 CREATE TABLE public.user_profiles (
     id SERIAL PRIMARY KEY,
     user_id UUID NOT NULL,
+    email TEXT,
     language_preference TEXT NOT NULL DEFAULT 'en',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
@@ -24,6 +25,7 @@ CREATE TABLE public.user_history (
     user_id UUID NOT NULL,
     action TEXT NOT NULL,
     details TEXT,
+    document_id UUID,
     timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -35,18 +37,24 @@ CREATE TABLE public.generated_documents (
     language TEXT DEFAULT 'en',
     title TEXT,
     content TEXT NOT NULL,
+    excerpt TEXT,
     data JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- Create indexes for better performance
-CREATE INDEX idx_user_profiles_user_id ON public.user_profiles(user_id);
+-- Unique so profile creation can be a single upsert on user_id
+CREATE UNIQUE INDEX idx_user_profiles_user_id ON public.user_profiles(user_id);
+CREATE INDEX idx_user_profiles_email ON public.user_profiles(email);
 CREATE INDEX idx_user_profiles_language_preference ON public.user_profiles(language_preference);
 CREATE INDEX idx_user_history_user_id ON public.user_history(user_id);
 CREATE INDEX idx_user_history_timestamp ON public.user_history(timestamp);
 CREATE INDEX idx_generated_documents_user_id ON public.generated_documents(user_id);
 CREATE INDEX idx_generated_documents_created_at ON public.generated_documents(created_at);
+-- Keyset pagination of the history page
+CREATE INDEX idx_user_history_user_id_timestamp_id ON public.user_history(user_id, timestamp DESC, id DESC);
+CREATE INDEX idx_generated_documents_user_id_created_at_id ON public.generated_documents(user_id, created_at DESC, id DESC);
 
 -- Disable Row Level Security for easier development
 ALTER TABLE public.user_profiles DISABLE ROW LEVEL SECURITY;
@@ -68,5 +76,17 @@ CREATE TRIGGER update_user_profiles_updated_at BEFORE UPDATE ON public.user_prof
 CREATE TRIGGER update_generated_documents_updated_at BEFORE UPDATE ON public.generated_documents
     FOR EACH ROW EXECUTE FUNCTION public.update_updated_at_column();
 
+-- Indexed email -> user id lookup against auth.users, for users without a profile row.
+-- Auth stores emails lowercased, so the bare column is compared; with the
+-- is_sso_user predicate this is served by auth.users' unique email index
+-- (users_email_partial_key) instead of a sequential scan.
+CREATE OR REPLACE FUNCTION public.get_user_id_by_email(p_email TEXT)
+RETURNS UUID AS $$
+    SELECT id FROM auth.users WHERE email = lower(p_email) AND is_sso_user = false LIMIT 1;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public, auth;
+
+REVOKE ALL ON FUNCTION public.get_user_id_by_email(TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_user_id_by_email(TEXT) TO service_role;
+
 -- Setup complete message
 SELECT 'Supabase setup completed successfully! You can now use the Legal Document Writer.' as message;
\ No newline at end of file
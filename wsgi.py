@@ -0,0 +1,20 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The gunicorn config preloads this module in the master process, so the
+warm-up below runs once before workers are forked and every worker starts
+with spaCy, the templates and ReportLab already loaded. ``WARMUP`` selects
+the mode (sync, background or off); ``/readyz`` reports 503 until it is
+done.
+"""
+import os
+
+from app import create_app
+from app.services.warmup import start_warm_up
+
+app = create_app()
+start_warm_up()
+
+if __name__ == '__main__':
+    app.run(host=os.getenv('HOST', '127.0.0.1'), port=int(os.getenv('PORT', '5000')))